@@ -0,0 +1,54 @@
+import time
+from typing import Dict, Optional
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models
+from config import settings
+
+
+class ActionneurCache:
+    # Snapshot of the whole actionneur table, small enough to keep in memory so
+    # authorization checks don't hit the database
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._actionneurs: Optional[Dict[int, models.Actionneur]] = None
+        self._expires_at = 0.0
+        self.generation = 0
+        self.loads = 0
+
+    async def _load(self, db: AsyncSession) -> Dict[int, models.Actionneur]:
+        if self._actionneurs is not None and time.monotonic() < self._expires_at:
+            return self._actionneurs
+
+        generation = self.generation
+        query = select(
+            models.Actionneur.id, models.Actionneur.username, models.Actionneur.is_admin
+        )
+        actionneurs = {
+            row.id: models.Actionneur(
+                id=row.id, username=row.username, is_admin=row.is_admin
+            )
+            for row in await db.execute(query)
+        }
+        self.loads += 1
+        # A snapshot read before an invalidation may miss the write, don't keep it
+        if generation == self.generation:
+            self._actionneurs = actionneurs
+            self._expires_at = time.monotonic() + self.ttl
+        return actionneurs
+
+    async def get(self, db: AsyncSession, id) -> Optional[models.Actionneur]:
+        try:
+            id = int(id)
+        except (TypeError, ValueError):
+            return None
+        return (await self._load(db)).get(id)
+
+    def invalidate(self):
+        self.generation += 1
+        self._actionneurs = None
+
+
+actionneur_cache = ActionneurCache(settings.actionneur_cache_ttl)
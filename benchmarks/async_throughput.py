@@ -0,0 +1,167 @@
+# Compares concurrent throughput of the charbon list on the old sync path (def route
+# on the threadpool, blocking session) against the AsyncSession path. Every query
+# waits --latency ms inside the database to stand in for a busy MySQL server.
+# Usage: python -m benchmarks.async_throughput [--requests N] [--concurrency C]
+import argparse
+import asyncio
+import time
+
+from benchmarks.common import configure, print_table
+
+
+def _add_latency(engine, dialect: str):
+    from sqlalchemy import event
+
+    if dialect != "sqlite":
+        return
+
+    @event.listens_for(engine, "connect")
+    def _register(dbapi_connection, connection_record):
+        dbapi_connection.create_function(
+            "bench_sleep", 1, lambda ms: time.sleep(ms / 1000) or 0
+        )
+
+
+def _latency_clause(dialect: str, latency: float):
+    from sqlalchemy import func, literal
+
+    if dialect == "sqlite":
+        return func.bench_sleep(literal(latency)) == 0
+    return func.sleep(literal(latency / 1000)) == 0
+
+
+def _build_app(args, dialect: str):
+    from fastapi import FastAPI
+    from sqlalchemy import create_engine
+    from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+    from sqlalchemy.orm import Session, sessionmaker
+    from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
+
+    import models
+    from database import ASYNC_SQLALCHEMY_DATABASE_URL, SQLALCHEMY_DATABASE_URL
+    from routers.charbons import _charbon_from_row, _select_charbons
+
+    pool = {"pool_size": args.pool_size, "max_overflow": 0}
+    # Same pool size on both sides, so only the request handling differs
+    engine = create_engine(SQLALCHEMY_DATABASE_URL, poolclass=QueuePool, **pool)
+    async_engine = create_async_engine(
+        ASYNC_SQLALCHEMY_DATABASE_URL, poolclass=AsyncAdaptedQueuePool, **pool
+    )
+    _add_latency(engine, dialect)
+    _add_latency(async_engine.sync_engine, dialect)
+    SessionLocal = sessionmaker(bind=engine, autoflush=False)
+    AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False)
+
+    query = (
+        _select_charbons()
+        .where(_latency_clause(dialect, args.latency))
+        .order_by(models.Charbon.datetime.desc(), models.Charbon.id.desc())
+        .limit(20)
+    )
+
+    app = FastAPI()
+
+    @app.get("/sync/")
+    def sync_charbons():
+        db: Session = SessionLocal()
+        try:
+            return [_charbon_from_row(row) for row in db.execute(query).all()]
+        finally:
+            db.close()
+
+    @app.get("/async/")
+    async def async_charbons():
+        async with AsyncSessionLocal() as db:
+            result = await db.execute(query)
+            return [_charbon_from_row(row) for row in result.all()]
+
+    return app, engine, async_engine
+
+
+def _seed(rows: int):
+    import models
+    from database import SessionLocal, engine
+
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    if db.query(models.Charbon).count():
+        db.close()
+        return
+    db.add(models.Actionneur(id=1, username="bench", is_admin=False))
+    db.add(models.Course(id="BNCH", type="info"))
+    db.flush()
+    for i in range(rows):
+        charbon = models.Charbon(
+            title=f"Charbon {i}", description="", datetime=i, course_id="BNCH"
+        )
+        db.add(charbon)
+        db.flush()
+        db.add(models.CharbonHost(charbon_id=charbon.id, actionneur_id=1))
+    db.commit()
+    db.close()
+
+
+async def _run(app, path: str, requests: int, concurrency: int) -> dict:
+    import httpx
+
+    semaphore = asyncio.Semaphore(concurrency)
+    samples = []
+
+    async def one(client):
+        async with semaphore:
+            start = time.perf_counter()
+            response = await client.get(path)
+            response.raise_for_status()
+            samples.append(time.perf_counter() - start)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as c:
+        await one(c)  # warm up the pool
+        samples.clear()
+        start = time.perf_counter()
+        await asyncio.gather(*(one(c) for _ in range(requests)))
+        elapsed = time.perf_counter() - start
+
+    samples.sort()
+    return {
+        "path": path,
+        "req_per_s": requests / elapsed,
+        "p50_ms": samples[len(samples) // 2] * 1000,
+        "p95_ms": samples[int(len(samples) * 0.95)] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--database-url")
+    parser.add_argument("--rows", type=int, default=200)
+    parser.add_argument("--requests", type=int, default=400)
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--latency", type=float, default=50.0, help="ms per query")
+    parser.add_argument("--pool-size", type=int, default=200)
+    args = parser.parse_args()
+    database_url = configure(args.database_url)
+    dialect = database_url.split(":", 1)[0].split("+", 1)[0]
+
+    _seed(args.rows)
+    app, engine, async_engine = _build_app(args, dialect)
+
+    async def run_all():
+        rows = [
+            await _run(app, path, args.requests, args.concurrency)
+            for path in ("/sync/", "/async/")
+        ]
+        await async_engine.dispose()
+        return rows
+
+    rows = asyncio.run(run_all())
+    engine.dispose()
+    print(
+        f"{args.requests} requests, {args.concurrency} concurrent, "
+        f"{args.latency:g} ms simulated query latency"
+    )
+    print_table(rows)
+
+
+if __name__ == "__main__":
+    main()
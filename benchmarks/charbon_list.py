@@ -0,0 +1,171 @@
+# Compares the charbon list read through ORM models (selectinload of the hosts and
+# pydantic revalidation) with the column projection the route uses, then checks
+# that every charbon read issues a single query. Exits non-zero on a regression.
+# Usage: python -m benchmarks.charbon_list [--charbons N] [--iterations N]
+import argparse
+import random
+import sys
+
+from benchmarks.common import configure, print_table, timed
+
+COURSES = [("MT1", "math"), ("IF1", "info"), ("EL1", "elec")]
+CHECKED_URLS = [
+    "/charbons/",
+    "/charbons/?limit=20",
+    "/charbons/?sort=duration_desc&course_type=math&limit=20",
+    "/charbons/1/",
+]
+
+
+def seed(engine, charbons: int):
+    import models
+
+    random.seed(0)
+    models.Base.metadata.drop_all(bind=engine)
+    models.Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(
+            models.Course.__table__.insert(),
+            [{"id": id, "type": type} for id, type in COURSES],
+        )
+        conn.execute(
+            models.Actionneur.__table__.insert(),
+            [{"id": i, "username": f"actionneur{i}"} for i in range(1, 51)],
+        )
+        conn.execute(
+            models.Charbon.__table__.insert(),
+            [
+                {
+                    "id": i,
+                    "title": f"Charbon {i}",
+                    "description": "Benchmark charbon",
+                    "datetime": random.randint(0, 10**8),
+                    "course_id": random.choice(COURSES)[0],
+                    "duration": random.choice([None, random.randint(600, 7200)]),
+                    "duration_pending": False,
+                    "resources": False,
+                }
+                for i in range(1, charbons + 1)
+            ],
+        )
+        conn.execute(
+            models.CharbonHost.__table__.insert(),
+            [
+                {"charbon_id": i, "actionneur_id": actionneur}
+                for i in range(1, charbons + 1)
+                for actionneur in random.sample(range(1, 51), random.randint(1, 3))
+            ],
+        )
+
+
+def orm_list(session_factory, limit):
+    # The read path before the projection
+    from pydantic import TypeAdapter
+    from sqlalchemy import select
+    from sqlalchemy.orm import contains_eager, selectinload
+
+    import models
+    import schemas
+
+    adapter = TypeAdapter(list[schemas.Charbon])
+    query = (
+        select(models.Charbon)
+        .join(models.Course)
+        .options(
+            selectinload(models.Charbon.actionneurs),
+            contains_eager(models.Charbon.course),
+        )
+        .order_by(models.Charbon.datetime.desc(), models.Charbon.id.desc())
+        .limit(limit)
+    )
+
+    def run():
+        with session_factory() as db:
+            charbons = []
+            for charbon in db.scalars(query).all():
+                charbon_dict = charbon.__dict__
+                charbon_dict["actionneurs"] = [
+                    a.actionneur_id for a in charbon.actionneurs
+                ]
+                charbon_dict["course_type"] = charbon.course.type
+                charbon_dict.pop("course", None)
+                charbons.append(charbon_dict)
+            return adapter.dump_json(adapter.validate_python(charbons))
+
+    return run
+
+
+def projection_list(session_factory, limit):
+    import models
+    from fast_json import dumps
+    from routers.charbons import _charbon_from_row, _select_charbons
+
+    query = (
+        _select_charbons()
+        .order_by(models.Charbon.datetime.desc(), models.Charbon.id.desc())
+        .limit(limit)
+    )
+
+    def run():
+        with session_factory() as db:
+            rows = db.execute(query).all()
+            return dumps([_charbon_from_row(row) for row in rows])
+
+    return run
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--database-url")
+    parser.add_argument("--charbons", type=int, default=10_000)
+    parser.add_argument("--iterations", type=int, default=10)
+    args = parser.parse_args()
+    configure(args.database_url)
+
+    from fastapi.testclient import TestClient
+    from sqlalchemy import event
+
+    import main
+    from cache import charbon_cache
+    from database import SessionLocal, async_engine, engine
+
+    seed(engine, args.charbons)
+
+    statements = []
+
+    @event.listens_for(engine, "before_cursor_execute")
+    @event.listens_for(async_engine.sync_engine, "before_cursor_execute")
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if "table_version" not in statement:
+            statements.append(statement)
+
+    rows = []
+    for limit in (20, args.charbons):
+        for name, path in (("orm", orm_list), ("projection", projection_list)):
+            run = path(SessionLocal, limit)
+            statements.clear()
+            body = run()
+            row = {"path": name, "charbons": limit, "queries": len(statements)}
+            row.update(timed(run, args.iterations))
+            row["bytes"] = len(body)
+            rows.append(row)
+    print_table(rows)
+
+    # Without the lifespan, so the background workers' queries aren't counted
+    client = TestClient(main.app)
+    failures = 0
+    for url in CHECKED_URLS:
+        charbon_cache.clear()
+        statements.clear()
+        client.get(url).raise_for_status()
+        status = "ok  " if len(statements) == 1 else "FAIL"
+        failures += len(statements) != 1
+        print(f"{status} {url}: {len(statements)} queries")
+
+    if failures:
+        print(f"{failures} charbon reads issue more than one query")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,49 @@
+import os
+import statistics
+import tempfile
+import time
+
+DEFAULT_SETTINGS = {
+    "YOUTUBE_API_KEY": "benchmark",
+    "TOKEN_SECRET": "benchmark-token-secret-benchmark-token-secret",
+    "DISCORD_CLIENT_ID": "0",
+    "DISCORD_CLIENT_SECRET": "benchmark",
+}
+
+
+def configure(database_url: str | None = None) -> str:
+    # Must run before importing config/database, which read the settings on import
+    workdir = tempfile.mkdtemp(prefix="plsapi-bench-")
+    if database_url is None:
+        database_url = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ["DATABASE_URL"] = database_url
+    os.environ.setdefault("STORAGE_PATH", os.path.join(workdir, "storage"))
+    for key, value in DEFAULT_SETTINGS.items():
+        os.environ.setdefault(key, value)
+    return database_url
+
+
+def timed(fn, iterations: int) -> dict:
+    samples = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    samples.sort()
+    return {
+        "mean_ms": statistics.mean(samples) * 1000,
+        "p50_ms": samples[len(samples) // 2] * 1000,
+        "max_ms": samples[-1] * 1000,
+    }
+
+
+def print_table(rows: list[dict]):
+    columns = list(rows[0])
+    widths = [max(len(str(c)), *(len(_fmt(r[c])) for r in rows)) for c in columns]
+    print("  ".join(str(c).ljust(w) for c, w in zip(columns, widths)))
+    for row in rows:
+        print("  ".join(_fmt(row[c]).ljust(w) for c, w in zip(columns, widths)))
+
+
+def _fmt(value) -> str:
+    return f"{value:.2f}" if isinstance(value, float) else str(value)
@@ -0,0 +1,285 @@
+# Seeds a database with a synthetic but realistic PLS dataset: courses,
+# actionneurs, charbons with their hosts, exercise topics, exercises with
+# compiled HTML content, announcements and the search index. The same --seed
+# and --scale always give the same rows.
+# Usage: python -m benchmarks.datagen [--database-url URL] [--scale N]
+import argparse
+import itertools
+import random
+import time
+
+from benchmarks.common import configure
+
+COURSES = [
+    *((f"MT{i}", "math") for i in range(1, 11)),
+    *((f"IF{i}", "info") for i in range(1, 9)),
+    *((f"EL{i}", "elec") for i in range(1, 7)),
+    *((f"ME{i}", "meca") for i in range(1, 7)),
+]
+WORDS = (
+    "intégrale dérivée matrice vecteur espace suite série limite continuité "
+    "fonction équation différentielle probabilité variable aléatoire pointeur "
+    "tableau récursivité algorithme complexité graphe arbre tri circuit tension "
+    "courant résistance condensateur inductance transistor force énergie "
+    "moment inertie onde champ électrique magnétique potentiel thermodynamique "
+    "entropie gaz pression volume cinématique dynamique statique poutre "
+    "contrainte déformation révision examen exercice corrigé théorème preuve "
+    "démonstration méthode propriété définition exemple application calcul"
+).split()
+# Exercise contents are drawn from a pool, compressing one per row would make
+# seeding large scales slow without changing what the routes do
+CONTENT_POOL_SIZE = 256
+# Dates are spread over the four years before a fixed day, not the current
+# time, so that reruns give the same rows
+EPOCH = 1_704_067_200
+SPAN = 4 * 365 * 24 * 3600
+
+
+def counts(scale: int) -> dict:
+    # --scale is the number of charbons and exercises, the other tables grow
+    # with it in the proportions of the production database
+    return {
+        "actionneurs": max(20, scale // 100),
+        "charbons": scale,
+        "exercise_topics": max(10, scale // 50),
+        "exercises": scale,
+        "announcements": max(10, scale // 10),
+    }
+
+
+def _words(rng: random.Random, low: int, high: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(rng.randint(low, high)))
+
+
+def _title(rng: random.Random) -> str:
+    return _words(rng, 2, 6).capitalize()[:100]
+
+
+def compiled_html(rng: random.Random) -> str:
+    # Shaped like the PLS-markdown compiler's output: sections of paragraphs,
+    # inline and display math, lists and code blocks
+    parts = [f"<h1>{_title(rng)}</h1>"]
+    for section in range(rng.randint(2, 8)):
+        parts.append(f"<h2>Partie {section + 1}. {_title(rng)}</h2>")
+        for _ in range(rng.randint(1, 4)):
+            parts.append(
+                f'<p>{_words(rng, 20, 80)} <span class="math inline">'
+                f"\\(x_{{{rng.randint(0, 9)}}}^2 + {rng.randint(1, 99)}\\)</span> "
+                f"{_words(rng, 5, 30)}.</p>"
+            )
+        choice = rng.random()
+        if choice < 0.3:
+            items = "".join(f"<li>{_words(rng, 4, 15)}</li>" for _ in range(4))
+            parts.append(f"<ol>{items}</ol>")
+        elif choice < 0.5:
+            parts.append(
+                '<div class="math display">\\[\\int_0^{1} f(x)\\,dx = '
+                f"\\frac{{{rng.randint(1, 9)}}}{{{rng.randint(2, 9)}}}\\]</div>"
+            )
+        elif choice < 0.65:
+            lines = "\n".join(
+                f"    x{i} = f(x{i - 1}) + {rng.randint(0, 99)}" for i in range(1, 8)
+            )
+            parts.append(f'<pre><code class="language-python">{lines}</code></pre>')
+    return "\n".join(parts)
+
+
+def _batches(rows, size: int):
+    rows = iter(rows)
+    while batch := list(itertools.islice(rows, size)):
+        yield batch
+
+
+def _insert(engine, table, rows, batch_size: int) -> int:
+    inserted = 0
+    for batch in _batches(rows, batch_size):
+        with engine.begin() as conn:
+            conn.execute(table.insert(), batch)
+        inserted += len(batch)
+    return inserted
+
+
+def _index(engine, kind: str, documents, batch_size: int):
+    from search import index_statements
+
+    for batch in _batches(documents, batch_size):
+        with engine.begin() as conn:
+            for statement in index_statements(kind, batch):
+                conn.execute(*statement)
+
+
+def generate(engine, scale: int, seed: int = 0, batch_size: int = 5000, search=True):
+    import models
+    from compression import STORAGE_ENCODING, compress
+    from search import html_text
+
+    sizes = counts(scale)
+    models.Base.metadata.drop_all(bind=engine)
+    models.Base.metadata.create_all(bind=engine)
+
+    _insert(
+        engine,
+        models.Course.__table__,
+        ({"id": id, "type": type} for id, type in COURSES),
+        batch_size,
+    )
+    _insert(
+        engine,
+        models.Actionneur.__table__,
+        (
+            # The first actionneur is an admin, the load test signs in as it
+            {"id": i, "username": f"actionneur{i}", "is_admin": i == 1}
+            for i in range(1, sizes["actionneurs"] + 1)
+        ),
+        batch_size,
+    )
+
+    def charbons(rng):
+        for i in range(1, sizes["charbons"] + 1):
+            has_replay = rng.random() < 0.6
+            yield {
+                "id": i,
+                "title": _title(rng),
+                "description": _words(rng, 5, 60),
+                "datetime": EPOCH - rng.randint(0, SPAN),
+                "course_id": rng.choice(COURSES)[0],
+                "replay_link": (
+                    f"https://www.youtube.com/watch?v={rng.getrandbits(44):011x}"
+                    if has_replay
+                    else None
+                ),
+                "duration": rng.randint(1200, 10800) if has_replay else None,
+                "duration_pending": False,
+                "resources": rng.random() < 0.4,
+            }
+
+    def hosts(rng):
+        for i in range(1, sizes["charbons"] + 1):
+            for actionneur in rng.sample(
+                range(1, sizes["actionneurs"] + 1), rng.randint(1, 3)
+            ):
+                yield {"charbon_id": i, "actionneur_id": actionneur}
+
+    def topics(rng):
+        for i in range(1, sizes["exercise_topics"] + 1):
+            yield {"id": i, "topic": _title(rng), "course_id": rng.choice(COURSES)[0]}
+
+    rng = random.Random(seed)
+    pool = []
+    for _ in range(CONTENT_POOL_SIZE):
+        html = compiled_html(rng)
+        raw = html.encode("utf-8")
+        pool.append((html_text(html), compress(raw), len(raw)))
+
+    def exercises(rng):
+        for i in range(1, sizes["exercises"] + 1):
+            _, stored, size = pool[_content_index(i, seed)]
+            yield {
+                "id": i,
+                "title": _title(rng),
+                "difficulty": rng.randint(1, 5),
+                "is_corrected": rng.random() < 0.7,
+                "source": f"Examen {rng.randint(2010, 2024)}",
+                "topic_id": rng.randint(1, sizes["exercise_topics"]),
+                "copyright": rng.random() < 0.1,
+                "content": stored,
+                "content_encoding": STORAGE_ENCODING,
+                "content_size": size,
+            }
+
+    def announcements(rng):
+        for i in range(1, sizes["announcements"] + 1):
+            yield {
+                "id": i,
+                "title": _title(rng),
+                "content": _words(rng, 10, 200)[:5000],
+                "datetime": EPOCH - rng.randint(0, SPAN),
+            }
+
+    # Each table has its own generator seeded from --seed, so changing one
+    # table's generator doesn't shift the others' rows
+    tables = [
+        ("charbons", models.Charbon.__table__, charbons),
+        ("hosts", models.CharbonHost.__table__, hosts),
+        ("exercise_topics", models.ExerciseTopic.__table__, topics),
+        ("exercises", models.Exercise.__table__, exercises),
+        ("announcements", models.Announcement.__table__, announcements),
+    ]
+    inserted = {"courses": len(COURSES), "actionneurs": sizes["actionneurs"]}
+    for index, (name, table, rows) in enumerate(tables):
+        start = time.perf_counter()
+        rng = random.Random(f"{seed}-{index}")
+        inserted[name] = _insert(engine, table, rows(rng), batch_size)
+        elapsed = time.perf_counter() - start
+        print(f"{name}: {inserted[name]} rows in {elapsed:.1f}s")
+
+    if search:
+        start = time.perf_counter()
+        charbon, announcement, exercise = (
+            models.Charbon.__table__,
+            models.Announcement.__table__,
+            models.Exercise.__table__,
+        )
+        documents = {
+            "charbon": _read(
+                engine, batch_size, charbon.c.title, charbon.c.description
+            ),
+            "announcement": _read(
+                engine, batch_size, announcement.c.title, announcement.c.content
+            ),
+            "exercise": (
+                (id, title, pool[_content_index(id, seed)][0])
+                for id, title in _read(engine, batch_size, exercise.c.title)
+            ),
+        }
+        for kind, rows in documents.items():
+            _index(engine, kind, (tuple(row) for row in rows), batch_size)
+        print(f"search index in {time.perf_counter() - start:.1f}s")
+    return inserted
+
+
+def _content_index(exercise_id: int, seed: int) -> int:
+    return (exercise_id * 7919 + seed) % CONTENT_POOL_SIZE
+
+
+def _read(engine, batch_size: int, *columns):
+    # Rows with their id, by keyset pages so large tables aren't held at once
+    from sqlalchemy import select
+
+    id = columns[0].table.c.id
+    last_id = 0
+    while True:
+        with engine.connect() as conn:
+            rows = conn.execute(
+                select(id, *columns).where(id > last_id).order_by(id).limit(batch_size)
+            ).all()
+        if not rows:
+            return
+        yield from rows
+        last_id = rows[-1][0]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--database-url")
+    parser.add_argument("--scale", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--no-search-index", action="store_true")
+    args = parser.parse_args()
+    database_url = configure(args.database_url)
+
+    from database import engine
+
+    print(f"Seeding {database_url} at scale {args.scale}")
+    generate(
+        engine,
+        args.scale,
+        seed=args.seed,
+        batch_size=args.batch_size,
+        search=not args.no_search_index,
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# Compares the exercise list/metadata reads with and without loading the content
+# blob. Usage: python -m benchmarks.exercise_list [--rows N] [--content-size BYTES]
+import argparse
+import os
+
+from benchmarks.common import configure, print_table, timed
+
+
+def _loaded_bytes(objects) -> int:
+    from sqlalchemy import inspect
+
+    total = 0
+    for obj in objects:
+        for value in inspect(obj).dict.values():
+            if isinstance(value, (bytes, str)):
+                total += len(value)
+            elif isinstance(value, (int, bool)):
+                total += 8
+    return total
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--database-url")
+    parser.add_argument("--rows", type=int, default=300)
+    parser.add_argument("--content-size", type=int, default=40_000)
+    parser.add_argument("--iterations", type=int, default=20)
+    args = parser.parse_args()
+    configure(args.database_url)
+
+    from sqlalchemy.orm import undefer
+
+    import models
+    from database import SessionLocal, engine
+
+    models.Base.metadata.create_all(bind=engine)
+    db = SessionLocal()
+    db.add(models.Course(id="BNCH", type="info"))
+    db.add(models.ExerciseTopic(id=1, topic="Benchmark", course_id="BNCH"))
+    db.add_all(
+        models.Exercise(
+            title=f"Exercise {i}",
+            difficulty=i % 5,
+            is_corrected=True,
+            source="benchmark",
+            topic_id=1,
+            content=os.urandom(args.content_size),
+        )
+        for i in range(args.rows)
+    )
+    db.commit()
+
+    paths = {
+        "eager content (before)": lambda: db.query(models.Exercise).options(
+            undefer(models.Exercise.content)
+        ),
+        "deferred content (after)": lambda: db.query(models.Exercise),
+    }
+
+    rows = []
+    for name, query in paths.items():
+        db.expunge_all()
+        loaded = _loaded_bytes(query().all())
+
+        def run():
+            db.expunge_all()
+            query().all()
+
+        rows.append(
+            {"path": name, "bytes_loaded": loaded, **timed(run, args.iterations)}
+        )
+
+    db.close()
+    print(f"{args.rows} exercises, {args.content_size} bytes of content each")
+    print_table(rows)
+
+
+if __name__ == "__main__":
+    main()
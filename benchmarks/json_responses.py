@@ -0,0 +1,160 @@
+# Times the list routes' response handling without the database: the same rows
+# returned as data, validated against response_model and encoded by FastAPI, and
+# sent as a FastJSONResponse.
+# Usage: python -m benchmarks.json_responses [--rows N] [--iterations N]
+import argparse
+import asyncio
+import json
+
+from benchmarks.common import print_table, timed
+
+
+def sample_rows(rows: int) -> dict:
+    import schemas
+
+    charbon = {
+        "title": "Charbon",
+        "description": "Révisions de l'examen " * 10,
+        "datetime": 1700000000,
+        "course_id": "MT1",
+        "replay_link": "https://www.youtube.com/watch?v=dQw4w9WgXcQ",
+        "actionneurs": ["123456789012345678", "234567890123456789"],
+        "course_type": "math",
+        "duration": 3600,
+        "duration_pending": False,
+        "resources": True,
+    }
+    announcement = {"title": "Annonce", "content": "Contenu " * 50, "datetime": 1}
+    exercise = {
+        "title": "Exercise",
+        "difficulty": 3,
+        "is_corrected": True,
+        "source": "Exam 2023",
+        "topic_id": 1,
+        "copyright": False,
+    }
+    topic = {"topic": "Topic", "course_id": "MT1", "course_type": "math"}
+    actionneur = {"username": "actionneur", "is_admin": False}
+    return {
+        "/charbons/": (
+            schemas.Charbon,
+            [{**charbon, "id": i} for i in range(rows)],
+        ),
+        "/announcements/": (
+            schemas.Announcement,
+            [{**announcement, "id": i} for i in range(rows)],
+        ),
+        "/exercises/": (
+            schemas.Exercise,
+            [{**exercise, "id": i} for i in range(rows)],
+        ),
+        "/exercise_topics/": (
+            schemas.ExerciseTopic,
+            [{**topic, "id": i} for i in range(rows)],
+        ),
+        "/courses/": (
+            schemas.Course,
+            [{"id": f"C{i}", "type": "info"} for i in range(rows)],
+        ),
+        "/actionneurs/": (
+            schemas.Actionneur,
+            [{**actionneur, "id": str(10**17 + i)} for i in range(rows)],
+        ),
+    }
+
+
+def build_app(routes: dict):
+    from typing import List
+
+    from fastapi import FastAPI
+
+    from fast_json import FastJSONResponse
+
+    def endpoints(rows):
+        async def validated():
+            return rows
+
+        async def fast():
+            return FastJSONResponse(rows)
+
+        return validated, fast
+
+    app = FastAPI()
+    for path, (schema, rows) in routes.items():
+        validated, fast = endpoints(rows)
+        app.get(f"/validated{path}", response_model=List[schema])(validated)
+        app.get(
+            f"/fast{path}",
+            response_model=List[schema],
+            response_class=FastJSONResponse,
+        )(fast)
+    return app
+
+
+async def get(app, path: str) -> bytes:
+    # Calls the ASGI app directly, a test client would add more than it measures
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": b"",
+        "headers": [],
+        "server": ("bench", 80),
+    }
+    body = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        if message["type"] == "http.response.body":
+            body.append(message.get("body", b""))
+
+    await app(scope, receive, send)
+    return b"".join(body)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=500)
+    parser.add_argument("--iterations", type=int, default=50)
+    args = parser.parse_args()
+
+    import fast_json
+
+    routes = sample_rows(args.rows)
+    app = build_app(routes)
+    loop = asyncio.new_event_loop()
+
+    rows = []
+    for path in routes:
+
+        def validated():
+            return loop.run_until_complete(get(app, f"/validated{path}"))
+
+        def fast():
+            return loop.run_until_complete(get(app, f"/fast{path}"))
+
+        assert json.loads(validated()) == json.loads(fast()), path
+        before = timed(validated, args.iterations)
+        after = timed(fast, args.iterations)
+        rows.append(
+            {
+                "route": path,
+                "validated_ms": before["p50_ms"],
+                "fast_ms": after["p50_ms"],
+                "speedup": before["p50_ms"] / after["p50_ms"],
+            }
+        )
+    encoder = "orjson" if fast_json.orjson is not None else "json"
+    print(f"{args.rows} rows per response, FastJSONResponse encoding with {encoder}")
+    print_table(rows)
+    loop.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+# Seeds a datagen dataset, then sends each scenario's requests --concurrency at
+# a time, covering every router, and reports p50/p95/p99 latency and throughput
+# per scenario. --output writes the report as a JSON baseline; --compare reads
+# one and exits non-zero when a scenario got slower than --tolerance allows.
+# Requests go to the app in process unless --url points at a running server,
+# which must use the same database and TOKEN_SECRET.
+# Usage: python -m benchmarks.load_test [--scale N] [--concurrency C]
+#        [--output baseline.json] [--compare baseline.json]
+import argparse
+import asyncio
+import json
+import math
+import platform
+import random
+import subprocess
+import sys
+import time
+
+from benchmarks.common import configure, print_table
+from benchmarks.datagen import COURSES, WORDS, counts
+
+COURSE_TYPES = sorted({type for _, type in COURSES})
+
+
+def scenarios(sizes: dict) -> list:
+    # (name, share of --requests, signed in as the admin, request builder)
+    def get(url):
+        return lambda rng: ("GET", url(rng), None)
+
+    def new_announcement(rng):
+        body = {"title": "Load test", "content": rng.choice(WORDS), "datetime": 0}
+        return "POST", "/announcements/", body
+
+    return [
+        ("charbons_page", 1, False, get(lambda r: "/charbons/?limit=20")),
+        (
+            "charbons_filtered",
+            1,
+            False,
+            get(
+                lambda r: f"/charbons/?limit=20&course_type={r.choice(COURSE_TYPES)}"
+                f"&offset={r.randrange(0, 100)}"
+            ),
+        ),
+        ("charbons_all", 0.1, False, get(lambda r: "/charbons/")),
+        (
+            "charbon",
+            1,
+            False,
+            get(lambda r: f"/charbons/{r.randint(1, sizes['charbons'])}/"),
+        ),
+        (
+            "exercises_topic",
+            1,
+            False,
+            get(
+                lambda r: f"/exercises/?topic_id={r.randint(1, sizes['exercise_topics'])}"
+            ),
+        ),
+        (
+            "exercise",
+            1,
+            False,
+            get(lambda r: f"/exercises/{r.randint(1, sizes['exercises'])}/"),
+        ),
+        (
+            "exercise_content",
+            1,
+            # Copyrighted contents are only served to signed in users
+            True,
+            get(lambda r: f"/exercises/{r.randint(1, sizes['exercises'])}/content/"),
+        ),
+        ("exercise_topics", 1, False, get(lambda r: "/exercise_topics/")),
+        (
+            "exercise_topic",
+            1,
+            False,
+            get(
+                lambda r: f"/exercise_topics/{r.randint(1, sizes['exercise_topics'])}/"
+            ),
+        ),
+        ("courses", 1, False, get(lambda r: "/courses/")),
+        ("course", 1, False, get(lambda r: f"/courses/{r.choice(COURSES)[0]}/")),
+        ("actionneurs", 1, False, get(lambda r: "/actionneurs/")),
+        (
+            "announcements_page",
+            1,
+            False,
+            get(lambda r: f"/announcements/?limit=10&offset={r.randrange(0, 100)}"),
+        ),
+        (
+            "announcement",
+            1,
+            False,
+            get(lambda r: f"/announcements/{r.randint(1, sizes['announcements'])}/"),
+        ),
+        (
+            "search",
+            1,
+            False,
+            get(lambda r: f"/search/?q={r.choice(WORDS)}+{r.choice(WORDS)}"),
+        ),
+        ("auth_me", 1, True, get(lambda r: "/auth/me/")),
+        ("announcement_create", 0.2, True, new_announcement),
+        (
+            "export_announcements",
+            0.05,
+            True,
+            get(lambda r: "/export/announcements.ndjson"),
+        ),
+        ("metrics", 0.1, False, get(lambda r: "/metrics")),
+    ]
+
+
+def percentile(samples: list, q: float) -> float:
+    # Nearest rank on sorted samples
+    return samples[max(0, math.ceil(q * len(samples)) - 1)]
+
+
+async def run_scenario(client, requests: list, headers: dict, concurrency: int):
+    samples = []
+    errors = 0
+    pending = iter(requests)
+
+    async def worker():
+        nonlocal errors
+        # Workers share the iterator, so at most --concurrency requests are in flight
+        for method, url, body in pending:
+            start = time.perf_counter()
+            response = await client.request(method, url, json=body, headers=headers)
+            samples.append(time.perf_counter() - start)
+            errors += response.status_code >= 400
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    samples.sort()
+    return {
+        "requests": len(samples),
+        "errors": errors,
+        "throughput_rps": round(len(samples) / elapsed, 2),
+        "mean_ms": round(sum(samples) / len(samples) * 1000, 3),
+        "p50_ms": round(percentile(samples, 0.5) * 1000, 3),
+        "p95_ms": round(percentile(samples, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(samples, 0.99) * 1000, 3),
+        "max_ms": round(samples[-1] * 1000, 3),
+    }
+
+
+async def run(args, sizes: dict, token: str) -> dict:
+    import httpx
+
+    if args.url:
+        client = httpx.AsyncClient(base_url=args.url, timeout=60)
+    else:
+        import main
+
+        # Without the lifespan, so the background workers don't add load
+        transport = httpx.ASGITransport(app=main.app, raise_app_exceptions=False)
+        client = httpx.AsyncClient(transport=transport, base_url="http://bench")
+
+    admin = {"Authorization": f"Bearer {token}"}
+    results = {}
+    async with client:
+        for index, (name, share, auth, build) in enumerate(scenarios(sizes)):
+            if args.scenario and name not in args.scenario:
+                continue
+            # Requests are drawn up front from a generator per scenario, so every
+            # run sends the same ones
+            rng = random.Random(f"{args.seed}-{index}")
+            count = max(args.concurrency, int(args.requests * share))
+            warmup = [build(rng) for _ in range(args.warmup)]
+            requests = [build(rng) for _ in range(count)]
+            headers = admin if auth else {}
+            await run_scenario(client, warmup, headers, args.concurrency)
+            results[name] = await run_scenario(
+                client, requests, headers, args.concurrency
+            )
+    return results
+
+
+def _git_commit() -> str | None:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(baseline: dict, report: dict, tolerance: float) -> bool:
+    for key in ("scale", "concurrency", "requests", "target", "database"):
+        if baseline["meta"].get(key) != report["meta"].get(key):
+            print(
+                f"Warning: {key} differs from the baseline "
+                f"({baseline['meta'].get(key)} against {report['meta'].get(key)})"
+            )
+
+    rows = []
+    regressions = []
+    for name, result in report["scenarios"].items():
+        base = baseline["scenarios"].get(name)
+        if base is None:
+            continue
+        p95_change = result["p95_ms"] / base["p95_ms"] - 1
+        throughput_change = result["throughput_rps"] / base["throughput_rps"] - 1
+        regressed = p95_change > tolerance or throughput_change < -tolerance
+        rows.append(
+            {
+                "scenario": name,
+                "base_p95_ms": base["p95_ms"],
+                "p95_ms": result["p95_ms"],
+                "p95": f"{p95_change:+.1%}",
+                "base_rps": base["throughput_rps"],
+                "rps": result["throughput_rps"],
+                "throughput": f"{throughput_change:+.1%}",
+                "status": "SLOWER" if regressed else "ok",
+            }
+        )
+        if regressed:
+            regressions.append(name)
+    print_table(rows)
+    if regressions:
+        print(
+            f"Slower than the baseline by over {tolerance:.0%}: {', '.join(regressions)}"
+        )
+    return not regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--database-url")
+    parser.add_argument("--url", help="running server, instead of the app in process")
+    parser.add_argument("--scale", type=int, default=10_000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--no-seed", action="store_true", help="reuse a database seeded at --scale"
+    )
+    parser.add_argument("--requests", type=int, default=500, help="per scenario")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=20)
+    parser.add_argument("--scenario", action="append", help="only run these")
+    parser.add_argument("--output", help="write the report to this JSON file")
+    parser.add_argument("--compare", help="baseline JSON file to compare against")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+    database_url = configure(args.database_url)
+
+    from benchmarks.datagen import generate
+    from database import engine
+    from discord_auth import create_jwt
+
+    if not args.no_seed:
+        generate(engine, args.scale, seed=args.seed)
+    sizes = counts(args.scale)
+    # datagen makes the first actionneur an admin. Discord logins sign string ids
+    token = create_jwt("1", int(time.time()) + 24 * 3600)
+
+    scenario_results = asyncio.run(run(args, sizes, token))
+    report = {
+        "meta": {
+            "created": int(time.time()),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "database": engine.dialect.name,
+            "target": args.url or "in-process",
+            "scale": args.scale,
+            "seed": args.seed,
+            "requests": args.requests,
+            "concurrency": args.concurrency,
+        },
+        "scenarios": scenario_results,
+    }
+    print(f"{database_url} at scale {args.scale}, concurrency {args.concurrency}")
+    print_table([{"scenario": name, **r} for name, r in scenario_results.items()])
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+            f.write("\n")
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if not compare(baseline, report, args.tolerance):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,62 @@
+# Times a trivial route with and without MetricsMiddleware, and a single
+# histogram observation, to check that metrics can stay on in production.
+# Usage: python -m benchmarks.metrics_overhead [--iterations N]
+import argparse
+import asyncio
+
+from benchmarks.common import print_table, timed
+from benchmarks.json_responses import get
+
+
+def build_app(instrumented: bool):
+    from fastapi import FastAPI
+
+    from metrics import MetricsMiddleware
+
+    app = FastAPI()
+
+    @app.get("/items/{id}/")
+    async def get_item(id: int):
+        return {"id": id}
+
+    if instrumented:
+        app.add_middleware(MetricsMiddleware)
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--iterations", type=int, default=5000)
+    args = parser.parse_args()
+
+    from metrics import Histogram
+
+    loop = asyncio.new_event_loop()
+    rows = []
+    results = {}
+    for instrumented in (False, True):
+        app = build_app(instrumented)
+
+        def request():
+            return loop.run_until_complete(get(app, "/items/1/"))
+
+        request()
+        results[instrumented] = timed(request, args.iterations)
+        rows.append({"middleware": instrumented, **results[instrumented]})
+    loop.close()
+
+    histogram = Histogram("benchmark_seconds", "Benchmark", ("route",))
+
+    def observe():
+        for _ in range(1000):
+            histogram.observe(0.042, "/items/{id}/")
+
+    per_observe_us = timed(observe, 100)["p50_ms"]
+    print_table(rows)
+    overhead_us = (results[True]["p50_ms"] - results[False]["p50_ms"]) * 1000
+    print(f"Middleware overhead: {overhead_us:.1f} us per request (p50)")
+    print(f"Histogram observation: {per_observe_us:.2f} us")
+
+
+if __name__ == "__main__":
+    main()
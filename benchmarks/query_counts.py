@@ -0,0 +1,166 @@
+# Requests every read route with the SQL profiler on and fails if one issues
+# more queries than its budget or repeats a statement (N+1). Budgets count the
+# table_version lookups of conditional GETs.
+# Usage: python -m benchmarks.query_counts [--rows N]
+import argparse
+import os
+import sys
+
+from benchmarks.common import configure, print_table
+
+# (url, maximum number of queries)
+BUDGETS = [
+    ("/charbons/", 2),
+    ("/charbons/?limit=20&course_type=math", 2),
+    ("/charbons/1/", 2),
+    ("/announcements/", 2),
+    ("/announcements/1/", 2),
+    ("/exercises/", 2),
+    ("/exercises/?topic_id=1", 2),
+    ("/exercises/1/", 2),
+    ("/exercises/1/content/", 1),
+    ("/exercise_topics/", 2),
+    ("/exercise_topics/1/", 2),
+    ("/courses/", 2),
+    ("/courses/MT1/", 2),
+    ("/actionneurs/", 2),
+    ("/search/?q=charbon+exercise", 5),
+]
+
+
+def seed(engine, rows: int):
+    import models
+    from compression import STORAGE_ENCODING, compress
+    from search import index_statements
+
+    models.Base.metadata.drop_all(bind=engine)
+    models.Base.metadata.create_all(bind=engine)
+    content = b"<p>Exercise</p>" * 20
+    with engine.begin() as conn:
+        conn.execute(
+            models.Course.__table__.insert(),
+            [{"id": "MT1", "type": "math"}, {"id": "IF1", "type": "info"}],
+        )
+        conn.execute(
+            models.Actionneur.__table__.insert(),
+            [{"id": i, "username": f"actionneur{i}"} for i in range(1, 11)],
+        )
+        conn.execute(
+            models.Charbon.__table__.insert(),
+            [
+                {
+                    "id": i,
+                    "title": f"Charbon {i}",
+                    "description": "Benchmark charbon",
+                    "datetime": i,
+                    "course_id": "MT1" if i % 2 else "IF1",
+                    "duration_pending": False,
+                    "resources": False,
+                }
+                for i in range(1, rows + 1)
+            ],
+        )
+        conn.execute(
+            models.CharbonHost.__table__.insert(),
+            [
+                {"charbon_id": i, "actionneur_id": actionneur}
+                for i in range(1, rows + 1)
+                for actionneur in (i % 10 + 1, (i + 1) % 10 + 1)
+            ],
+        )
+        conn.execute(
+            models.Announcement.__table__.insert(),
+            [
+                {"id": i, "title": f"Annonce {i}", "content": "Charbon", "datetime": i}
+                for i in range(1, rows + 1)
+            ],
+        )
+        conn.execute(
+            models.ExerciseTopic.__table__.insert(),
+            [
+                {"id": i, "topic": f"Topic {i}", "course_id": "MT1" if i % 2 else "IF1"}
+                for i in range(1, 11)
+            ],
+        )
+        conn.execute(
+            models.Exercise.__table__.insert(),
+            [
+                {
+                    "id": i,
+                    "title": f"Exercise {i}",
+                    "difficulty": i % 5,
+                    "is_corrected": bool(i % 2),
+                    "source": "Benchmark",
+                    "topic_id": i % 10 + 1,
+                    "content": compress(content),
+                    "content_encoding": STORAGE_ENCODING,
+                    "content_size": len(content),
+                }
+                for i in range(1, rows + 1)
+            ],
+        )
+        for kind, documents in (
+            (
+                "charbon",
+                [(i, f"Charbon {i}", "Benchmark charbon") for i in range(1, rows + 1)],
+            ),
+            (
+                "exercise",
+                [(i, f"Exercise {i}", "Exercise") for i in range(1, rows + 1)],
+            ),
+        ):
+            for statement in index_statements(kind, documents):
+                conn.execute(*statement)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--database-url")
+    parser.add_argument("--rows", type=int, default=200)
+    args = parser.parse_args()
+    os.environ["SQL_PROFILER"] = "header"
+    configure(args.database_url)
+
+    from fastapi.testclient import TestClient
+
+    import main
+    from cache import charbon_cache
+    from database import engine
+    from sql_profiler import (
+        PROFILE_HEADER,
+        PROFILE_ID_HEADER,
+        QUERIES_HEADER,
+        REPEATED_HEADER,
+        get_profile,
+    )
+
+    seed(engine, args.rows)
+
+    # Without the lifespan, so the background workers' queries aren't counted
+    client = TestClient(main.app)
+    rows = []
+    failures = []
+    for url, budget in BUDGETS:
+        charbon_cache.clear()
+        response = client.get(url, headers={PROFILE_HEADER: "1"})
+        response.raise_for_status()
+        queries = int(response.headers[QUERIES_HEADER])
+        repeated = int(response.headers[REPEATED_HEADER])
+        rows.append(
+            {"url": url, "queries": queries, "budget": budget, "repeated": repeated}
+        )
+        if queries > budget or repeated:
+            profile = get_profile(int(response.headers[PROFILE_ID_HEADER]))
+            failures.append((url, profile.report()["repeated_statements"]))
+    print_table(rows)
+
+    for url, repeated in failures:
+        print(f"FAIL {url}")
+        for statement in repeated:
+            print(f"  {statement['count']}x {statement['shape']}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+# Seeds a large dataset on MySQL and checks with EXPLAIN that every list query
+# uses an index for its filters and sort order. Exits non-zero on a regression.
+# The same checks against SQLite run in tests/test_query_plans.py.
+# Usage: python -m benchmarks.query_plans --database-url URL [--charbons N]
+import argparse
+import itertools
+import random
+import re
+import sys
+from urllib.parse import parse_qs, urlsplit
+
+from benchmarks.common import configure
+
+CHECKED_TABLES = {"charbon", "charbon_host", "announcement", "exercise"}
+# Query parameters that don't filter rows
+UNFILTERED_PARAMETERS = {"sort", "limit", "offset", "cursor"}
+ORDER_BY = re.compile(r"ORDER BY \(?(\w+)\.")
+COURSES = [("MT1", "math"), ("MT2", "math"), ("IF1", "info"), ("EL1", "elec")]
+
+
+def seed(engine, charbons: int, announcements: int, exercises: int):
+    import models
+
+    random.seed(0)
+    models.Base.metadata.drop_all(bind=engine)
+    models.Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(
+            models.Course.__table__.insert(),
+            [{"id": id, "type": type} for id, type in COURSES],
+        )
+        conn.execute(
+            models.Actionneur.__table__.insert(),
+            [{"id": i, "username": f"actionneur{i}"} for i in range(1, 51)],
+        )
+        conn.execute(
+            models.Charbon.__table__.insert(),
+            [
+                {
+                    "id": i,
+                    "title": f"Charbon {i}",
+                    "description": "",
+                    "datetime": random.randint(0, 10**8),
+                    "course_id": random.choice(COURSES)[0],
+                    "duration": random.choice([None, random.randint(600, 7200)]),
+                }
+                for i in range(1, charbons + 1)
+            ],
+        )
+        conn.execute(
+            models.CharbonHost.__table__.insert(),
+            [
+                {"charbon_id": i, "actionneur_id": random.randint(1, 50)}
+                for i in range(1, charbons + 1)
+            ],
+        )
+        conn.execute(
+            models.Announcement.__table__.insert(),
+            [
+                {
+                    "title": f"Announcement {random.random()}",
+                    "content": "",
+                    "datetime": random.randint(0, 10**8),
+                }
+                for _ in range(announcements)
+            ],
+        )
+        conn.execute(
+            models.ExerciseTopic.__table__.insert(),
+            [
+                {"id": i, "topic": f"Topic {i}", "course_id": COURSES[i % 4][0]}
+                for i in range(1, 101)
+            ],
+        )
+        conn.execute(
+            models.Exercise.__table__.insert(),
+            [
+                {
+                    "title": f"Exercise {i}",
+                    "difficulty": 1,
+                    "is_corrected": True,
+                    "source": "",
+                    "topic_id": random.randint(1, 100),
+                    "content": b"",
+                }
+                for i in range(exercises)
+            ],
+        )
+        if engine.dialect.name == "sqlite":
+            conn.exec_driver_sql("ANALYZE")
+        else:
+            conn.exec_driver_sql(f"ANALYZE TABLE {', '.join(sorted(CHECKED_TABLES))}")
+
+
+def list_urls():
+    from routers import announcements, charbons
+
+    filters = [
+        "",
+        "&course_type=math",
+        "&course=MT1",
+        "&min_date=50000000",
+        "&max_date=50000000",
+        "&min_date=20000000&max_date=30000000",
+        "&course=IF1&min_date=20000000",
+    ]
+    for sort, filter, limit in itertools.product(
+        charbons.SortOptions, filters, ["", "&limit=20"]
+    ):
+        yield f"/charbons/?sort={sort.value}{filter}{limit}"
+    for sort in announcements.SortOptions:
+        yield f"/announcements/?sort={sort.value}"
+    yield "/exercises/?topic_id=3"
+
+
+def _ordered_table(statement: str) -> str | None:
+    # The table of the outer ORDER BY, the last one in the statement
+    tables = ORDER_BY.findall(statement)
+    return tables[-1] if tables else None
+
+
+def explain(conn, statement: str, parameters, filtered: bool) -> list[str]:
+    # A sort is only accepted over rows of the ordered table found through an
+    # index lookup (e.g. a date range sorted by duration), it is then bounded by
+    # the filter. A filtered request must search its tables: walking a whole
+    # index and filtering its rows is a full scan too.
+    problems = []
+    ordered = _ordered_table(statement)
+    rows = list(conn.exec_driver_sql(f"EXPLAIN {statement}", parameters).mappings())
+    bounded = {
+        row["table"]
+        for row in rows
+        if row["type"] in ("const", "eq_ref", "ref", "range")
+    }
+    for row in rows:
+        if row["table"] in CHECKED_TABLES:
+            if row["type"] == "ALL":
+                problems.append(f"full scan on {row['table']}")
+            elif row["type"] == "index" and filtered:
+                problems.append(f"full index scan on {row['table']}")
+        # MySQL reports the sort on the first table of the join, which isn't
+        # always the ordered one
+        if "filesort" in (row["Extra"] or "") and ordered not in bounded:
+            problems.append(f"filesort on {row['table']}")
+    return problems
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--database-url", required=True)
+    parser.add_argument("--charbons", type=int, default=20_000)
+    parser.add_argument("--announcements", type=int, default=5_000)
+    parser.add_argument("--exercises", type=int, default=5_000)
+    args = parser.parse_args()
+    if not args.database_url.startswith("mysql"):
+        parser.error("--database-url must be a MySQL URL, pytest checks SQLite")
+    configure(args.database_url)
+
+    from fastapi.testclient import TestClient
+    from sqlalchemy import event
+
+    import main
+    from cache import charbon_cache
+    from database import async_engine, engine
+
+    seed(engine, args.charbons, args.announcements, args.exercises)
+
+    statements = []
+
+    # Routes run on the async engine, the sync one only seeds and explains
+    @event.listens_for(async_engine.sync_engine, "before_cursor_execute")
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if "table_version" not in statement:
+            statements.append((statement, parameters))
+
+    failures = 0
+    with TestClient(main.app) as client, engine.connect() as conn:
+        for url in list_urls():
+            statements.clear()
+            # A cached response issues no query, its plan would go unchecked
+            charbon_cache.clear()
+            response = client.get(url)
+            response.raise_for_status()
+            filtered = bool(set(parse_qs(urlsplit(url).query)) - UNFILTERED_PARAMETERS)
+            # Lazy loads repeat the same statement, their plan only needs checking once
+            captured = {statement: parameters for statement, parameters in statements}
+            if not captured:
+                # The listener isn't on the engine the routes use, nothing would
+                # ever be explained
+                failures += 1
+                print(f"FAIL {url}")
+                print("     no statement captured")
+                continue
+            problems = [
+                problem
+                for statement, parameters in captured.items()
+                for problem in explain(conn, statement, parameters, filtered)
+            ]
+            if problems and "-v" in sys.argv:
+                print(captured)
+            if problems:
+                failures += 1
+                print(f"FAIL {url}")
+                for problem in problems:
+                    print(f"     {problem}")
+            else:
+                print(f"ok   {url}")
+
+    if failures:
+        print(f"{failures} routes use a full scan or a sort, or weren't checked")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
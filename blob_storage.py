@@ -0,0 +1,157 @@
+import os
+import shutil
+from abc import ABC, abstractmethod
+from typing import List, Optional
+
+try:
+    import boto3
+    from botocore.exceptions import ClientError
+except ImportError:
+    boto3 = None
+
+from config import settings
+
+
+class BlobStorage(ABC):
+    # Content-addressed store, blobs are keyed by their SHA-256 hex digest.
+    # Methods block, callers run them in the threadpool
+    @abstractmethod
+    def put_file(self, digest: str, path: str):
+        # Takes ownership of the file at path
+        ...
+
+    @abstractmethod
+    def exists(self, digest: str) -> bool: ...
+
+    @abstractmethod
+    def delete(self, digest: str): ...
+
+    def local_path(self, digest: str) -> Optional[str]:
+        # Path to serve the blob from, None when it isn't on a local disk
+        return None
+
+    @abstractmethod
+    def get_url(self, digest: str, filename: str, expires_in: int) -> str:
+        # Download URL of a blob without a local_path
+        ...
+
+
+class LocalBlobStorage(BlobStorage):
+    def __init__(self, roots: List[str]):
+        self.roots = roots
+
+    def _root_path(self, root: str, digest: str) -> str:
+        return os.path.join(root, digest[:2], digest[2:4], digest)
+
+    def _path(self, digest: str) -> str:
+        # The digest prefix picks the disk new blobs are written to
+        return self._root_path(
+            self.roots[int(digest[:2], 16) % len(self.roots)], digest
+        )
+
+    def _find(self, digest: str) -> Optional[str]:
+        # Blobs stay on the disk they were written to when BLOB_LOCAL_PATHS
+        # changes, so every root is probed, the one the prefix picks first
+        target = self._path(digest)
+        if os.path.exists(target):
+            return target
+        for root in self.roots:
+            path = self._root_path(root, digest)
+            if os.path.exists(path):
+                return path
+        return None
+
+    def put_file(self, digest: str, path: str):
+        if self._find(digest):
+            # Identical content is already stored
+            os.remove(path)
+            return
+        target = self._path(digest)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        try:
+            os.replace(path, target)
+        except OSError:
+            # Another disk, copy next to the target first so the rename is atomic
+            temp_target = target + ".tmp"
+            shutil.move(path, temp_target)
+            os.replace(temp_target, target)
+
+    def exists(self, digest: str) -> bool:
+        return self._find(digest) is not None
+
+    def delete(self, digest: str):
+        for root in self.roots:
+            try:
+                os.remove(self._root_path(root, digest))
+            except FileNotFoundError:
+                pass
+
+    def local_path(self, digest: str) -> Optional[str]:
+        return self._find(digest) or self._path(digest)
+
+    def get_url(self, digest: str, filename: str, expires_in: int) -> str:
+        raise RuntimeError("Local blobs are served from their local_path")
+
+
+class S3BlobStorage(BlobStorage):
+    def __init__(
+        self,
+        bucket: str,
+        prefix: str = "",
+        endpoint_url: Optional[str] = None,
+        region: Optional[str] = None,
+    ):
+        if boto3 is None:
+            raise RuntimeError("S3 blob storage needs the boto3 package")
+        self.bucket = bucket
+        self.prefix = prefix
+        # endpoint_url points at any S3-compatible server, e.g. a local MinIO
+        self.client = boto3.client("s3", endpoint_url=endpoint_url, region_name=region)
+
+    def _key(self, digest: str) -> str:
+        return f"{self.prefix}{digest[:2]}/{digest}"
+
+    def put_file(self, digest: str, path: str):
+        try:
+            if not self.exists(digest):
+                self.client.upload_file(path, self.bucket, self._key(digest))
+        finally:
+            os.remove(path)
+
+    def exists(self, digest: str) -> bool:
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=self._key(digest))
+            return True
+        except ClientError as e:
+            if e.response["Error"]["Code"] in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    def delete(self, digest: str):
+        self.client.delete_object(Bucket=self.bucket, Key=self._key(digest))
+
+    def get_url(self, digest: str, filename: str, expires_in: int) -> str:
+        return self.client.generate_presigned_url(
+            "get_object",
+            Params={
+                "Bucket": self.bucket,
+                "Key": self._key(digest),
+                "ResponseContentDisposition": f'attachment; filename="{filename}"',
+            },
+            ExpiresIn=expires_in,
+        )
+
+
+def create_blob_storage() -> BlobStorage:
+    if settings.blob_storage == "s3":
+        return S3BlobStorage(
+            settings.blob_s3_bucket,
+            settings.blob_s3_prefix,
+            settings.blob_s3_endpoint_url,
+            settings.blob_s3_region,
+        )
+    roots = settings.blob_local_paths or os.path.join(settings.storage_path, "blobs")
+    return LocalBlobStorage(roots.split(os.pathsep))
+
+
+blob_storage = create_blob_storage()
@@ -0,0 +1,111 @@
+import time
+
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import delete, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models
+from blob_storage import blob_storage
+from config import settings
+from database import AsyncSessionLocal
+from uploads import StagedUpload
+
+
+async def _track_blob(upload: StagedUpload):
+    # Committed on its own before the file is stored, so that no stored file is
+    # ever without a row: when the request's transaction fails afterwards, the
+    # row stays unreferenced and collect_unreferenced_blobs removes the file
+    async with AsyncSessionLocal() as db:
+        now = int(time.time())
+        result = await db.execute(
+            update(models.Blob)
+            .where(models.Blob.digest == upload.sha256)
+            .values(updated_at=now)
+        )
+        if result.rowcount == 0:
+            db.add(
+                models.Blob(
+                    digest=upload.sha256, size=upload.size, refcount=0, updated_at=now
+                )
+            )
+        try:
+            await db.commit()
+        except IntegrityError:
+            # Inserted meanwhile by an upload of the same file
+            await db.rollback()
+
+
+async def acquire_blob(db: AsyncSession, upload: StagedUpload):
+    # Stores the staged file under its digest, identical uploads share a blob
+    await _track_blob(upload)
+    # The reference is taken before the file is stored or reused. The update
+    # locks the row until the request commits, so collect_unreferenced_blobs
+    # can't delete the file under it
+    now = int(time.time())
+    result = await db.execute(
+        update(models.Blob)
+        .where(models.Blob.digest == upload.sha256)
+        .values(refcount=models.Blob.refcount + 1, updated_at=now)
+    )
+    if result.rowcount == 0:
+        # Collected since it was tracked, its file is already deleted
+        db.add(
+            models.Blob(
+                digest=upload.sha256, size=upload.size, refcount=1, updated_at=now
+            )
+        )
+        await db.flush()
+    await run_in_threadpool(blob_storage.put_file, upload.sha256, upload.path)
+
+
+async def release_blob(db: AsyncSession, digest: str):
+    # Unreferenced blobs are removed later by collect_unreferenced_blobs
+    await db.execute(
+        update(models.Blob)
+        .where(models.Blob.digest == digest, models.Blob.refcount > 0)
+        .values(refcount=models.Blob.refcount - 1, updated_at=int(time.time()))
+    )
+
+
+async def set_charbon_resource(
+    db: AsyncSession, charbon: models.Charbon, upload: StagedUpload
+):
+    previous_digest = charbon.resource_digest
+    await acquire_blob(db, upload)
+    if previous_digest:
+        await release_blob(db, previous_digest)
+    charbon.resource_digest = upload.sha256
+    charbon.resources = True
+
+
+async def clear_charbon_resource(db: AsyncSession, charbon: models.Charbon):
+    if charbon.resource_digest:
+        await release_blob(db, charbon.resource_digest)
+    charbon.resource_digest = None
+    charbon.resources = False
+
+
+async def collect_unreferenced_blobs(db: AsyncSession) -> int:
+    # The grace period keeps a blob that is being re-uploaded from being
+    # deleted under the new reference
+    cutoff = int(time.time()) - settings.blob_gc_grace
+    unreferenced = (models.Blob.refcount == 0, models.Blob.updated_at < cutoff)
+    digests = (await db.scalars(select(models.Blob.digest).where(*unreferenced))).all()
+    removed = 0
+    for digest in digests:
+        result = await db.execute(
+            delete(models.Blob).where(models.Blob.digest == digest, *unreferenced)
+        )
+        if result.rowcount == 0:
+            # Referenced again meanwhile
+            await db.rollback()
+            continue
+        # The file goes before the row is committed: until then the row stays
+        # locked, and an upload of the same content waits instead of reusing a
+        # file that is about to be deleted. If deleting fails, closing the
+        # session rolls the row back
+        await run_in_threadpool(blob_storage.delete, digest)
+        await db.commit()
+        removed += 1
+    return removed
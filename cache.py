@@ -0,0 +1,106 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from config import settings
+
+
+class CacheEntry:
+    __slots__ = ("body", "headers", "meta", "expires_at")
+
+    def __init__(
+        self,
+        body: bytes,
+        headers: Dict[str, str],
+        meta: Dict[str, Any],
+        expires_at: float,
+    ):
+        self.body = body
+        self.headers = headers
+        self.meta = meta
+        self.expires_at = expires_at
+
+
+class ResponseCache:
+    def __init__(self, ttl: float, max_bytes: int):
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self._entries: OrderedDict[Hashable, CacheEntry] = OrderedDict()
+        self._lock = threading.Lock()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        # Bumped on every invalidation so a response computed before a write
+        # can't be stored after it
+        self.generation = 0
+
+    def _remove(self, key: Hashable):
+        entry = self._entries.pop(key)
+        self.size -= len(entry.body)
+
+    def get(self, key: Hashable) -> Optional[CacheEntry]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.expires_at <= time.monotonic():
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(
+        self,
+        key: Hashable,
+        body: bytes,
+        headers: Dict[str, str],
+        meta: Dict[str, Any],
+        generation: int,
+    ):
+        if len(body) > self.max_bytes:
+            return
+        with self._lock:
+            if generation != self.generation:
+                return
+            if key in self._entries:
+                self._remove(key)
+            expires_at = time.monotonic() + self.ttl
+            self._entries[key] = CacheEntry(body, headers, meta, expires_at)
+            self.size += len(body)
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def invalidate(self, predicate: Callable[[Dict[str, Any]], bool]):
+        with self._lock:
+            self.generation += 1
+            for key in [k for k, e in self._entries.items() if predicate(e.meta)]:
+                self._remove(key)
+                self.invalidations += 1
+
+    def clear(self):
+        self.invalidate(lambda meta: True)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self.size,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
+
+
+charbon_cache = ResponseCache(
+    settings.charbon_cache_ttl, settings.charbon_cache_max_bytes
+)
@@ -0,0 +1,91 @@
+import hashlib
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Optional
+
+from compiler_pool import compiler_pool
+from config import settings
+
+CACHE_DIRECTORY = os.path.join(settings.storage_path, "compile_cache")
+
+
+class CompileCache:
+    def __init__(self, directory: str, max_entries: int):
+        self.directory = directory
+        self.max_entries = max_entries
+        self._memory: OrderedDict[str, str] = OrderedDict()
+        self._lock = threading.Lock()
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def key(self, content: str) -> str:
+        digest = hashlib.sha256(compiler_pool.version.encode("utf-8"))
+        digest.update(b"\0")
+        digest.update(content.encode("utf-8"))
+        return digest.hexdigest()
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], f"{key}.html")
+
+    def _remember(self, key: str, html: str):
+        with self._lock:
+            self._memory[key] = html
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_entries:
+                self._memory.popitem(last=False)
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            html = self._memory.get(key)
+            if html is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                return html
+
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                html = f.read()
+        except OSError:
+            with self._lock:
+                self.misses += 1
+            return None
+
+        with self._lock:
+            self.disk_hits += 1
+        self._remember(key, html)
+        return html
+
+    def put(self, key: str, html: str):
+        self._remember(key, html)
+        path = self._path(key)
+        tmp_path = None
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                f.write(html)
+            os.replace(tmp_path, path)
+        except OSError:
+            # The disk tier is best effort, the memory tier still has the entry
+            if tmp_path is not None:
+                try:
+                    os.unlink(tmp_path)
+                except OSError:
+                    pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "memory_entries": len(self._memory),
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_ratio": (lookups - self.misses) / lookups if lookups else 0.0,
+            }
+
+
+compile_cache = CompileCache(CACHE_DIRECTORY, settings.compile_cache_size)
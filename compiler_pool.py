@@ -0,0 +1,202 @@
+import hashlib
+import os
+import select
+import struct
+import subprocess
+import sys
+import threading
+import time
+
+import anyio
+
+from config import settings
+from metrics import COMPILE_DURATION
+
+COMPILER_DIRECTORY = "compiler"
+WORKER_SCRIPT = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "compiler_worker.py"
+)
+
+HEADER = struct.Struct(">I")
+STATUS_OK = 0
+
+
+class CompileError(Exception):
+    pass
+
+
+class WorkerError(CompileError):
+    pass
+
+
+class WorkerTimeout(WorkerError):
+    pass
+
+
+def _compiler_files():
+    for root, dirs, files in os.walk(COMPILER_DIRECTORY):
+        dirs[:] = [d for d in dirs if not d.startswith(".") and d != "__pycache__"]
+        for name in files:
+            if not name.startswith("."):
+                yield os.path.join(root, name)
+
+
+class _Worker:
+    def __init__(self):
+        self.process = subprocess.Popen(
+            [sys.executable, WORKER_SCRIPT],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            cwd=COMPILER_DIRECTORY,
+        )
+        self.jobs = 0
+
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def _read_exact(self, size: int, deadline: float) -> bytes:
+        fd = self.process.stdout.fileno()
+        data = b""
+        while len(data) < size:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not select.select([fd], [], [], remaining)[0]:
+                raise WorkerTimeout("Compiler worker timed out")
+            chunk = os.read(fd, size - len(data))
+            if not chunk:
+                raise WorkerError("Compiler worker exited unexpectedly")
+            data += chunk
+        return data
+
+    def compile(self, source: bytes, timeout: float) -> bytes:
+        deadline = time.monotonic() + timeout
+        try:
+            self.process.stdin.write(HEADER.pack(len(source)) + source)
+            self.process.stdin.flush()
+        except (BrokenPipeError, OSError):
+            raise WorkerError("Compiler worker exited unexpectedly")
+
+        status = self._read_exact(1, deadline)[0]
+        (size,) = HEADER.unpack(self._read_exact(HEADER.size, deadline))
+        payload = self._read_exact(size, deadline)
+        self.jobs += 1
+
+        if status != STATUS_OK:
+            raise CompileError(payload.decode("utf-8", errors="replace"))
+        return payload
+
+    def close(self, kill: bool = False):
+        # Always reaps the process and closes its pipes, also after it crashed
+        # or when it is killed mid-job
+        if kill:
+            self.process.kill()
+        try:
+            self.process.stdin.close()
+        except OSError:
+            pass
+        try:
+            self.process.wait(timeout=1)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        self.process.stdout.close()
+
+
+class CompilerPool:
+    def __init__(self, size: int, max_jobs: int, timeout: float):
+        self.size = size
+        self.max_jobs = max_jobs
+        self.timeout = timeout
+        self._idle: list[_Worker] = []
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(size)
+        self._limiter = None
+        self._version = None
+
+    @property
+    def version(self) -> str:
+        # Hash of the compiler sources, so compiled output can be cached safely
+        if self._version is None:
+            digest = hashlib.sha256()
+            for path in [WORKER_SCRIPT] + sorted(_compiler_files()):
+                digest.update(path.encode("utf-8"))
+                with open(path, "rb") as f:
+                    digest.update(f.read())
+            self._version = digest.hexdigest()
+        return self._version
+
+    def _acquire(self) -> _Worker:
+        self._slots.acquire()
+        with self._lock:
+            while self._idle:
+                worker = self._idle.pop()
+                if worker.alive():
+                    return worker
+                worker.close()
+        try:
+            return _Worker()
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def _release(self, worker: _Worker, reuse: bool):
+        if reuse and worker.alive() and worker.jobs < self.max_jobs:
+            with self._lock:
+                self._idle.append(worker)
+        else:
+            # A worker that failed mid-job may be stuck or half way through a
+            # reply, it is killed rather than asked to exit
+            worker.close(kill=not reuse)
+        self._slots.release()
+
+    def compile(self, content: str) -> str:
+        source = content.encode("utf-8")
+        # A worker that crashed while idle is only noticed on use, so retry once
+        for attempt in range(2):
+            worker = self._acquire()
+            reuse = False
+            try:
+                result = worker.compile(source, self.timeout)
+                reuse = True
+                return result.decode("utf-8")
+            except WorkerTimeout:
+                # Not retried, the content would time out again
+                raise
+            except WorkerError:
+                if attempt:
+                    raise
+            except CompileError:
+                reuse = True
+                raise
+            finally:
+                self._release(worker, reuse)
+
+    async def compile_async(self, content: str) -> str:
+        # Compiles wait on their own limiter so they never hold FastAPI's threadpool
+        if self._limiter is None:
+            self._limiter = anyio.CapacityLimiter(self.size)
+        outcome = "ok"
+        start = time.perf_counter()
+        try:
+            return await anyio.to_thread.run_sync(
+                self.compile, content, limiter=self._limiter
+            )
+        except WorkerError:
+            outcome = "worker_error"
+            raise
+        except CompileError:
+            outcome = "compile_error"
+            raise
+        finally:
+            COMPILE_DURATION.observe(time.perf_counter() - start, outcome)
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for worker in idle:
+            worker.close()
+
+
+compiler_pool = CompilerPool(
+    settings.compiler_workers, settings.compiler_max_jobs, settings.compiler_timeout
+)
@@ -0,0 +1,79 @@
+# Long-lived PLS-markdown compiler worker, spawned by compiler_pool.CompilerPool
+# inside the compiler directory. Jobs come in on stdin as length-prefixed frames.
+
+import io
+import os
+import runpy
+import struct
+import sys
+import traceback
+
+COMPILER_SCRIPT = "compile_plsmarkdown.py"
+
+HEADER = struct.Struct(">I")
+STATUS_OK = 0
+STATUS_ERROR = 1
+
+for module in (
+    "markdown",
+    "yaml",
+    "pygments",
+    "pygments.lexers",
+    "pygments.formatters",
+):
+    try:
+        __import__(module)
+    except ImportError:
+        pass
+
+
+def _read_exact(stream, size: int) -> bytes:
+    data = b""
+    while len(data) < size:
+        chunk = stream.read(size - len(data))
+        if not chunk:
+            raise EOFError
+        data += chunk
+    return data
+
+
+def _compile(source: bytes) -> bytes:
+    stdin, stdout = sys.stdin, sys.stdout
+    output = io.BytesIO()
+    sys.stdin = io.TextIOWrapper(io.BytesIO(source), encoding="utf-8")
+    sys.stdout = io.TextIOWrapper(output, encoding="utf-8", write_through=True)
+    try:
+        try:
+            runpy.run_path(COMPILER_SCRIPT, run_name="__main__")
+        except SystemExit as e:
+            if e.code not in (None, 0):
+                raise RuntimeError(f"Compiler exited with status {e.code}")
+        sys.stdout.flush()
+        return output.getvalue()
+    finally:
+        sys.stdin, sys.stdout = stdin, stdout
+
+
+def main():
+    sys.path.insert(0, os.getcwd())
+    requests = sys.stdin.buffer
+    responses = sys.stdout.buffer
+
+    while True:
+        try:
+            (size,) = HEADER.unpack(_read_exact(requests, HEADER.size))
+            source = _read_exact(requests, size)
+        except EOFError:
+            break
+
+        try:
+            status, payload = STATUS_OK, _compile(source)
+        except Exception:
+            status, payload = STATUS_ERROR, traceback.format_exc().encode("utf-8")
+
+        responses.write(bytes([status]) + HEADER.pack(len(payload)) + payload)
+        responses.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+import gzip
+
+from config import settings
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+_CODECS = {"gzip": (lambda data: gzip.compress(data, 9), gzip.decompress)}
+if brotli is not None:
+    _CODECS["br"] = (lambda data: brotli.compress(data, quality=11), brotli.decompress)
+if zstandard is not None:
+    _CODECS["zstd"] = (
+        lambda data: zstandard.ZstdCompressor(level=19).compress(data),
+        lambda data: zstandard.ZstdDecompressor().decompress(data),
+    )
+
+CODEC_PACKAGES = {"br": "brotli", "zstd": "zstandard"}
+
+# Pinned rather than picked from the installed packages, so that every
+# instance stores the same encoding and a missing codec stops the startup
+STORAGE_ENCODING = settings.exercise_content_encoding
+if STORAGE_ENCODING not in _CODECS:
+    raise RuntimeError(
+        f"EXERCISE_CONTENT_ENCODING={STORAGE_ENCODING} needs the "
+        f"{CODEC_PACKAGES[STORAGE_ENCODING]} package"
+    )
+
+
+def compress(data: bytes, encoding: str = STORAGE_ENCODING) -> bytes:
+    return _CODECS[encoding][0](data)
+
+
+def decompress(data: bytes, encoding: str) -> bytes:
+    if encoding not in _CODECS:
+        raise ValueError(f"Unsupported content encoding: {encoding}")
+    return _CODECS[encoding][1](data)
+
+
+def accepts_encoding(accept_encoding: str | None, encoding: str) -> bool:
+    if not accept_encoding:
+        return False
+
+    wildcard = False
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        name = name.strip().lower()
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        if name == encoding:
+            return quality > 0
+        if name == "*":
+            wildcard = quality > 0
+    return wildcard
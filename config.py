@@ -1,13 +1,56 @@
+from typing import Literal, Optional
+
 from pydantic_settings import BaseSettings
 
 
 class Settings(BaseSettings):
     database_url: str
+    async_database_url: Optional[str] = None
     youtube_api_key: str
     token_secret: str
     discord_client_id: str
     discord_client_secret: str
     storage_path: str
+    compiler_workers: int = 2
+    compiler_max_jobs: int = 200
+    compiler_timeout: float = 30
+    compile_cache_size: int = 256
+    exercise_content_encoding: Literal["gzip", "br", "zstd"] = "gzip"
+    download_offload: Optional[Literal["x-accel-redirect", "x-sendfile"]] = None
+    download_offload_prefix: str = "/protected"
+    download_offload_locations: Optional[str] = None
+    charbon_max_upload_size: int = 512 * 1024 * 1024
+    upload_session_ttl: int = 24 * 3600
+    upload_chunk_lease: int = 15 * 60
+    upload_gc_interval: float = 3600
+    blob_storage: Literal["local", "s3"] = "local"
+    blob_local_paths: Optional[str] = None
+    blob_s3_bucket: Optional[str] = None
+    blob_s3_prefix: str = "charbons/"
+    blob_s3_endpoint_url: Optional[str] = None
+    blob_s3_region: Optional[str] = None
+    blob_url_expiration: int = 300
+    blob_gc_grace: int = 24 * 3600
+    charbon_cache_ttl: float = 60
+    charbon_cache_max_bytes: int = 8 * 1024 * 1024
+    actionneur_cache_ttl: float = 60
+    youtube_duration_ttl: float = 24 * 3600
+    youtube_duration_cache_size: int = 4096
+    duration_worker: bool = True
+    duration_poll_interval: float = 10
+    duration_job_lease: int = 120
+    duration_max_attempts: int = 8
+    duration_retry_delay: int = 30
+    duration_max_retry_delay: int = 6 * 3600
+    http_timeout: float = 10
+    http_connect_timeout: float = 5
+    http_max_connections: int = 50
+    http_max_keepalive_connections: int = 10
+    http_keepalive_expiry: float = 30
+    metrics_token: Optional[str] = None
+    sql_profiler: Literal["off", "header", "always"] = "off"
+    sql_profiler_history: int = 100
+    sql_profiler_repeat_threshold: int = 3
 
     class Config:
         env_file = ".env"
@@ -1,21 +1,55 @@
+import time
+
 from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
 from config import settings
+from metrics import POOL_CHECKOUT_DURATION, instrument_engine
+from sql_profiler import instrument_engine as instrument_profiler
+
+ASYNC_DRIVERS = {
+    "mysql": "mysql+aiomysql",
+    "mysql+pymysql": "mysql+aiomysql",
+    "sqlite": "sqlite+aiosqlite",
+    "sqlite+pysqlite": "sqlite+aiosqlite",
+}
 
 SQLALCHEMY_DATABASE_URL = settings.database_url
 
+
+def _get_async_url(url: str) -> str:
+    parsed_url = make_url(url)
+    drivername = ASYNC_DRIVERS.get(parsed_url.drivername, parsed_url.drivername)
+    return parsed_url.set(drivername=drivername).render_as_string(hide_password=False)
+
+
+ASYNC_SQLALCHEMY_DATABASE_URL = settings.async_database_url or _get_async_url(
+    SQLALCHEMY_DATABASE_URL
+)
+
+# The sync engine is kept for migrations and scripts, routes use the async one
 engine = create_engine(SQLALCHEMY_DATABASE_URL)
 
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+async_engine = create_async_engine(ASYNC_SQLALCHEMY_DATABASE_URL)
+instrument_engine(async_engine.sync_engine)
+instrument_profiler(async_engine.sync_engine)
+
+AsyncSessionLocal = async_sessionmaker(
+    async_engine, autoflush=False, expire_on_commit=False
+)
+
 Base = declarative_base()
 
 
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with AsyncSessionLocal() as db:
+        # Checked out up front so the pool wait is measured on its own
+        start = time.perf_counter()
+        await db.connection()
+        POOL_CHECKOUT_DURATION.observe(time.perf_counter() - start)
         yield db
-    finally:
-        db.close()
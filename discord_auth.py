@@ -1,16 +1,18 @@
 import time
 from typing import Annotated
 
+import httpx
 import jwt
-import requests
 from fastapi import Depends, HTTPException
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 import models
 import schemas
+from actionneur_cache import actionneur_cache
 from config import settings
 from database import get_db
+from http_client import get_http_client
 
 ALGORITHM = "HS256"
 
@@ -18,14 +20,14 @@ ALGORITHM = "HS256"
 oauth2_scheme = OAuth2PasswordBearer("/auth/token", auto_error=False)
 
 
-def exchange_discord_code(cred: schemas.TokenCreate) -> str:
+async def exchange_discord_code(cred: schemas.TokenCreate) -> str:
     data = {
         "grant_type": "authorization_code",
         "code": cred.code,
         "redirect_uri": cred.redirect_uri,
     }
     headers = {"Content-Type": "application/x-www-form-urlencoded"}
-    response = requests.post(
+    response = await get_http_client().post(
         "https://discord.com/api/v10/oauth2/token",
         data=data,
         headers=headers,
@@ -35,15 +37,20 @@ def exchange_discord_code(cred: schemas.TokenCreate) -> str:
     return response.json()["access_token"]
 
 
-def revoke_discord_token(token: str):
+async def revoke_discord_token(token: str):
     data = {"token": token, "token_type_hint": "access_token"}
     headers = {"Content-Type": "application/x-www-form-urlencoded"}
-    requests.post(
-        "https://discord.com/api/v10/oauth2/token/revoke",
-        data=data,
-        headers=headers,
-        auth=(settings.discord_client_id, settings.discord_client_secret),
-    )
+    # Runs after the response is sent, a failed revocation only lets the
+    # short-lived Discord token expire on its own
+    try:
+        await get_http_client().post(
+            "https://discord.com/api/v10/oauth2/token/revoke",
+            data=data,
+            headers=headers,
+            auth=(settings.discord_client_id, settings.discord_client_secret),
+        )
+    except httpx.HTTPError:
+        pass
 
 
 def create_jwt(user_id: int, exp_time: int) -> str:
@@ -70,10 +77,10 @@ async def get_current_user(token: Annotated[str, Depends(oauth2_scheme)]):
 
 async def get_current_actionneur(
     token: Annotated[int, Depends(oauth2_scheme)],
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     user_id = decode_jwt(token)
-    user = db.query(models.Actionneur).get(user_id)
+    user = await actionneur_cache.get(db, user_id)
     if user is None:
         raise HTTPException(
             status_code=403, detail="You need to be an actionneur to access this."
@@ -0,0 +1,186 @@
+import os
+from email.utils import parsedate_to_datetime
+from typing import List, Optional, Tuple
+
+import anyio
+from fastapi import HTTPException, Request, Response
+from fastapi.responses import FileResponse
+
+from blob_storage import LocalBlobStorage, blob_storage
+from config import settings
+
+OFFLOAD_HEADERS = {
+    "x-accel-redirect": "X-Accel-Redirect",
+    "x-sendfile": "X-Sendfile",
+}
+
+
+class FileRangeResponse(FileResponse):
+    # FileResponse that can send a single byte range of the file
+    start = 0
+    end: Optional[int] = None
+
+    def set_range(self, start: int, end: int):
+        self.status_code = 206
+        self.start = start
+        self.end = end
+        size = self.stat_result.st_size
+        self.headers["content-range"] = f"bytes {start}-{end}/{size}"
+        self.headers["content-length"] = str(end - start + 1)
+
+    async def __call__(self, scope, receive, send):
+        if self.end is None:
+            return await super().__call__(scope, receive, send)
+
+        await send(
+            {
+                "type": "http.response.start",
+                "status": self.status_code,
+                "headers": self.raw_headers,
+            }
+        )
+        remaining = self.end - self.start + 1
+        async with await anyio.open_file(self.path, mode="rb") as file:
+            await file.seek(self.start)
+            while remaining:
+                chunk = await file.read(min(self.chunk_size, remaining))
+                if not chunk:
+                    break
+                remaining -= len(chunk)
+                await send(
+                    {
+                        "type": "http.response.body",
+                        "body": chunk,
+                        "more_body": remaining > 0,
+                    }
+                )
+        if remaining:
+            # The file shrank while it was being sent
+            await send({"type": "http.response.body", "body": b"", "more_body": False})
+        if self.background is not None:
+            await self.background()
+
+
+def _if_range_matches(if_range: str, etag: str, last_modified: str) -> bool:
+    if_range = if_range.strip()
+    if if_range.startswith('"') or if_range.startswith("W/"):
+        # If-Range only accepts strong validators
+        return if_range == etag
+    try:
+        return parsedate_to_datetime(if_range) == parsedate_to_datetime(last_modified)
+    except (TypeError, ValueError):
+        return False
+
+
+def _parse_range(header: str, size: int) -> Optional[Tuple[int, int]]:
+    # Only single ranges are served, anything else gets the full file
+    unit, _, ranges = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in ranges:
+        return None
+    start, sep, end = ranges.strip().partition("-")
+    if not sep or not (start or end):
+        return None
+    if (start and not start.isdigit()) or (end and not end.isdigit()):
+        return None
+
+    if not start:
+        suffix = int(end)
+        if suffix == 0 or size == 0:
+            raise HTTPException(
+                status_code=416, headers={"Content-Range": f"bytes */{size}"}
+            )
+        return max(size - suffix, 0), size - 1
+
+    first = int(start)
+    if end and int(end) < first:
+        return None
+    last = min(int(end), size - 1) if end else size - 1
+    if first >= size:
+        raise HTTPException(
+            status_code=416, headers={"Content-Range": f"bytes */{size}"}
+        )
+    return first, last
+
+
+def _offload_locations() -> List[Tuple[str, str]]:
+    # (directory, internal location) pairs, nested directories before the
+    # ones containing them
+    if settings.download_offload_locations:
+        locations = []
+        for item in settings.download_offload_locations.split(","):
+            directory, sep, location = item.partition("=")
+            if not sep:
+                raise RuntimeError(
+                    f"DOWNLOAD_OFFLOAD_LOCATIONS entry {item!r} isn't directory=location"
+                )
+            locations.append((directory.strip(), location.strip()))
+    else:
+        locations = [(settings.storage_path, settings.download_offload_prefix)]
+    locations = [(os.path.abspath(d), l.rstrip("/")) for d, l in locations]
+    return sorted(locations, key=lambda item: len(item[0]), reverse=True)
+
+
+OFFLOAD_LOCATIONS = _offload_locations()
+
+
+def _internal_location(path: str) -> Optional[str]:
+    path = os.path.abspath(path)
+    for directory, location in OFFLOAD_LOCATIONS:
+        if os.path.commonpath([path, directory]) == directory:
+            return f"{location}/{os.path.relpath(path, directory)}"
+    return None
+
+
+if settings.download_offload == "x-accel-redirect" and isinstance(
+    blob_storage, LocalBlobStorage
+):
+    # Every blob root must be reachable through an internal location, checked
+    # at startup rather than on the first download from a new disk
+    for root in blob_storage.roots:
+        if _internal_location(root) is None:
+            raise RuntimeError(
+                f"Blob root {root} has no internal location, "
+                "add it to DOWNLOAD_OFFLOAD_LOCATIONS"
+            )
+
+
+def _offload_response(path: str, media_type: str, filename: str) -> Response:
+    # The fronting server streams the file, and handles ranges, after the
+    # API has checked access
+    if settings.download_offload == "x-accel-redirect":
+        location = _internal_location(path)
+    else:
+        location = os.path.abspath(path)
+    response = FileResponse(path, media_type=media_type, filename=filename)
+    headers = {
+        OFFLOAD_HEADERS[settings.download_offload]: location,
+        "Content-Disposition": response.headers["content-disposition"],
+    }
+    return Response(media_type=media_type, headers=headers)
+
+
+def file_download(
+    request: Request, path: str, media_type: str, filename: str
+) -> Response:
+    if settings.download_offload:
+        return _offload_response(path, media_type, filename)
+
+    response = FileRangeResponse(
+        path, media_type=media_type, filename=filename, stat_result=os.stat(path)
+    )
+    response.headers["accept-ranges"] = "bytes"
+
+    range_header = request.headers.get("range")
+    if_range = request.headers.get("if-range")
+    if range_header is None or (
+        if_range is not None
+        and not _if_range_matches(
+            if_range, response.headers["etag"], response.headers["last-modified"]
+        )
+    ):
+        return response
+
+    byte_range = _parse_range(range_header, response.stat_result.st_size)
+    if byte_range is not None:
+        response.set_range(*byte_range)
+    return response
@@ -0,0 +1,176 @@
+import asyncio
+import logging
+import time
+from typing import Optional
+
+import httpx
+from sqlalchemy import delete, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models
+from cache import charbon_cache
+from config import settings
+from database import AsyncSessionLocal
+from versioning import bump_version
+from youtube import MAX_BATCH_SIZE, duration_resolver
+
+logger = logging.getLogger(__name__)
+
+
+async def enqueue_duration_job(db: AsyncSession, charbon_id: int, video_id: str):
+    # Replaces any job left over from a previous replay link
+    await cancel_duration_job(db, charbon_id)
+    db.add(
+        models.DurationJob(
+            charbon_id=charbon_id,
+            video_id=video_id,
+            attempts=0,
+            run_at=int(time.time()),
+        )
+    )
+
+
+async def cancel_duration_job(db: AsyncSession, charbon_id: int):
+    await db.execute(delete(models.DurationJob).filter_by(charbon_id=charbon_id))
+
+
+def get_retry_delay(attempts: int) -> int:
+    delay = settings.duration_retry_delay * 2 ** (attempts - 1)
+    return min(delay, settings.duration_max_retry_delay)
+
+
+class DurationWorker:
+    def __init__(self, poll_interval: float, lease: int, max_attempts: int):
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.max_attempts = max_attempts
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._wakeup = asyncio.Event()
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def notify(self):
+        # Called after a commit that enqueued jobs, so they don't wait for the poll
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    async def _run(self):
+        while True:
+            self._wakeup.clear()
+            try:
+                if await self.run_once():
+                    continue
+            except Exception:
+                logger.exception("Duration worker failed")
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _claim(self, db: AsyncSession, now: int):
+        # Jobs are leased rather than locked, so a crashed worker's jobs are
+        # picked up again once the lease runs out
+        available = or_(
+            models.DurationJob.locked_until.is_(None),
+            models.DurationJob.locked_until < now,
+        )
+        query = (
+            select(
+                models.DurationJob.charbon_id,
+                models.DurationJob.video_id,
+                models.DurationJob.attempts,
+            )
+            .where(models.DurationJob.run_at <= now, available)
+            .order_by(models.DurationJob.run_at)
+            .limit(MAX_BATCH_SIZE)
+        )
+        jobs = []
+        for job in (await db.execute(query)).all():
+            result = await db.execute(
+                update(models.DurationJob)
+                .where(models.DurationJob.charbon_id == job.charbon_id, available)
+                .values(locked_until=now + self.lease)
+            )
+            if result.rowcount:
+                jobs.append(job)
+        await db.commit()
+        return jobs
+
+    async def run_once(self) -> int:
+        async with AsyncSessionLocal() as db:
+            now = int(time.time())
+            jobs = await self._claim(db, now)
+            if not jobs:
+                return 0
+
+            error = "Video not found or without a duration"
+            try:
+                durations = await duration_resolver.get_many(
+                    [job.video_id for job in jobs]
+                )
+            except Exception as e:
+                # Any failure counts as an attempt of every job of the batch,
+                # so that max_attempts ends jobs that can never succeed instead
+                # of reclaiming them forever once their lease runs out
+                if not isinstance(e, httpx.HTTPError):
+                    logger.exception("Duration batch failed")
+                durations, error = {}, f"{type(e).__name__}: {e}"
+
+            finished = 0
+            for job in jobs:
+                # The job may have been replaced by a newer replay link meanwhile
+                owned = (
+                    models.DurationJob.charbon_id == job.charbon_id,
+                    models.DurationJob.video_id == job.video_id,
+                    models.DurationJob.locked_until == now + self.lease,
+                )
+                duration = durations.get(job.video_id)
+                attempts = job.attempts + 1
+                if duration is None and attempts < self.max_attempts:
+                    await db.execute(
+                        update(models.DurationJob)
+                        .where(*owned)
+                        .values(
+                            attempts=attempts,
+                            run_at=now + get_retry_delay(attempts),
+                            locked_until=None,
+                            last_error=error[:255],
+                        )
+                    )
+                    continue
+
+                # Either resolved or out of attempts, the duration stays empty then
+                result = await db.execute(delete(models.DurationJob).where(*owned))
+                if result.rowcount:
+                    await db.execute(
+                        update(models.Charbon)
+                        .filter_by(id=job.charbon_id)
+                        .values(duration=duration, duration_pending=False)
+                    )
+                    finished += 1
+
+            if finished:
+                await bump_version(db, "charbon")
+            await db.commit()
+            if finished:
+                charbon_cache.clear()
+            return len(jobs)
+
+
+duration_worker = DurationWorker(
+    settings.duration_poll_interval,
+    settings.duration_job_lease,
+    settings.duration_max_attempts,
+)
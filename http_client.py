@@ -0,0 +1,34 @@
+from typing import Optional
+
+import httpx
+
+from config import settings
+from metrics import OUTBOUND_EVENT_HOOKS
+
+_client: Optional[httpx.AsyncClient] = None
+
+
+def get_http_client() -> httpx.AsyncClient:
+    # One pooled client for all outgoing calls, so Discord and YouTube
+    # connections are kept alive between requests
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(
+            timeout=httpx.Timeout(
+                settings.http_timeout, connect=settings.http_connect_timeout
+            ),
+            limits=httpx.Limits(
+                max_connections=settings.http_max_connections,
+                max_keepalive_connections=settings.http_max_keepalive_connections,
+                keepalive_expiry=settings.http_keepalive_expiry,
+            ),
+            event_hooks=OUTBOUND_EVENT_HOOKS,
+        )
+    return _client
+
+
+async def close_http_client():
+    global _client
+    if _client is not None:
+        client, _client = _client, None
+        await client.aclose()
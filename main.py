@@ -1,8 +1,16 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 import models
+from compiler_pool import compiler_pool
+from config import settings
 from database import engine
+from duration_jobs import duration_worker
+from http_client import close_http_client
+from metrics import MetricsMiddleware
+from pagination import NEXT_CURSOR_HEADER
 from routers import (
     actionneurs,
     announcements,
@@ -11,11 +19,31 @@ from routers import (
     courses,
     exercise_topics,
     exercises,
+    export,
+    metrics,
+    search,
+    sql_profiles,
 )
+from sql_profiler import SUMMARY_HEADERS, SQLProfilerMiddleware
+from upload_sessions import upload_collector
+from uploads import UploadSizeLimitMiddleware
 
 models.Base.metadata.create_all(bind=engine)
 
-app = FastAPI(title="PLSapi", redoc_url=None, docs_url="/docs/")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    if settings.duration_worker:
+        duration_worker.start()
+    upload_collector.start()
+    yield
+    await upload_collector.stop()
+    await duration_worker.stop()
+    compiler_pool.close()
+    await close_http_client()
+
+
+app = FastAPI(title="PLSapi", redoc_url=None, docs_url="/docs/", lifespan=lifespan)
 app.include_router(auth.router)
 app.include_router(charbons.router)
 app.include_router(exercises.router)
@@ -23,6 +51,10 @@ app.include_router(exercise_topics.router)
 app.include_router(courses.router)
 app.include_router(actionneurs.router)
 app.include_router(announcements.router)
+app.include_router(export.router)
+app.include_router(search.router)
+app.include_router(metrics.router)
+app.include_router(sql_profiles.router)
 
 
 origins = [
@@ -35,4 +67,17 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, export.EXPORT_STARTED_HEADER, *SUMMARY_HEADERS],
 )
+
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    max_size=settings.charbon_max_upload_size,
+    methods=["POST", "PUT"],
+    path=r"/charbons/[^/]+/content/",
+)
+
+app.add_middleware(SQLProfilerMiddleware)
+
+# Added last so it wraps the other middlewares and times the whole request
+app.add_middleware(MetricsMiddleware)
@@ -0,0 +1,259 @@
+import bisect
+import math
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import httpx
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# PlainTextResponse appends the charset
+CONTENT_TYPE = "text/plain; version=0.0.4"
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 10, 25, 50, 100)
+COMPILE_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+STATEMENTS = {"SELECT", "INSERT", "UPDATE", "DELETE"}
+
+_metrics: List["_Metric"] = []
+
+# [queries, seconds] spent in SQL by the current request
+_request_sql: ContextVar[Optional[List[float]]] = ContextVar(
+    "request_sql", default=None
+)
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    return repr(float(value)) if value % 1 else str(int(value))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class _Metric(ABC):
+    # Values are kept per label tuple in plain dicts, a recording is one dict
+    # lookup under an uncontended lock
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        _metrics.append(self)
+
+    def _labels(self, values: Tuple[str, ...], extra: str = "") -> str:
+        pairs = [f'{n}="{_escape(v)}"' for n, v in zip(self.labelnames, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    @abstractmethod
+    def _samples(self) -> List[str]: ...
+
+    def render(self) -> List[str]:
+        return [
+            f"# HELP {self.name} {self.help}",
+            f"# TYPE {self.name} {self.kind}",
+            *self._samples(),
+        ]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = list(self._values.items())
+        return [
+            f"{self.name}{self._labels(labels)} {_format_value(value)}"
+            for labels, value in values
+        ]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(
+        self,
+        name: str,
+        help: str,
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(buckets)
+        # Per label tuple: the count of each bucket, +Inf last, and the sum
+        self._values: Dict[Tuple[str, ...], Tuple[List[int], List[float]]] = {}
+
+    def observe(self, value: float, *labels: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(labels)
+            if state is None:
+                state = self._values[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+            state[0][index] += 1
+            state[1][0] += value
+
+    def _samples(self) -> List[str]:
+        with self._lock:
+            values = [(k, list(c), s[0]) for k, (c, s) in self._values.items()]
+        lines = []
+        for labels, counts, total in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(
+                    f"{self.name}_bucket{self._labels(labels, le)} {cumulative}"
+                )
+            lines.append(f"{self.name}_sum{self._labels(labels)} {total!r}")
+            lines.append(f"{self.name}_count{self._labels(labels)} {cumulative}")
+        return lines
+
+
+def render() -> str:
+    return "\n".join(line for metric in _metrics for line in metric.render()) + "\n"
+
+
+REQUEST_DURATION = Histogram(
+    "plsapi_http_request_duration_seconds",
+    "Time to handle a request, including sending the body",
+    ("method", "route", "status"),
+)
+REQUESTS_IN_PROGRESS = Gauge(
+    "plsapi_http_requests_in_progress",
+    "Requests being handled",
+    ("method",),
+)
+REQUEST_SQL_DURATION = Histogram(
+    "plsapi_http_request_sql_seconds",
+    "Time a request spent waiting on SQL queries",
+    ("method", "route"),
+)
+REQUEST_QUERIES = Histogram(
+    "plsapi_http_request_queries",
+    "SQL queries issued by a request",
+    ("method", "route"),
+    COUNT_BUCKETS,
+)
+QUERY_DURATION = Histogram(
+    "plsapi_db_query_duration_seconds",
+    "SQL query execution time",
+    ("statement",),
+    QUERY_BUCKETS,
+)
+POOL_CHECKOUT_DURATION = Histogram(
+    "plsapi_db_pool_checkout_seconds",
+    "Wait for a database connection from the pool",
+    buckets=QUERY_BUCKETS,
+)
+OUTBOUND_DURATION = Histogram(
+    "plsapi_outbound_request_duration_seconds",
+    "Time until the response headers of calls to Discord and YouTube",
+    ("host", "status"),
+)
+COMPILE_DURATION = Histogram(
+    "plsapi_compile_duration_seconds",
+    "Exercise compilation time, including the wait for a worker",
+    ("outcome",),
+    COMPILE_BUCKETS,
+)
+
+
+def instrument_engine(engine: Engine):
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, many):
+        conn.info.setdefault("query_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, many):
+        elapsed = time.perf_counter() - conn.info["query_start"].pop()
+        verb = statement.lstrip()[:6].upper()
+        QUERY_DURATION.observe(elapsed, verb if verb in STATEMENTS else "OTHER")
+        request_sql = _request_sql.get()
+        if request_sql is not None:
+            request_sql[0] += 1
+            request_sql[1] += elapsed
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(context):
+        starts = (
+            context.connection.info.get("query_start") if context.connection else None
+        )
+        if starts:
+            starts.pop()
+
+
+async def _start_outbound_timer(request: httpx.Request):
+    request.extensions["metrics_start"] = time.perf_counter()
+
+
+async def _observe_outbound(response: httpx.Response):
+    request = response.request
+    elapsed = time.perf_counter() - request.extensions["metrics_start"]
+    OUTBOUND_DURATION.observe(elapsed, request.url.host, str(response.status_code))
+
+
+OUTBOUND_EVENT_HOOKS = {
+    "request": [_start_outbound_timer],
+    "response": [_observe_outbound],
+}
+
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        request_sql = [0, 0.0]
+        token = _request_sql.set(request_sql)
+        REQUESTS_IN_PROGRESS.inc(method)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            elapsed = time.perf_counter() - start
+            REQUESTS_IN_PROGRESS.dec(method)
+            _request_sql.reset(token)
+            # Routing stores the matched route in the scope, its template keeps
+            # the label count bounded
+            route = scope.get("route")
+            path = getattr(route, "path", "unmatched")
+            REQUEST_DURATION.observe(elapsed, method, path, str(status))
+            REQUEST_QUERIES.observe(request_sql[0], method, path)
+            REQUEST_SQL_DURATION.observe(request_sql[1], method, path)
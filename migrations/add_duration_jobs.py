@@ -0,0 +1,55 @@
+# Adds the duration job queue and queues charbons whose replay has no duration.
+# Usage: python -m migrations.add_duration_jobs
+import time
+
+from sqlalchemy import insert, select, update
+
+import models
+from database import engine
+from migrations.common import add_missing_columns
+from utils import extract_video_id_from_url
+
+
+def migrate():
+    charbons = models.Charbon.__table__
+    jobs = models.DurationJob.__table__
+    with engine.begin() as conn:
+        add_missing_columns(conn, charbons, charbons.c.duration_pending)
+        conn.execute(
+            update(charbons)
+            .where(charbons.c.duration_pending.is_(None))
+            .values(duration_pending=False)
+        )
+        jobs.create(bind=conn, checkfirst=True)
+
+    now = int(time.time())
+    queued = 0
+    with engine.begin() as conn:
+        rows = conn.execute(
+            select(charbons.c.id, charbons.c.replay_link).where(
+                charbons.c.replay_link.is_not(None),
+                charbons.c.duration.is_(None),
+                charbons.c.id.not_in(select(jobs.c.charbon_id)),
+            )
+        ).all()
+        for id, replay_link in rows:
+            video_id = extract_video_id_from_url(replay_link)
+            if not video_id:
+                continue
+            conn.execute(
+                insert(jobs).values(
+                    charbon_id=id, video_id=video_id, attempts=0, run_at=now
+                )
+            )
+            conn.execute(
+                update(charbons)
+                .where(charbons.c.id == id)
+                .values(duration_pending=True)
+            )
+            queued += 1
+
+    print(f"Queued {queued} charbons for duration lookup")
+
+
+if __name__ == "__main__":
+    migrate()
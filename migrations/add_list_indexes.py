@@ -0,0 +1,22 @@
+# Creates the indexes used by the list endpoints' filters and sort orders.
+# Usage: python -m migrations.add_list_indexes
+import models
+from database import engine
+
+TABLES = [
+    models.Charbon.__table__,
+    models.Announcement.__table__,
+    models.Exercise.__table__,
+]
+
+
+def migrate():
+    with engine.begin() as conn:
+        for table in TABLES:
+            for index in sorted(table.indexes, key=lambda i: i.name):
+                index.create(bind=conn, checkfirst=True)
+                print(f"{table.name}: {index.name}")
+
+
+if __name__ == "__main__":
+    migrate()
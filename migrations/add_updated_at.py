@@ -0,0 +1,34 @@
+# Adds the updated_at columns read by the incremental exports and stamps
+# existing rows with the migration time.
+# Usage: python -m migrations.add_updated_at
+import time
+
+from sqlalchemy import update
+
+import models
+from database import engine
+from migrations.common import add_missing_columns
+
+TABLES = [
+    models.Charbon.__table__,
+    models.Announcement.__table__,
+    models.Exercise.__table__,
+]
+
+
+def migrate():
+    now = int(time.time())
+    with engine.begin() as conn:
+        for table in TABLES:
+            add_missing_columns(conn, table, table.c.updated_at)
+            result = conn.execute(
+                update(table).where(table.c.updated_at.is_(None)).values(updated_at=now)
+            )
+            for index in table.indexes:
+                if table.c.updated_at in index.columns.values():
+                    index.create(bind=conn, checkfirst=True)
+            print(f"{table.name}: stamped {result.rowcount} rows")
+
+
+if __name__ == "__main__":
+    migrate()
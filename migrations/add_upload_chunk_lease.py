@@ -0,0 +1,17 @@
+# Adds the lease that keeps two chunks of a resumable upload from being written
+# into its part file at once.
+# Usage: python -m migrations.add_upload_chunk_lease
+import models
+from database import engine
+from migrations.common import add_missing_columns
+
+
+def migrate():
+    table = models.UploadSession.__table__
+    with engine.begin() as conn:
+        add_missing_columns(conn, table, table.c.locked_until)
+    print(f"{table.name}: locked_until added")
+
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,81 @@
+# Creates the search index tables and indexes every existing charbon,
+# announcement and exercise. Writes keep the index up to date afterwards.
+# Usage: python -m migrations.build_search_index
+import base64
+
+from sqlalchemy import select
+
+import models
+from compression import decompress
+from database import engine
+from search import html_text, index_statements
+
+BATCH_SIZE = 200
+
+
+def _exercise_text(content: bytes, encoding) -> str:
+    if encoding is None:
+        content = base64.b64decode(content)
+    else:
+        content = decompress(content, encoding)
+    return html_text(content.decode("utf-8"))
+
+
+def _index_table(kind: str, table, columns, to_document) -> int:
+    indexed = 0
+    last_id = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                select(table.c.id, *columns)
+                .where(table.c.id > last_id)
+                .order_by(table.c.id)
+                .limit(BATCH_SIZE)
+            ).all()
+            if not rows:
+                break
+            for statement in index_statements(kind, [to_document(r) for r in rows]):
+                conn.execute(*statement)
+        last_id = rows[-1].id
+        indexed += len(rows)
+    return indexed
+
+
+def migrate():
+    models.SearchDocument.__table__.create(bind=engine, checkfirst=True)
+    models.SearchTerm.__table__.create(bind=engine, checkfirst=True)
+
+    charbons = models.Charbon.__table__
+    indexed = _index_table(
+        "charbon",
+        charbons,
+        [charbons.c.title, charbons.c.description],
+        lambda row: (row.id, row.title, row.description),
+    )
+    print(f"Indexed {indexed} charbons")
+
+    announcements = models.Announcement.__table__
+    indexed = _index_table(
+        "announcement",
+        announcements,
+        [announcements.c.title, announcements.c.content],
+        lambda row: (row.id, row.title, row.content),
+    )
+    print(f"Indexed {indexed} announcements")
+
+    exercises = models.Exercise.__table__
+    indexed = _index_table(
+        "exercise",
+        exercises,
+        [exercises.c.title, exercises.c.content, exercises.c.content_encoding],
+        lambda row: (
+            row.id,
+            row.title,
+            _exercise_text(row.content, row.content_encoding),
+        ),
+    )
+    print(f"Indexed {indexed} exercises")
+
+
+if __name__ == "__main__":
+    migrate()
@@ -0,0 +1,13 @@
+from sqlalchemy import inspect, text
+from sqlalchemy.engine import Connection
+
+
+def add_missing_columns(conn: Connection, table, *columns):
+    existing = {c["name"] for c in inspect(conn).get_columns(table.name)}
+    for column in columns:
+        if column.name in existing:
+            continue
+        column_type = column.type.compile(dialect=conn.dialect)
+        conn.execute(
+            text(f"ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}")
+        )
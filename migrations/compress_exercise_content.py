@@ -0,0 +1,53 @@
+# Converts legacy base64 exercise content to compressed storage.
+# Usage: python -m migrations.compress_exercise_content
+import base64
+
+from sqlalchemy import select, update
+
+import models
+from compression import STORAGE_ENCODING, compress
+from database import engine
+from migrations.common import add_missing_columns
+
+BATCH_SIZE = 50
+
+
+def migrate():
+    table = models.Exercise.__table__
+    with engine.begin() as conn:
+        add_missing_columns(conn, table, table.c.content_encoding, table.c.content_size)
+
+    migrated = 0
+    last_id = 0
+    while True:
+        with engine.begin() as conn:
+            rows = conn.execute(
+                select(table.c.id, table.c.content)
+                .where(table.c.content_encoding.is_(None), table.c.id > last_id)
+                .order_by(table.c.id)
+                .limit(BATCH_SIZE)
+            ).all()
+            if not rows:
+                break
+
+            for id, content in rows:
+                raw_content = base64.b64decode(content)
+                compressed = compress(raw_content)
+                conn.execute(
+                    update(table)
+                    .where(table.c.id == id)
+                    .values(
+                        content=compressed,
+                        content_encoding=STORAGE_ENCODING,
+                        content_size=len(raw_content),
+                    )
+                )
+                print(f"exercise {id}: {len(content)} -> {len(compressed)} bytes")
+            migrated += len(rows)
+            last_id = rows[-1].id
+
+    print(f"Migrated {migrated} exercises to {STORAGE_ENCODING}")
+
+
+if __name__ == "__main__":
+    migrate()
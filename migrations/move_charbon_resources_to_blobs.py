@@ -0,0 +1,72 @@
+# Moves charbon zips from STORAGE_PATH/charbons into the blob storage and points
+# the charbons at them by digest.
+# Usage: python -m migrations.move_charbon_resources_to_blobs
+import hashlib
+import os
+import time
+
+from sqlalchemy import insert, select, update
+
+import models
+from blob_storage import blob_storage
+from config import settings
+from database import engine
+from migrations.common import add_missing_columns
+
+LEGACY_PATH = os.path.join(settings.storage_path, "charbons")
+CHUNK_SIZE = 1024 * 1024
+
+
+def _hash_file(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def migrate():
+    charbons = models.Charbon.__table__
+    blobs = models.Blob.__table__
+    with engine.begin() as conn:
+        blobs.create(bind=conn, checkfirst=True)
+        add_missing_columns(conn, charbons, charbons.c.resource_digest)
+
+    moved = 0
+    with engine.connect() as conn:
+        rows = conn.execute(
+            select(charbons.c.id).where(charbons.c.resource_digest.is_(None))
+        ).all()
+    for (id,) in rows:
+        path = os.path.join(LEGACY_PATH, f"charbon_{id}.zip")
+        if not os.path.exists(path):
+            continue
+        digest = _hash_file(path)
+        size = os.path.getsize(path)
+        now = int(time.time())
+        with engine.begin() as conn:
+            result = conn.execute(
+                update(blobs)
+                .where(blobs.c.digest == digest)
+                .values(refcount=blobs.c.refcount + 1, updated_at=now)
+            )
+            if result.rowcount == 0:
+                conn.execute(
+                    insert(blobs).values(
+                        digest=digest, size=size, refcount=1, updated_at=now
+                    )
+                )
+            conn.execute(
+                update(charbons)
+                .where(charbons.c.id == id)
+                .values(resource_digest=digest, resources=True)
+            )
+            blob_storage.put_file(digest, path)
+        moved += 1
+        print(f"charbon {id}: {digest}")
+
+    print(f"Moved {moved} charbon resources to blob storage")
+
+
+if __name__ == "__main__":
+    migrate()
@@ -1,32 +1,48 @@
+import time
+
 from sqlalchemy import (
     BigInteger,
     Boolean,
     Column,
     Enum,
     ForeignKey,
+    Index,
     Integer,
     LargeBinary,
     String,
 )
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import deferred, relationship
 
 from database import Base
 
 
+def _now() -> int:
+    return int(time.time())
+
+
 class Charbon(Base):
     __tablename__ = "charbon"
+    __table_args__ = (
+        Index("ix_charbon_course_id_datetime", "course_id", "datetime"),
+        Index("ix_charbon_course_id_duration", "course_id", "duration"),
+    )
     id = Column(Integer, primary_key=True, nullable=False)
     title = Column(String(100), nullable=False)
     description = Column(String(500), nullable=False)
-    datetime = Column(Integer, nullable=False)
+    datetime = Column(Integer, nullable=False, index=True)
     course_id = Column(
         String(4),
         ForeignKey("course.id", onupdate="CASCADE"),
         nullable=False,
     )
-    duration = Column(Integer)
+    duration = Column(Integer, index=True)
+    # Set while a DurationJob is resolving the replay duration
+    duration_pending = Column(Boolean, default=False, nullable=False)
     replay_link = Column(String(100))
     resources = Column(Boolean, default=False)
+    resource_digest = Column(String(64), ForeignKey("blob.digest"))
+    # Last change, used by the incremental exports in routers.export
+    updated_at = Column(Integer, default=_now, onupdate=_now, index=True)
 
     actionneurs = relationship(
         "CharbonHost", back_populates="charbon", cascade="all, delete"
@@ -76,9 +92,10 @@ class Actionneur(Base):
 class Announcement(Base):
     __tablename__ = "announcement"
     id = Column(Integer, primary_key=True, nullable=False)
-    title = Column(String(100), nullable=False)
+    title = Column(String(100), nullable=False, index=True)
     content = Column(String(5000), nullable=False)
-    datetime = Column(Integer, nullable=False)
+    datetime = Column(Integer, nullable=False, index=True)
+    updated_at = Column(Integer, default=_now, onupdate=_now, index=True)
 
 
 class ExerciseTopic(Base):
@@ -104,8 +121,77 @@ class Exercise(Base):
         Integer,
         ForeignKey("exercise_topic.id", onupdate="CASCADE", ondelete="CASCADE"),
         nullable=False,
+        index=True,
     )
     copyright = Column(Boolean, default=False, nullable=False)
-    content = Column(LargeBinary, nullable=False)
+    content = deferred(Column(LargeBinary, nullable=False))
+    # NULL marks legacy base64 content, see migrations.compress_exercise_content
+    content_encoding = Column(String(8))
+    content_size = Column(Integer)
+    updated_at = Column(Integer, default=_now, onupdate=_now, index=True)
 
     topic = relationship("ExerciseTopic", back_populates="exercises")
+
+
+class DurationJob(Base):
+    __tablename__ = "duration_job"
+    charbon_id = Column(
+        Integer,
+        ForeignKey("charbon.id", onupdate="CASCADE", ondelete="CASCADE"),
+        primary_key=True,
+        nullable=False,
+    )
+    video_id = Column(String(100), nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    run_at = Column(Integer, nullable=False, index=True)
+    locked_until = Column(Integer)
+    last_error = Column(String(255))
+
+
+class Blob(Base):
+    __tablename__ = "blob"
+    digest = Column(String(64), primary_key=True, nullable=False)
+    size = Column(BigInteger, nullable=False)
+    refcount = Column(Integer, default=0, nullable=False, index=True)
+    updated_at = Column(Integer, nullable=False)
+
+
+class UploadSession(Base):
+    __tablename__ = "upload_session"
+    id = Column(String(32), primary_key=True, nullable=False)
+    charbon_id = Column(
+        Integer,
+        ForeignKey("charbon.id", onupdate="CASCADE", ondelete="CASCADE"),
+        nullable=False,
+        index=True,
+    )
+    size = Column(BigInteger, nullable=False)
+    received = Column(BigInteger, default=0, nullable=False)
+    expires_at = Column(Integer, nullable=False, index=True)
+    # Lease of the request writing a chunk, see routers.charbons.upload_chunk
+    locked_until = Column(Integer)
+
+
+class SearchDocument(Base):
+    __tablename__ = "search_document"
+    kind = Column(String(16), primary_key=True, nullable=False)
+    ref_id = Column(Integer, primary_key=True, nullable=False)
+    title = Column(String(100), nullable=False)
+    # Weighted term count, see search.index_statements
+    length = Column(Integer, nullable=False)
+
+
+class SearchTerm(Base):
+    __tablename__ = "search_term"
+    __table_args__ = (Index("ix_search_term_document", "kind", "ref_id"),)
+    term = Column(String(64), primary_key=True, nullable=False)
+    kind = Column(String(16), primary_key=True, nullable=False)
+    ref_id = Column(Integer, primary_key=True, nullable=False)
+    frequency = Column(Integer, nullable=False)
+
+
+class TableVersion(Base):
+    __tablename__ = "table_version"
+    name = Column(String(50), primary_key=True, nullable=False)
+    version = Column(Integer, default=0, nullable=False)
+    updated_at = Column(Integer, nullable=False)
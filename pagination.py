@@ -0,0 +1,41 @@
+import base64
+import binascii
+import json
+from typing import Any, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import and_, or_
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def encode_cursor(sort: str, value: Any, id: int) -> str:
+    raw = json.dumps([sort, value, id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, sort: str) -> Tuple[Any, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        cursor_sort, value, id = json.loads(raw)
+    except (binascii.Error, UnicodeDecodeError, ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    if cursor_sort != sort or not isinstance(id, int):
+        raise HTTPException(status_code=400, detail="Cursor doesn't match sort order")
+    return value, id
+
+
+def seek_filter(column, id_column, value: Any, id: int, descending: bool):
+    # Rows come after the cursor in (column, id) order. NULLs sort first in
+    # ascending order and last in descending order, as on MySQL and SQLite.
+    if descending:
+        if value is None:
+            return and_(column.is_(None), id_column < id)
+        return or_(
+            column < value,
+            and_(column == value, id_column < id),
+            column.is_(None),
+        )
+    if value is None:
+        return or_(and_(column.is_(None), id_column > id), column.is_not(None))
+    return or_(column > value, and_(column == value, id_column > id))
@@ -0,0 +1,66 @@
+# pytest plugin failing tests whose requests issue too many SQL queries, on top
+# of the SQL profiler. Enable it with pytest_plugins = ["pytest_sql_profiler"]
+# in a conftest.py, then either use the fixture:
+#
+#     def test_charbons(client, max_queries):
+#         with max_queries(2):
+#             client.get("/charbons/")
+#
+# or mark the whole test:
+#
+#     @pytest.mark.max_queries(2)
+#     def test_charbon(client):
+#         client.get("/charbons/1/")
+#
+# The limit applies to each request made in the block or the test.
+from contextlib import contextmanager
+from typing import Iterator, List
+
+import pytest
+
+from sql_profiler import Profile, capture_profiles
+
+
+def check_queries(profiles: List[Profile], limit: int):
+    over = [profile for profile in profiles if len(profile.statements) > limit]
+    if not over:
+        return
+    lines = []
+    for profile in over:
+        lines.append(
+            f"{profile.method} {profile.path} issued {len(profile.statements)} "
+            f"queries, over the limit of {limit}:"
+        )
+        lines.extend(f"  {statement['statement']}" for statement in profile.statements)
+    pytest.fail("\n".join(lines), pytrace=False)
+
+
+@contextmanager
+def max_queries(limit: int) -> Iterator[List[Profile]]:
+    with capture_profiles() as profiles:
+        yield profiles
+    check_queries(profiles, limit)
+
+
+@pytest.fixture(name="max_queries")
+def max_queries_fixture():
+    return max_queries
+
+
+def pytest_configure(config):
+    config.addinivalue_line(
+        "markers",
+        "max_queries(n): fail when a request made by the test issues over n SQL "
+        "queries",
+    )
+
+
+@pytest.hookimpl(wrapper=True)
+def pytest_runtest_call(item):
+    marker = item.get_closest_marker("max_queries")
+    if marker is None:
+        return (yield)
+    with capture_profiles() as profiles:
+        result = yield
+    check_queries(profiles, marker.args[0])
+    return result
@@ -1,38 +1,58 @@
 from typing import Annotated, List
 
 from discord_auth import get_current_admin
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlalchemy import select
 from sqlalchemy.exc import DBAPIError
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
 import models
 import schemas
+from actionneur_cache import actionneur_cache
 from database import get_db
+from fast_json import FastJSONResponse
+from versioning import bump_version, conditional_get
 
 router = APIRouter(prefix="/actionneurs", tags=["Actionneurs"])
 
 
-@router.get("/", response_model=List[schemas.Actionneur])
-def get_actionneurs(db: Session = Depends(get_db)):
+@router.get(
+    "/",
+    response_model=List[schemas.Actionneur],
+    response_class=FastJSONResponse,
+    dependencies=[Depends(conditional_get("actionneur"))],
+)
+async def get_actionneurs(response: Response, db: AsyncSession = Depends(get_db)):
     try:
-        actionneurs = db.query(models.Actionneur).all()
-        return actionneurs
+        query = select(
+            models.Actionneur.id,
+            models.Actionneur.username,
+            models.Actionneur.is_admin,
+        )
+        # Discord ids are sent as strings, like schemas.Actionneur does
+        actionneurs = [
+            {"id": str(id), "username": username, "is_admin": is_admin}
+            for id, username, is_admin in await db.execute(query)
+        ]
+        return FastJSONResponse(actionneurs, headers=response.headers)
     except DBAPIError:
         raise HTTPException(status_code=500, detail="Database error")
 
 
-@router.post("/", response_model=schemas.User, status_code=201)
-def add_actionneur(
+@router.post("/", response_model=schemas.Actionneur, status_code=201)
+async def add_actionneur(
     user: schemas.Actionneur,
     admin: Annotated[models.Actionneur, Depends(get_current_admin)],
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     try:
-        new_user = models.User(**user.model_dump())
+        new_user = models.Actionneur(**user.model_dump())
         db.add(new_user)
-        db.commit()
-        db.refresh(new_user)
+        await bump_version(db, "actionneur")
+        await db.commit()
+        actionneur_cache.invalidate()
+        await db.refresh(new_user)
         return new_user
     except DBAPIError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail="Database error")
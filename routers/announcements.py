@@ -1,18 +1,30 @@
 from enum import Enum
-from typing import Annotated, List
+from typing import Annotated, List, Optional
 
 from discord_auth import get_current_actionneur
-from fastapi import APIRouter, Depends, HTTPException
-from sqlalchemy.exc import DBAPIError, IntegrityError
-from sqlalchemy.orm import Session
-from sqlalchemy.orm.exc import NoResultFound
+from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlalchemy import select, update
+from sqlalchemy.exc import DBAPIError, IntegrityError, NoResultFound
+from sqlalchemy.ext.asyncio import AsyncSession
 
 import models
 import schemas
 from database import get_db
+from fast_json import FastJSONResponse
+from pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor, seek_filter
+from search import index_documents, remove_documents
+from versioning import bump_version, conditional_get
 
 router = APIRouter(prefix="/announcements", tags=["Announcements"])
 
+# Same fields as schemas.Announcement
+ANNOUNCEMENT_COLUMNS = (
+    models.Announcement.title,
+    models.Announcement.content,
+    models.Announcement.datetime,
+    models.Announcement.id,
+)
+
 
 class SortOptions(str, Enum):
     DATE_ASC = "date_asc"
@@ -20,98 +32,145 @@ class SortOptions(str, Enum):
     NAME_ASC = "name_asc"
     NAME_DESC = "name_desc"
 
-    def get_sort_option(self):
-        options = {
-            SortOptions.DATE_ASC: models.Announcement.datetime.asc(),
-            SortOptions.DATE_DESC: models.Announcement.datetime.desc(),
-            SortOptions.NAME_ASC: models.Announcement.title.asc(),
-            SortOptions.NAME_DESC: models.Announcement.title.desc(),
+    def get_sort_key(self):
+        keys = {
+            SortOptions.DATE_ASC: (models.Announcement.datetime, False),
+            SortOptions.DATE_DESC: (models.Announcement.datetime, True),
+            SortOptions.NAME_ASC: (models.Announcement.title, False),
+            SortOptions.NAME_DESC: (models.Announcement.title, True),
         }
-        return options.get(self, models.Announcement.datetime.desc())
+        return keys.get(self, (models.Announcement.datetime, True))
+
+    def get_sort_option(self):
+        column, descending = self.get_sort_key()
+        if descending:
+            return column.desc(), models.Announcement.id.desc()
+        return column.asc(), models.Announcement.id.asc()
+
+    def get_seek_filter(self, cursor: str):
+        column, descending = self.get_sort_key()
+        value, id = decode_cursor(cursor, self.value)
+        return seek_filter(column, models.Announcement.id, value, id, descending)
+
+    def get_cursor(self, announcement: models.Announcement) -> str:
+        column, _ = self.get_sort_key()
+        return encode_cursor(
+            self.value, getattr(announcement, column.key), announcement.id
+        )
 
 
-@router.get("/", response_model=List[schemas.Announcement])
-def get_announcements(
+@router.get(
+    "/",
+    response_model=List[schemas.Announcement],
+    response_class=FastJSONResponse,
+    dependencies=[Depends(conditional_get("announcement"))],
+)
+async def get_announcements(
+    response: Response,
     limit: int = 10,
     offset: int = 0,
     sort: SortOptions = SortOptions.DATE_DESC,
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
 ):
     try:
-        query = (
-            db.query(models.Announcement)
-            .order_by(sort.get_sort_option())
-            .limit(limit)
-            .offset(offset)
+        query = select(*ANNOUNCEMENT_COLUMNS).order_by(*sort.get_sort_option())
+        if cursor:
+            query = query.where(sort.get_seek_filter(cursor))
+        announcements = (await db.execute(query.limit(limit).offset(offset))).all()
+        if limit and len(announcements) == limit:
+            response.headers[NEXT_CURSOR_HEADER] = sort.get_cursor(announcements[-1])
+        return FastJSONResponse(
+            [row._asdict() for row in announcements], headers=response.headers
         )
-        return query.all()
     except DBAPIError:
         raise HTTPException(status_code=500, detail="Database error")
 
 
-@router.get("/{id}/", response_model=schemas.Announcement)
-def get_announcement(id: int, db: Session = Depends(get_db)):
+@router.get(
+    "/{id}/",
+    response_model=schemas.Announcement,
+    dependencies=[Depends(conditional_get("announcement"))],
+)
+async def get_announcement(id: int, db: AsyncSession = Depends(get_db)):
     try:
-        query = db.query(models.Announcement).filter_by(id=id).one()
-        return query
+        query = select(models.Announcement).filter_by(id=id)
+        return (await db.execute(query)).scalar_one()
     except NoResultFound:
         raise HTTPException(status_code=404, detail="Announcement not found")
     except DBAPIError:
         raise HTTPException(status_code=500, detail="Database error")
 
 
-@router.post("/")
-def add_announcement(
+@router.post("/", response_model=schemas.Announcement)
+async def add_announcement(
     announcement: schemas.AnnouncementCreate,
     actionneur: Annotated[models.Actionneur, Depends(get_current_actionneur)],
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     try:
         new_announcement = models.Announcement(**announcement.model_dump())
         db.add(new_announcement)
-        db.commit()
-        db.refresh(new_announcement)
-        return get_announcement(new_announcement.id, db)
+        await db.flush()
+        await index_documents(
+            db,
+            "announcement",
+            [(new_announcement.id, announcement.title, announcement.content)],
+        )
+        await bump_version(db, "announcement")
+        await db.commit()
+        await db.refresh(new_announcement)
+        return await get_announcement(new_announcement.id, db)
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(
             status_code=400,
             detail="Announcement already exists or violates a constraint",
         )
     except DBAPIError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail="Database error")
 
 
-@router.put("/{id}/")
-def update_announcement(
+@router.put("/{id}/", response_model=schemas.Announcement)
+async def update_announcement(
     id: int,
     announcement: schemas.AnnouncementCreate,
     actionneur: Annotated[models.Actionneur, Depends(get_current_actionneur)],
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     try:
-        ann = db.query(models.Announcement).filter_by(id=id).one()
-        ann.update(announcement.model_dump())
-        db.commit()
-    except NoResultFound:
-        raise HTTPException(status_code=404, detail="Announcement not found")
+        result = await db.execute(
+            update(models.Announcement)
+            .filter_by(id=id)
+            .values(**announcement.model_dump())
+        )
+        if result.rowcount == 0:
+            raise HTTPException(status_code=404, detail="Announcement not found")
+        await index_documents(
+            db, "announcement", [(id, announcement.title, announcement.content)]
+        )
+        await bump_version(db, "announcement")
+        await db.commit()
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=400, detail="Integrity error, check your data")
-    return get_announcement(id, db)
+    return await get_announcement(id, db)
 
 
 @router.delete("/{id}/")
-def delete_announcement(
+async def delete_announcement(
     id: int,
     actionneur: Annotated[models.Actionneur, Depends(get_current_actionneur)],
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     try:
-        ann = db.query(models.Announcement).filter_by(id=id).one()
-        db.delete(ann)
-        db.commit()
+        query = select(models.Announcement).filter_by(id=id)
+        ann = (await db.execute(query)).scalar_one()
+        await db.delete(ann)
+        await remove_documents(db, "announcement", [id])
+        await bump_version(db, "announcement")
+        await db.commit()
     except NoResultFound:
         raise HTTPException(status_code=404, detail="Announcement not found")
     return {}
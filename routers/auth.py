@@ -1,12 +1,15 @@
+import asyncio
 import time
 from typing import Annotated
 
-from fastapi import APIRouter, Depends, HTTPException
-from fastapi.responses import RedirectResponse
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException
+from fastapi.responses import JSONResponse, RedirectResponse
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.background import BackgroundTask
 
 import models
 import schemas
+from actionneur_cache import actionneur_cache
 from config import settings
 from database import get_db
 from discord_auth import (
@@ -26,29 +29,33 @@ router = APIRouter(prefix="/auth", tags=["Auth"])
 
 
 @router.post("/token/", response_model=schemas.TokenData)
-def discord_login(cred: schemas.TokenCreate):
-    access_token = exchange_discord_code(cred)
-    discord_user = get_discord_user(access_token)
-    user_guilds: list[int] = get_discord_user_guilds(access_token)
-    revoke_discord_token(access_token)
+async def discord_login(cred: schemas.TokenCreate, background_tasks: BackgroundTasks):
+    access_token = await exchange_discord_code(cred)
+    discord_user, user_guilds = await asyncio.gather(
+        get_discord_user(access_token), get_discord_user_guilds(access_token)
+    )
 
     if SERVER_HUB_GUILD_ID in user_guilds:
+        background_tasks.add_task(revoke_discord_token, access_token)
         exp_time = int(time.time()) + TOKEN_EXPIRATION_TIME
         jwt_token = create_jwt(discord_user.id, exp_time)
         return {"token": jwt_token, "exp_time": exp_time}
     else:
-        raise HTTPException(
-            status_code=401, detail="User isn't a member of the required guilds"
+        # Background tasks are dropped with a raised HTTPException
+        return JSONResponse(
+            status_code=401,
+            content={"detail": "User isn't a member of the required guilds"},
+            background=BackgroundTask(revoke_discord_token, access_token),
         )
 
 
 @router.post("/token/bot/{id}", response_model=schemas.TokenData)
-def discord_bot_login(
+async def discord_bot_login(
     id: str,
     admin: Annotated[models.Actionneur, Depends(get_current_admin)],
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
-    user = db.query(models.Actionneur).get(id)
+    user = await actionneur_cache.get(db, id)
     if not user or not user.is_admin:
         raise HTTPException(status_code=404, detail="User not found")
 
@@ -58,8 +65,8 @@ def discord_bot_login(
 
 
 @router.get("/me/", response_model=schemas.User)
-def get_user(
-    token: Annotated[str, Depends(oauth2_scheme)], db: Session = Depends(get_db)
+async def get_user(
+    token: Annotated[str, Depends(oauth2_scheme)], db: AsyncSession = Depends(get_db)
 ):
     user_id = decode_jwt(token)
     user_data = {
@@ -68,7 +75,7 @@ def get_user(
         "is_admin": False,
     }
 
-    db_user = db.query(models.Actionneur).get(user_id)
+    db_user = await actionneur_cache.get(db, user_id)
     if db_user:
         user_data = {
             "id": user_id,
@@ -1,23 +1,87 @@
 import os
+import time
 from enum import Enum
-from typing import Annotated, Any, Dict, List, Optional
-
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, status
-from fastapi.responses import FileResponse
-from sqlalchemy.exc import DBAPIError
-from sqlalchemy.orm import Session, joinedload
-from sqlalchemy.orm.exc import NoResultFound
+from typing import Annotated, Any, Dict, List, Optional, Set, Tuple
+
+import anyio
+import httpx
+from fastapi import (
+    APIRouter,
+    Depends,
+    HTTPException,
+    Request,
+    Response,
+    UploadFile,
+    status,
+)
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import RedirectResponse
+from sqlalchemy import (
+    Row,
+    Select,
+    String,
+    cast,
+    delete,
+    func,
+    insert,
+    or_,
+    select,
+    tuple_,
+    update,
+)
+from sqlalchemy.exc import DBAPIError, NoResultFound
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.requests import ClientDisconnect
 
 import models
 import schemas
+from blob_storage import blob_storage
+from blobs import clear_charbon_resource, set_charbon_resource
+from cache import charbon_cache
 from config import settings
 from database import get_db
-from discord_auth import get_current_actionneur, get_current_user
-from utils import extract_video_id_from_url, get_youtube_video_duration
+from discord_auth import get_current_actionneur, get_current_admin, get_current_user
+from downloads import file_download
+from duration_jobs import cancel_duration_job, duration_worker, enqueue_duration_job
+from fast_json import FastJSONResponse, dumps
+from pagination import NEXT_CURSOR_HEADER, decode_cursor, encode_cursor, seek_filter
+from search import index_documents, remove_documents
+from upload_sessions import (
+    UPLOADS_PATH,
+    create_upload_session,
+    get_part_path,
+    remove_part,
+)
+from uploads import check_zip_upload, discard_staged, save_zip_upload
+from utils import extract_video_id_from_url
+from versioning import bump_version, conditional_get
+from youtube import duration_resolver
 
 router = APIRouter(prefix="/charbons", tags=["Charbons"])
 
-STORAGE_PATH = os.path.join(settings.storage_path, "charbons")
+# Host ids of the selected charbon, joined into one comma-separated string
+charbon_host_ids = (
+    select(func.group_concat(cast(models.CharbonHost.actionneur_id, String)))
+    .where(models.CharbonHost.charbon_id == models.Charbon.id)
+    .scalar_subquery()
+)
+
+# Same fields and order as schemas.Charbon
+CHARBON_COLUMNS = (
+    models.Charbon.title,
+    models.Charbon.description,
+    models.Charbon.datetime,
+    models.Charbon.course_id,
+    models.Charbon.replay_link,
+    charbon_host_ids.label("actionneurs"),
+    models.Charbon.id,
+    models.Course.type.label("course_type"),
+    models.Charbon.duration,
+    models.Charbon.duration_pending,
+    models.Charbon.resources,
+)
+
+MAX_BULK_CHARBONS = 500
 
 
 class SortOptions(str, Enum):
@@ -26,30 +90,222 @@ class SortOptions(str, Enum):
     DURATION_ASC = "duration_asc"
     DURATION_DESC = "duration_desc"
 
-    def get_sort_option(self):
-        options = {
-            SortOptions.DATE_ASC: models.Charbon.datetime.asc(),
-            SortOptions.DATE_DESC: models.Charbon.datetime.desc(),
-            SortOptions.DURATION_ASC: models.Charbon.duration.asc(),
-            SortOptions.DURATION_DESC: models.Charbon.duration.desc(),
+    def get_sort_key(self):
+        keys = {
+            SortOptions.DATE_ASC: (models.Charbon.datetime, False),
+            SortOptions.DATE_DESC: (models.Charbon.datetime, True),
+            SortOptions.DURATION_ASC: (models.Charbon.duration, False),
+            SortOptions.DURATION_DESC: (models.Charbon.duration, True),
         }
-        return options.get(self, models.Charbon.datetime.desc())
+        return keys.get(self, (models.Charbon.datetime, True))
+
+    def get_sort_option(self, date_filtered: bool = False, type_filtered: bool = False):
+        column, descending = self.get_sort_key()
+        if type_filtered or (date_filtered and column is not models.Charbon.datetime):
+            # An expression can't be read in order from an index, so the filter
+            # is searched (the date range, or the course_id indexes for each
+            # course of the type) and only its rows are sorted, instead of
+            # walking the whole ordering index
+            column = column + 0
+        if descending:
+            return column.desc(), models.Charbon.id.desc()
+        return column.asc(), models.Charbon.id.asc()
+
+    def get_seek_filter(self, cursor: str):
+        column, descending = self.get_sort_key()
+        value, id = decode_cursor(cursor, self.value)
+        return seek_filter(column, models.Charbon.id, value, id, descending)
+
+    def get_cursor(self, charbon: Dict[str, Any]) -> str:
+        column, _ = self.get_sort_key()
+        return encode_cursor(self.value, charbon[column.key], charbon["id"])
+
 
+def _select_charbons() -> Select:
+    # Whole charbons with their hosts in a single query, without loading models
+    return select(*CHARBON_COLUMNS).join(models.Course)
 
-def _transform_charbon(charbon: models.Charbon) -> Dict[str, Any]:
-    charbon_dict: Dict[str, Any] = charbon.__dict__
-    charbon_dict["actionneurs"] = [a.actionneur.id for a in charbon.actionneurs]
-    charbon_dict["course_type"] = charbon.course.type
-    charbon_dict.pop("course", None)
-    return charbon_dict
+
+def _charbon_from_row(row: Row) -> Dict[str, Any]:
+    charbon = row._asdict()
+    hosts = charbon["actionneurs"]
+    charbon["actionneurs"] = sorted(hosts.split(","), key=int) if hosts else []
+    return charbon
 
 
 def _get_file_name(charbon: models.Charbon) -> str:
     return f"charbon_{charbon.id}.zip"
 
 
-@router.get("/", response_model=List[schemas.Charbon])
-def get_charbons(
+async def _get_cache_state(db: AsyncSession, id: int) -> Optional[Dict[str, Any]]:
+    query = (
+        select(models.Charbon.course_id, models.Charbon.datetime, models.Course.type)
+        .join(models.Course)
+        .where(models.Charbon.id == id)
+    )
+    row = (await db.execute(query)).first()
+    if row is None:
+        return None
+    return {
+        "course_id": row.course_id,
+        "datetime": row.datetime,
+        "course_type": row.type,
+    }
+
+
+def _get_video_id(replay_link: str) -> str:
+    video_id = extract_video_id_from_url(replay_link)
+    if not video_id:
+        raise HTTPException(status_code=400, detail="Invalid youtube link")
+    return video_id
+
+
+def _get_duration(replay_link: Optional[str]) -> Tuple[Optional[int], Optional[str]]:
+    # The cached duration, otherwise the video the duration worker has to look up
+    if not replay_link:
+        return None, None
+    video_id = _get_video_id(replay_link)
+    duration = duration_resolver.peek(video_id)
+    return duration, None if duration else video_id
+
+
+def _keeps_duration(current, replay_link: Optional[str]) -> bool:
+    return replay_link == current.replay_link and bool(
+        current.duration or current.duration_pending
+    )
+
+
+def _get_host_ids(actionneurs: List[str]) -> Set[int]:
+    try:
+        return {int(actionneur) for actionneur in actionneurs}
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid actionneur id")
+
+
+async def _set_hosts(db: AsyncSession, hosts: Dict[int, Set[int]]):
+    # Only the host rows that differ are deleted or inserted
+    host = models.CharbonHost
+    query = select(host.charbon_id, host.actionneur_id)
+    current = set((await db.execute(query.where(host.charbon_id.in_(hosts)))).all())
+    wanted = {(id, a) for id, actionneurs in hosts.items() for a in actionneurs}
+
+    removed = current - wanted
+    if removed:
+        await db.execute(
+            delete(host)
+            .where(tuple_(host.charbon_id, host.actionneur_id).in_(removed))
+            .execution_options(synchronize_session=False)
+        )
+    added = wanted - current
+    if added:
+        await db.execute(
+            insert(host),
+            [{"charbon_id": id, "actionneur_id": a} for id, a in sorted(added)],
+        )
+
+
+def _matches_filters(filters: Dict[str, Any], state: Dict[str, Any]) -> bool:
+    if filters["course_type"] and state["course_type"] != filters["course_type"]:
+        return False
+    if filters["course"] and state["course_id"] != filters["course"]:
+        return False
+    if filters["min_date"] and state["datetime"] < filters["min_date"]:
+        return False
+    if filters["max_date"] and state["datetime"] > filters["max_date"]:
+        return False
+    return True
+
+
+def _invalidate_cache(*states: Optional[Dict[str, Any]]):
+    # A write can move rows across pages of any listing it matches, before or
+    # after the change, so those listings are dropped entirely
+    states = [state for state in states if state is not None]
+    charbon_cache.invalidate(
+        lambda filters: any(_matches_filters(filters, state) for state in states)
+    )
+
+
+@router.get("/cache/")
+async def get_cache_stats(
+    admin: Annotated[models.Actionneur, Depends(get_current_admin)],
+):
+    return charbon_cache.stats()
+
+
+@router.get("/durations/")
+async def get_duration_stats(
+    admin: Annotated[models.Actionneur, Depends(get_current_admin)],
+):
+    return duration_resolver.stats()
+
+
+@router.post("/durations/refresh/")
+async def refresh_durations(
+    admin: Annotated[models.Actionneur, Depends(get_current_admin)],
+    db: AsyncSession = Depends(get_db),
+):
+    # Re-reads every replay duration from YouTube, e.g. after videos were re-cut
+    try:
+        query = select(
+            models.Charbon.id,
+            models.Charbon.replay_link,
+            models.Charbon.duration,
+            models.Charbon.duration_pending,
+        ).where(models.Charbon.replay_link.is_not(None))
+        rows = (await db.execute(query)).all()
+        video_ids = {row.id: extract_video_id_from_url(row.replay_link) for row in rows}
+        try:
+            durations = await duration_resolver.get_many(
+                [v for v in video_ids.values() if v], refresh=True
+            )
+        except httpx.HTTPError:
+            raise HTTPException(status_code=502, detail="Could not reach YouTube")
+
+        changes = [
+            {
+                "id": row.id,
+                "duration": durations[video_ids[row.id]],
+                "duration_pending": False,
+            }
+            for row in rows
+            if video_ids[row.id] in durations
+            and (durations[video_ids[row.id]] != row.duration or row.duration_pending)
+        ]
+        if changes:
+            await db.execute(update(models.Charbon), changes)
+            # Their queued jobs are done too. Matched on the video, a job for
+            # a replay link changed meanwhile stays
+            resolved = [(c["id"], video_ids[c["id"]]) for c in changes]
+            await db.execute(
+                delete(models.DurationJob).where(
+                    tuple_(
+                        models.DurationJob.charbon_id, models.DurationJob.video_id
+                    ).in_(resolved)
+                )
+            )
+            await bump_version(db, "charbon")
+            await db.commit()
+            # Durations feed the duration sort of every listing
+            charbon_cache.clear()
+
+        return {
+            "charbons": len(rows),
+            "updated": len(changes),
+            "not_found": sum(1 for v in video_ids.values() if v not in durations),
+        }
+    except DBAPIError:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail="Database error")
+
+
+@router.get(
+    "/",
+    response_model=List[schemas.Charbon],
+    response_class=FastJSONResponse,
+    dependencies=[Depends(conditional_get("charbon", "course"))],
+)
+async def get_charbons(
+    response: Response,
     limit: Optional[int] = None,
     offset: int = 0,
     course_type: Optional[schemas.CourseType] = None,
@@ -57,49 +313,70 @@ def get_charbons(
     sort: Optional[SortOptions] = SortOptions.DATE_DESC,
     min_date: Optional[int] = None,
     max_date: Optional[int] = None,
-    db: Session = Depends(get_db),
+    cursor: Optional[str] = None,
+    db: AsyncSession = Depends(get_db),
 ):
+    filters = {
+        "course_type": course_type.value if course_type else None,
+        "course": course,
+        "min_date": min_date,
+        "max_date": max_date,
+    }
+    cache_key = (limit, offset, sort, cursor, *filters.values())
+    generation = charbon_cache.generation
+    cached = charbon_cache.get(cache_key)
+    if cached is not None:
+        headers = {**response.headers, **cached.headers}
+        return Response(cached.body, media_type="application/json", headers=headers)
+
     try:
-        query = (
-            db.query(models.Charbon)
-            .join(models.Course)
-            .options(
-                joinedload(models.Charbon.actionneurs),
-                joinedload(models.Charbon.course),
-            )
-            .order_by(sort.get_sort_option())
+        date_filtered = bool(min_date or max_date)
+        query = _select_charbons().order_by(
+            *sort.get_sort_option(date_filtered, bool(course_type))
         )
+        if cursor:
+            query = query.where(sort.get_seek_filter(cursor))
         if course_type:
-            query = query.filter(models.Course.type == course_type)
+            # On course_id, so the charbons of each course are searched through
+            # the course_id indexes
+            course_ids = select(models.Course.id).where(
+                models.Course.type == course_type
+            )
+            query = query.where(models.Charbon.course_id.in_(course_ids))
         if course:
-            query = query.filter(models.Charbon.course_id == course)
+            query = query.where(models.Charbon.course_id == course)
         if min_date:
-            query = query.filter(models.Charbon.datetime >= min_date)
+            query = query.where(models.Charbon.datetime >= min_date)
         if max_date:
-            query = query.filter(models.Charbon.datetime <= max_date)
+            query = query.where(models.Charbon.datetime <= max_date)
         query = query.offset(offset)
         if limit:
             query = query.limit(limit)
 
-        charbons = [_transform_charbon(charbon) for charbon in query.all()]
-        return charbons
+        result = await db.execute(query)
+        charbons = [_charbon_from_row(row) for row in result.all()]
     except DBAPIError:
         raise HTTPException(status_code=500, detail="Database error")
 
-
-@router.get("/{id}/", response_model=schemas.Charbon)
-def get_charbon(id: int, db: Session = Depends(get_db)):
+    body = dumps(charbons)
+    headers = {}
+    if limit and len(charbons) == limit:
+        headers[NEXT_CURSOR_HEADER] = sort.get_cursor(charbons[-1])
+    charbon_cache.put(cache_key, body, headers, filters, generation)
+    return Response(
+        body, media_type="application/json", headers={**response.headers, **headers}
+    )
+
+
+@router.get(
+    "/{id}/",
+    response_model=schemas.Charbon,
+    dependencies=[Depends(conditional_get("charbon", "course"))],
+)
+async def get_charbon(id: int, db: AsyncSession = Depends(get_db)):
     try:
-        query = (
-            db.query(models.Charbon)
-            .options(
-                joinedload(models.Charbon.actionneurs),
-                joinedload(models.Charbon.course),
-            )
-            .filter_by(id=id)
-        )
-        charbon = _transform_charbon(query.one())
-        return charbon
+        result = await db.execute(_select_charbons().where(models.Charbon.id == id))
+        return _charbon_from_row(result.one())
     except NoResultFound:
         raise HTTPException(status_code=404, detail="Charbon not found")
     except DBAPIError:
@@ -107,13 +384,14 @@ def get_charbon(id: int, db: Session = Depends(get_db)):
 
 
 @router.get("/{id}/content/")
-def get_content(
+async def get_content(
+    request: Request,
     id: int,
     user: Annotated[int, Depends(get_current_user)],
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     try:
-        charbon = db.query(models.Charbon).get(id)
+        charbon = await db.get(models.Charbon, id)
         if not charbon:
             raise HTTPException(status_code=404, detail="Charbon not found")
 
@@ -123,15 +401,24 @@ def get_content(
                 status_code=401,
                 detail="You need a valid token to access this exercise",
             )
-        path = os.path.join(STORAGE_PATH, _get_file_name(charbon))
+        if not charbon.resource_digest:
+            raise HTTPException(status_code=404, detail="File not found")
 
+        filename = _get_file_name(charbon)
+        path = blob_storage.local_path(charbon.resource_digest)
+        if path is None:
+            url = await run_in_threadpool(
+                blob_storage.get_url,
+                charbon.resource_digest,
+                filename,
+                settings.blob_url_expiration,
+            )
+            return RedirectResponse(url)
         if not os.path.exists(path):
             raise HTTPException(status_code=404, detail="File not found")
 
-        return FileResponse(
-            os.path.join(path),
-            media_type="application/zip",
-            filename=_get_file_name(charbon),
+        return file_download(
+            request, path, media_type="application/zip", filename=filename
         )
 
     except DBAPIError:
@@ -141,58 +428,198 @@ def get_content(
 
 
 @router.post("/", response_model=schemas.Charbon, status_code=status.HTTP_201_CREATED)
-def add_charbon(
+async def add_charbon(
     charbon: schemas.CharbonCreate,
     actionneur: Annotated[models.Actionneur, Depends(get_current_actionneur)],
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     try:
         charbon_dump = charbon.model_dump()
         charbon_dump.pop("actionneurs")
         new_charbon = models.Charbon(**charbon_dump)
 
-        if charbon.replay_link:
-            video_id = extract_video_id_from_url(charbon.replay_link)
-            if not video_id:
-                raise HTTPException(status_code=400, detail="Invalid youtube link")
-            duration = get_youtube_video_duration(video_id, settings.youtube_api_key)
-            if not duration:
-                raise HTTPException(
-                    status_code=400, detail="Could not extract duration from video"
-                )
-            new_charbon.duration = duration
-        else:
-            new_charbon.duration = None
+        # The duration is resolved by the duration worker unless already cached
+        new_charbon.duration, video_id = _get_duration(charbon.replay_link)
+        new_charbon.duration_pending = video_id is not None
+        hosts = _get_host_ids(charbon.actionneurs)
 
         db.add(new_charbon)
-        db.flush()
-        actionneurs = [
-            models.CharbonHost(charbon_id=new_charbon.id, actionneur_id=actionneur)
-            for actionneur in charbon.actionneurs
-        ]
-        db.add_all(actionneurs)
-        db.commit()
+        await db.flush()
+        if video_id:
+            await enqueue_duration_job(db, new_charbon.id, video_id)
+        await _set_hosts(db, {new_charbon.id: hosts})
+        await index_documents(
+            db, "charbon", [(new_charbon.id, charbon.title, charbon.description)]
+        )
+        await bump_version(db, "charbon")
+        await db.commit()
+        duration_worker.notify()
+        _invalidate_cache(await _get_cache_state(db, new_charbon.id))
 
-        return get_charbon(new_charbon.id, db)
+        return await get_charbon(new_charbon.id, db)
     except DBAPIError as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=f"Database error {e}")
 
 
+async def _get_charbons_by_id(db: AsyncSession, ids: List[int]) -> List[Dict[str, Any]]:
+    result = await db.execute(_select_charbons().where(models.Charbon.id.in_(ids)))
+    charbons = {row.id: _charbon_from_row(row) for row in result.all()}
+    return [charbons[id] for id in ids]
+
+
+@router.post("/bulk/", response_model=List[schemas.Charbon])
+async def save_charbons(
+    charbons: List[schemas.CharbonBulkItem],
+    actionneur: Annotated[models.Actionneur, Depends(get_current_actionneur)],
+    db: AsyncSession = Depends(get_db),
+):
+    # Creates and updates many charbons in one transaction, nothing is saved
+    # unless all of them are valid
+    if len(charbons) > MAX_BULK_CHARBONS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {MAX_BULK_CHARBONS} charbons can be saved at once",
+        )
+    update_ids = [charbon.id for charbon in charbons if charbon.id is not None]
+    if len(set(update_ids)) != len(update_ids):
+        raise HTTPException(status_code=400, detail="Duplicate charbon id")
+    if not charbons:
+        return []
+
+    try:
+        course_ids = {charbon.course_id for charbon in charbons}
+        query = select(models.Course.id, models.Course.type)
+        query = query.where(models.Course.id.in_(course_ids))
+        course_types = dict((await db.execute(query)).all())
+        if len(course_types) != len(course_ids):
+            raise HTTPException(status_code=400, detail="Course not found")
+
+        current = {}
+        if update_ids:
+            query = (
+                select(
+                    models.Charbon.id,
+                    models.Charbon.replay_link,
+                    models.Charbon.duration,
+                    models.Charbon.duration_pending,
+                    models.Charbon.course_id,
+                    models.Charbon.datetime,
+                    models.Course.type.label("course_type"),
+                )
+                .join(models.Course)
+                .where(models.Charbon.id.in_(update_ids))
+            )
+            current = {row.id: row for row in await db.execute(query)}
+            missing = [id for id in update_ids if id not in current]
+            if missing:
+                raise HTTPException(
+                    status_code=404, detail=f"Charbon {missing[0]} not found"
+                )
+
+        hosts = []
+        new_charbons = []
+        updates = []
+        pending_jobs = {}
+        replaced_jobs = []
+        for index, charbon in enumerate(charbons):
+            try:
+                hosts.append(_get_host_ids(charbon.actionneurs))
+                values = charbon.model_dump(exclude={"id", "actionneurs"})
+                row = current.get(charbon.id)
+                if row is not None and _keeps_duration(row, charbon.replay_link):
+                    values["duration"] = row.duration
+                    values["duration_pending"] = row.duration_pending
+                else:
+                    values["duration"], video_id = _get_duration(charbon.replay_link)
+                    values["duration_pending"] = video_id is not None
+                    if video_id:
+                        pending_jobs[index] = video_id
+                    if row is not None:
+                        replaced_jobs.append(row.id)
+            except HTTPException as e:
+                raise HTTPException(
+                    status_code=e.status_code, detail=f"Charbon {index}: {e.detail}"
+                )
+            if row is None:
+                new_charbons.append(models.Charbon(**values))
+            else:
+                updates.append({"id": row.id, **values})
+
+        host_ids = set().union(*hosts)
+        query = select(models.Actionneur.id).where(models.Actionneur.id.in_(host_ids))
+        if len((await db.scalars(query)).all()) != len(host_ids):
+            raise HTTPException(status_code=400, detail="Actionneur not found")
+
+        db.add_all(new_charbons)
+        await db.flush()
+        created = iter(new_charbons)
+        ids = [c.id if c.id is not None else next(created).id for c in charbons]
+
+        if updates:
+            await db.execute(update(models.Charbon), updates)
+        if replaced_jobs:
+            await db.execute(
+                delete(models.DurationJob).where(
+                    models.DurationJob.charbon_id.in_(replaced_jobs)
+                )
+            )
+        if pending_jobs:
+            now = int(time.time())
+            await db.execute(
+                insert(models.DurationJob),
+                [
+                    {"charbon_id": ids[i], "video_id": v, "attempts": 0, "run_at": now}
+                    for i, v in pending_jobs.items()
+                ],
+            )
+        await _set_hosts(db, dict(zip(ids, hosts)))
+        await index_documents(
+            db,
+            "charbon",
+            [(id, c.title, c.description) for id, c in zip(ids, charbons)],
+        )
+        await bump_version(db, "charbon")
+        await db.commit()
+        duration_worker.notify()
+
+        states = [
+            {
+                "course_id": row.course_id,
+                "datetime": row.datetime,
+                "course_type": row.course_type,
+            }
+            for row in current.values()
+        ]
+        states += [
+            {
+                "course_id": charbon.course_id,
+                "datetime": charbon.datetime,
+                "course_type": course_types[charbon.course_id],
+            }
+            for charbon in charbons
+        ]
+        _invalidate_cache(*states)
+
+        return await _get_charbons_by_id(db, ids)
+    except DBAPIError:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail="Database error")
+
+
 @router.post("/{id}/content/", status_code=status.HTTP_201_CREATED)
-def add_content(
+async def add_content(
     id: int,
     file: UploadFile,
     actionneur: Annotated[models.Actionneur, Depends(get_current_actionneur)],
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     try:
-        charbon = db.query(models.Charbon).get(id)
+        charbon = await db.get(models.Charbon, id)
         if not charbon:
             raise HTTPException(status_code=404, detail="Charbon not found")
 
-        full_path = os.path.join(STORAGE_PATH, _get_file_name(charbon))
-        if os.path.exists(full_path):
+        if charbon.resource_digest:
             raise HTTPException(
                 status_code=400, detail="File already exists. Please delete it first."
             )
@@ -203,15 +630,19 @@ def add_content(
                 status_code=400, detail="Invalid file type. Please upload a zip file."
             )
 
-        if not os.path.exists(STORAGE_PATH):
-            os.makedirs(STORAGE_PATH)
-        with open(full_path, "wb") as f:
-            f.write(file.file.read())
-
-        charbon.resources = True
-        db.commit()
+        upload = await save_zip_upload(
+            file.file, UPLOADS_PATH, settings.charbon_max_upload_size
+        )
+        try:
+            await set_charbon_resource(db, charbon, upload)
+            await bump_version(db, "charbon")
+            await db.commit()
+        except BaseException:
+            discard_staged(upload)
+            raise
+        _invalidate_cache(await _get_cache_state(db, id))
 
-        return {}
+        return {"size": upload.size, "sha256": upload.sha256}
 
     except DBAPIError:
         raise HTTPException(status_code=500, detail="Database error")
@@ -220,114 +651,343 @@ def add_content(
 
 
 @router.put("/{id}/", response_model=schemas.Charbon)
-def update_charbon(
+async def update_charbon(
     id: int,
     charbon: schemas.CharbonCreate,
     actionneur: Annotated[models.Actionneur, Depends(get_current_actionneur)],
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     try:
         new_charbon = charbon.model_dump()
         new_charbon.pop("actionneurs", None)
 
-        if charbon.replay_link:
-            video_id = extract_video_id_from_url(charbon.replay_link)
-            duration = get_youtube_video_duration(video_id, settings.youtube_api_key)
-            if duration is None:
-                raise HTTPException(
-                    status_code=400, detail="Could not extract duration from video"
-                )
-            new_charbon["duration"] = duration
-        else:
-            new_charbon["duration"] = None
+        query = select(
+            models.Charbon.replay_link,
+            models.Charbon.duration,
+            models.Charbon.duration_pending,
+        )
+        current = (await db.execute(query.filter_by(id=id))).first()
+        if current is None:
+            raise HTTPException(status_code=404, detail="Charbon not found")
 
-        updated_rows = db.query(models.Charbon).filter_by(id=id).update(new_charbon)
-        if updated_rows == 0:
+        hosts = _get_host_ids(charbon.actionneurs)
+        if _keeps_duration(current, charbon.replay_link):
+            new_charbon["duration"] = current.duration
+            new_charbon["duration_pending"] = current.duration_pending
+        else:
+            new_charbon["duration"], video_id = _get_duration(charbon.replay_link)
+            new_charbon["duration_pending"] = video_id is not None
+            if video_id:
+                await enqueue_duration_job(db, id, video_id)
+            else:
+                await cancel_duration_job(db, id)
+
+        previous_state = await _get_cache_state(db, id)
+        result = await db.execute(
+            update(models.Charbon).filter_by(id=id).values(**new_charbon)
+        )
+        if result.rowcount == 0:
             raise HTTPException(status_code=404, detail="Charbon not found")
 
-        db.query(models.CharbonHost).filter_by(charbon_id=id).delete()
-        actionneurs = [
-            models.CharbonHost(charbon_id=id, actionneur_id=actionneur)
-            for actionneur in charbon.actionneurs
-        ]
-        db.add_all(actionneurs)
-        db.commit()
+        await _set_hosts(db, {id: hosts})
+        await index_documents(db, "charbon", [(id, charbon.title, charbon.description)])
+        await bump_version(db, "charbon")
+        await db.commit()
+        duration_worker.notify()
+        _invalidate_cache(previous_state, await _get_cache_state(db, id))
 
-        return get_charbon(id, db)
+        return await get_charbon(id, db)
     except DBAPIError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail="Database error")
 
 
 @router.put("/{id}/content/", status_code=status.HTTP_201_CREATED)
-def update_content(
+async def update_content(
     id: int,
     file: UploadFile,
     actionneur: Annotated[models.Actionneur, Depends(get_current_actionneur)],
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     try:
-        charbon = db.query(models.Charbon).get(id)
+        charbon = await db.get(models.Charbon, id)
         if not charbon:
             raise HTTPException(status_code=404, detail="Charbon not found")
 
-        full_path = os.path.join(STORAGE_PATH, _get_file_name(charbon))
-        if not os.path.exists(full_path):
+        if not charbon.resource_digest:
             raise HTTPException(
                 status_code=404, detail="File not found. Please create it first."
             )
 
-        with open(full_path, "wb") as f:
-            f.write(file.file.read())
+        upload = await save_zip_upload(
+            file.file, UPLOADS_PATH, settings.charbon_max_upload_size
+        )
+        try:
+            await set_charbon_resource(db, charbon, upload)
+            await bump_version(db, "charbon")
+            await db.commit()
+        except BaseException:
+            discard_staged(upload)
+            raise
+        _invalidate_cache(await _get_cache_state(db, id))
+
+        return {"size": upload.size, "sha256": upload.sha256}
+
+    except DBAPIError:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail="Database error")
+    except PermissionError:
+        raise HTTPException(status_code=500, detail="API Error")
+
+
+async def _get_upload(db: AsyncSession, id: int, upload_id: str):
+    upload = await db.get(models.UploadSession, upload_id)
+    if upload is None or upload.charbon_id != id or upload.expires_at < time.time():
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return upload
+
+
+@router.post(
+    "/{id}/content/uploads/",
+    response_model=schemas.UploadSession,
+    status_code=status.HTTP_201_CREATED,
+)
+async def create_upload(
+    id: int,
+    upload: schemas.UploadSessionCreate,
+    actionneur: Annotated[models.Actionneur, Depends(get_current_actionneur)],
+    db: AsyncSession = Depends(get_db),
+):
+    try:
+        charbon = await db.get(models.Charbon, id)
+        if not charbon:
+            raise HTTPException(status_code=404, detail="Charbon not found")
+        if upload.size <= 0:
+            raise HTTPException(status_code=400, detail="Invalid upload size")
+        if upload.size > settings.charbon_max_upload_size:
+            raise HTTPException(status_code=413, detail="File too large")
+
+        new_upload = create_upload_session(db, id, upload.size)
+        await db.commit()
+        return new_upload
+    except DBAPIError:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail="Database error")
+    except PermissionError:
+        raise HTTPException(status_code=500, detail="API Error")
+
+
+@router.get("/{id}/content/uploads/{upload_id}/", response_model=schemas.UploadSession)
+async def get_upload(
+    id: int,
+    upload_id: str,
+    actionneur: Annotated[models.Actionneur, Depends(get_current_actionneur)],
+    db: AsyncSession = Depends(get_db),
+):
+    try:
+        return await _get_upload(db, id, upload_id)
+    except DBAPIError:
+        raise HTTPException(status_code=500, detail="Database error")
+
+
+@router.put("/{id}/content/uploads/{upload_id}/", response_model=schemas.UploadSession)
+async def upload_chunk(
+    request: Request,
+    id: int,
+    upload_id: str,
+    offset: int,
+    actionneur: Annotated[models.Actionneur, Depends(get_current_actionneur)],
+    db: AsyncSession = Depends(get_db),
+):
+    # The request body is raw bytes written at offset, which must be the
+    # received length of the upload
+    try:
+        upload = await _get_upload(db, id, upload_id)
+        if offset != upload.received:
+            raise HTTPException(
+                status_code=409, detail=f"Expected offset {upload.received}"
+            )
+
+        # The session is claimed before the part file is touched, so two
+        # chunks sent at the same offset can't write into it together. The
+        # lease frees the session when a writer dies
+        now = int(time.time())
+        lease = now + settings.upload_chunk_lease
+        claim = await db.execute(
+            update(models.UploadSession)
+            .where(
+                models.UploadSession.id == upload_id,
+                models.UploadSession.received == offset,
+                or_(
+                    models.UploadSession.locked_until.is_(None),
+                    models.UploadSession.locked_until < now,
+                ),
+            )
+            .values(locked_until=lease)
+        )
+        await db.commit()
+        if claim.rowcount == 0:
+            raise HTTPException(
+                status_code=409, detail="Another chunk is being written"
+            )
 
-        return {}
+        written = 0
+        try:
+            async with await anyio.open_file(get_part_path(upload_id), "r+b") as f:
+                await f.seek(offset)
+                await f.truncate()
+                async for chunk in request.stream():
+                    if offset + written + len(chunk) > upload.size:
+                        raise HTTPException(
+                            status_code=413, detail="Chunk goes past the upload size"
+                        )
+                    if time.time() >= lease:
+                        # Another request may claim the session from now on
+                        raise HTTPException(
+                            status_code=408, detail="Chunk took too long"
+                        )
+                    await f.write(chunk)
+                    written += len(chunk)
+        except ClientDisconnect:
+            pass
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="Upload not found")
+        finally:
+            # Whatever reached the disk counts, so an interrupted chunk is
+            # resumed from where it stopped. Only while the lease is still
+            # this request's
+            result = await db.execute(
+                update(models.UploadSession)
+                .where(
+                    models.UploadSession.id == upload_id,
+                    models.UploadSession.received == offset,
+                    models.UploadSession.locked_until == lease,
+                )
+                .values(
+                    received=offset + written,
+                    expires_at=int(time.time()) + settings.upload_session_ttl,
+                    locked_until=None,
+                )
+            )
+            await db.commit()
 
+        if result.rowcount == 0:
+            raise HTTPException(status_code=409, detail="Upload changed meanwhile")
+        await db.refresh(upload)
+        return upload
     except DBAPIError:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail="Database error")
+
+
+@router.post(
+    "/{id}/content/uploads/{upload_id}/finalize/",
+    status_code=status.HTTP_201_CREATED,
+)
+async def finalize_upload(
+    id: int,
+    upload_id: str,
+    actionneur: Annotated[models.Actionneur, Depends(get_current_actionneur)],
+    db: AsyncSession = Depends(get_db),
+):
+    try:
+        upload = await _get_upload(db, id, upload_id)
+        if upload.received != upload.size:
+            raise HTTPException(status_code=409, detail="Upload is incomplete")
+        if upload.locked_until and upload.locked_until >= int(time.time()):
+            raise HTTPException(
+                status_code=409, detail="A chunk is still being written"
+            )
+
+        charbon = await db.get(models.Charbon, id)
+        if not charbon:
+            # Deleted while it was being uploaded, the upload goes with it
+            await db.delete(upload)
+            await db.commit()
+            remove_part(upload_id)
+            raise HTTPException(status_code=404, detail="Charbon not found")
+        staged = await check_zip_upload(get_part_path(upload_id))
+
+        await db.delete(upload)
+        await set_charbon_resource(db, charbon, staged)
+        await bump_version(db, "charbon")
+        await db.commit()
+        _invalidate_cache(await _get_cache_state(db, id))
+
+        return {"size": staged.size, "sha256": staged.sha256}
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    except DBAPIError:
+        await db.rollback()
         raise HTTPException(status_code=500, detail="Database error")
     except PermissionError:
         raise HTTPException(status_code=500, detail="API Error")
 
 
+@router.delete("/{id}/content/uploads/{upload_id}/")
+async def delete_upload(
+    id: int,
+    upload_id: str,
+    actionneur: Annotated[models.Actionneur, Depends(get_current_actionneur)],
+    db: AsyncSession = Depends(get_db),
+):
+    try:
+        upload = await _get_upload(db, id, upload_id)
+        await db.delete(upload)
+        await db.commit()
+        remove_part(upload_id)
+    except DBAPIError:
+        await db.rollback()
+        raise HTTPException(status_code=500, detail="Database error")
+
+
 @router.delete("/{id}/")
-def delete_charbon(
+async def delete_charbon(
     id: int,
     actionneur: Annotated[models.Actionneur, Depends(get_current_actionneur)],
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     try:
-        charbon = db.query(models.Charbon).filter_by(id=id).one()
-        db.delete(charbon)
-        db.commit()
+        query = select(models.Charbon).filter_by(id=id)
+        charbon = (await db.execute(query)).scalar_one()
+        previous_state = await _get_cache_state(db, id)
+        await clear_charbon_resource(db, charbon)
+        await db.delete(charbon)
+        await remove_documents(db, "charbon", [id])
+        await bump_version(db, "charbon")
+        await db.commit()
+        _invalidate_cache(previous_state)
     except NoResultFound:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=404, detail="Charbon not found")
     except DBAPIError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail="Database error")
 
     return {}
 
 
 @router.delete("/{id}/content/")
-def delete_content(
+async def delete_content(
     id: int,
     actionneur: Annotated[models.Actionneur, Depends(get_current_actionneur)],
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     try:
-        charbon = db.query(models.Charbon).filter_by(id=id).one()
-        full_path = os.path.join(STORAGE_PATH, _get_file_name(charbon))
-        if os.path.exists(full_path):
-            os.remove(full_path)
-            charbon.resources = False
-            db.commit()
+        query = select(models.Charbon).filter_by(id=id)
+        charbon = (await db.execute(query)).scalar_one()
+        if charbon.resource_digest:
+            await clear_charbon_resource(db, charbon)
+            await bump_version(db, "charbon")
+            await db.commit()
+            _invalidate_cache(await _get_cache_state(db, id))
         else:
             raise HTTPException(status_code=404, detail="Content not found")
     except NoResultFound:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=404, detail="Charbon not found")
     except DBAPIError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail="Database error")
 
     return {}
@@ -1,32 +1,46 @@
 from typing import Annotated, List
 
 from discord_auth import get_current_admin
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, Response, status
+from sqlalchemy import select, update
 from sqlalchemy.exc import DBAPIError
-from sqlalchemy.orm import Session
-from sqlalchemy.orm.exc import NoResultFound
+from sqlalchemy.ext.asyncio import AsyncSession
 
 import models
 import schemas
+from cache import charbon_cache
 from database import get_db
+from fast_json import FastJSONResponse
+from versioning import bump_version, conditional_get
 
 router = APIRouter(prefix="/courses", tags=["Courses"])
 
 
-@router.get("/", response_model=List[schemas.Course])
-def get_courses(db: Session = Depends(get_db)):
+@router.get(
+    "/",
+    response_model=List[schemas.Course],
+    response_class=FastJSONResponse,
+    dependencies=[Depends(conditional_get("course"))],
+)
+async def get_courses(response: Response, db: AsyncSession = Depends(get_db)):
     try:
-        query = db.query(models.Course)
-        return query.all()
+        rows = (await db.execute(select(models.Course.id, models.Course.type))).all()
+        return FastJSONResponse(
+            [row._asdict() for row in rows], headers=response.headers
+        )
     except DBAPIError:
         raise HTTPException(status_code=500, detail="Database error")
 
 
-@router.get("/{id}/", response_model=schemas.Course)
-def get_course(id: str, db: Session = Depends(get_db)):
+@router.get(
+    "/{id}/",
+    response_model=schemas.Course,
+    dependencies=[Depends(conditional_get("course"))],
+)
+async def get_course(id: str, db: AsyncSession = Depends(get_db)):
     try:
-        query = db.query(models.Course).filter_by(id=id)
-        course = query.first()
+        query = select(models.Course).filter_by(id=id)
+        course = (await db.scalars(query)).first()
         if not course:
             raise HTTPException(status_code=404, detail="Course not found")
         return course
@@ -35,37 +49,40 @@ def get_course(id: str, db: Session = Depends(get_db)):
 
 
 @router.post("/", response_model=schemas.Course, status_code=status.HTTP_201_CREATED)
-def add_course(
+async def add_course(
     course: schemas.CourseCreate,
     admin: Annotated[models.Actionneur, Depends(get_current_admin)],
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     try:
         new_course = models.Course(**course.model_dump())
         db.add(new_course)
-        db.commit()
-        db.refresh(new_course)
+        await bump_version(db, "course")
+        await db.commit()
+        await db.refresh(new_course)
         return new_course
     except DBAPIError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail="Database error")
 
 
 @router.put("/{id}/", response_model=schemas.Course)
-def update_course(
+async def update_course(
     id: str,
     course: schemas.CourseCreate,
     admin: Annotated[models.Actionneur, Depends(get_current_admin)],
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     try:
-        updated_rows = (
-            db.query(models.Course).filter_by(id=id).update(course.model_dump())
+        result = await db.execute(
+            update(models.Course).filter_by(id=id).values(**course.model_dump())
         )
-        db.commit()
-        if updated_rows == 0:
+        if result.rowcount == 0:
             raise HTTPException(status_code=404, detail="Course not found")
-        return get_course(id, db)
+        await bump_version(db, "course")
+        await db.commit()
+        charbon_cache.clear()
+        return await get_course(id, db)
     except DBAPIError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail="Database error")
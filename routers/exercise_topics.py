@@ -1,13 +1,18 @@
 from typing import Annotated, Any, Dict, List
 
 from discord_auth import get_current_actionneur
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
+from sqlalchemy import delete, select, update
 from sqlalchemy.exc import DBAPIError
-from sqlalchemy.orm import Session, joinedload, selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import contains_eager
 
 import models
 import schemas
 from database import get_db
+from fast_json import FastJSONResponse
+from search import remove_documents
+from versioning import bump_version, conditional_get
 
 router = APIRouter(prefix="/exercise_topics", tags=["Exercise topics"])
 
@@ -19,82 +24,103 @@ def _transform_et(et: models.ExerciseTopic) -> Dict[str, Any]:
     return et_dict
 
 
-@router.get("/")
-def get_exercise_topics(db: Session = Depends(get_db)):
+@router.get(
+    "/",
+    response_model=List[schemas.ExerciseTopic],
+    response_class=FastJSONResponse,
+    dependencies=[Depends(conditional_get("exercise_topic", "course"))],
+)
+async def get_exercise_topics(response: Response, db: AsyncSession = Depends(get_db)):
     try:
-        query = db.query(models.ExerciseTopic).options(
-            joinedload(models.ExerciseTopic.course)
+        query = select(
+            models.ExerciseTopic.topic,
+            models.ExerciseTopic.course_id,
+            models.Course.type.label("course_type"),
+            models.ExerciseTopic.id,
+        ).join(models.Course)
+        rows = (await db.execute(query)).all()
+        return FastJSONResponse(
+            [row._asdict() for row in rows], headers=response.headers
         )
-        return [_transform_et(et) for et in query.all()]
     except DBAPIError:
         raise HTTPException(status_code=500, detail="Database error")
 
 
-@router.get("/{id}/")
-def get_exercise_topic(id: int, db: Session = Depends(get_db)):
+@router.get(
+    "/{id}/", dependencies=[Depends(conditional_get("exercise_topic", "course"))]
+)
+async def get_exercise_topic(id: int, db: AsyncSession = Depends(get_db)):
     try:
         query = (
-            db.query(models.ExerciseTopic)
-            .options(selectinload(models.ExerciseTopic.course))
-            .filter_by(id=id)
+            select(models.ExerciseTopic)
+            .join(models.ExerciseTopic.course)
+            .options(contains_eager(models.ExerciseTopic.course))
+            .where(models.ExerciseTopic.id == id)
         )
-        et = _transform_et(query.first())
+        et = (await db.scalars(query)).first()
         if not et:
             raise HTTPException(status_code=404, detail="Exercise topic not found")
-        return et
+        return _transform_et(et)
     except DBAPIError:
         raise HTTPException(status_code=500, detail="Database error")
 
 
 @router.post("/", response_model=schemas.ExerciseTopic, status_code=201)
-def add_exercise_topic(
+async def add_exercise_topic(
     et: schemas.ExerciseTopicCreate,
     actionneur: Annotated[models.Actionneur, Depends(get_current_actionneur)],
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     try:
         new_et = models.ExerciseTopic(**et.model_dump())
         db.add(new_et)
-        db.commit()
-        db.refresh(new_et)
-        return get_exercise_topic(new_et.id, db)
+        await bump_version(db, "exercise_topic")
+        await db.commit()
+        await db.refresh(new_et)
+        return await get_exercise_topic(new_et.id, db)
     except DBAPIError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail="Database error")
 
 
 @router.put("/{id}/")
-def update_exercise_topic(
+async def update_exercise_topic(
     id: int,
     et: schemas.ExerciseTopicCreate,
     actionneur: Annotated[models.Actionneur, Depends(get_current_actionneur)],
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     try:
-        updated_rows = (
-            db.query(models.ExerciseTopic).filter_by(id=id).update(et.model_dump())
+        result = await db.execute(
+            update(models.ExerciseTopic).filter_by(id=id).values(**et.model_dump())
         )
-        db.commit()
-        if updated_rows == 0:
+        if result.rowcount == 0:
             raise HTTPException(status_code=404, detail="Exercise topic not found")
-        return get_exercise_topic(id, db)
+        await bump_version(db, "exercise_topic")
+        await db.commit()
+        return await get_exercise_topic(id, db)
     except DBAPIError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail="Database error")
 
 
 @router.delete("/{id}/")
-def delete_exercise_topic(
+async def delete_exercise_topic(
     id: int,
     actionneur: Annotated[models.Actionneur, Depends(get_current_actionneur)],
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     try:
-        deleted_rows = db.query(models.ExerciseTopic).filter_by(id=id).delete()
-        db.commit()
-        if deleted_rows == 0:
+        # The topic's exercises are deleted with it by the foreign key
+        exercises = select(models.Exercise.id).where(models.Exercise.topic_id == id)
+        await remove_documents(db, "exercise", exercises)
+        result = await db.execute(delete(models.ExerciseTopic).filter_by(id=id))
+        if result.rowcount == 0:
             raise HTTPException(status_code=404, detail="Exercise topic not found")
+        # The deleted exercises drop out of the exercise lists too
+        await bump_version(db, "exercise_topic", "exercise")
+        await db.commit()
         return {}
     except DBAPIError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail="Database error")
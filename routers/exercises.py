@@ -1,54 +1,134 @@
 import base64
-import subprocess
-from io import StringIO
-from typing import Annotated, List, Optional
+from typing import Annotated, Any, Dict, List, Optional
 
-from fastapi import APIRouter, Depends, HTTPException, status
-from fastapi.responses import FileResponse, StreamingResponse
+from fastapi import APIRouter, Depends, HTTPException, Request, Response, status
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import func, select, update
 from sqlalchemy.exc import DBAPIError
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import undefer
 
 import models
 import schemas
+from compile_cache import compile_cache
+from compiler_pool import CompileError, WorkerError, compiler_pool
+from compression import STORAGE_ENCODING, accepts_encoding, compress, decompress
 from database import get_db
-from discord_auth import get_current_actionneur, get_current_user
+from fast_json import FastJSONResponse
+from search import html_text, index_documents
+from discord_auth import get_current_actionneur, get_current_admin, get_current_user
+from versioning import bump_version, conditional_get
 
 router = APIRouter(prefix="/exercises", tags=["Exercises"])
 
-COMPILER_COMMAND = ["python3", "compile_plsmarkdown.py"]
-COMPILER_DIRECTORY = "compiler"
+# Same fields as schemas.Exercise
+EXERCISE_COLUMNS = (
+    models.Exercise.title,
+    models.Exercise.difficulty,
+    models.Exercise.is_corrected,
+    models.Exercise.source,
+    models.Exercise.topic_id,
+    models.Exercise.copyright,
+    models.Exercise.id,
+)
+
+
+async def _compile_content(content: str) -> str:
+    # The cache reads and writes files (and hashes the compiler sources once),
+    # all of it off the event loop
+    key = await run_in_threadpool(compile_cache.key, content)
+    compiled_content = await run_in_threadpool(compile_cache.get, key)
+    if compiled_content is not None:
+        return compiled_content
 
+    try:
+        compiled_content = await compiler_pool.compile_async(content)
+    except WorkerError:
+        raise HTTPException(status_code=500, detail="Compiler error")
+    except CompileError:
+        raise HTTPException(status_code=400, detail="Could not compile exercise")
+
+    await run_in_threadpool(compile_cache.put, key, compiled_content)
+    return compiled_content
+
+
+async def _encode_content(compiled_content: str) -> Dict[str, Any]:
+    raw_content = compiled_content.encode("utf-8")
+    return {
+        # Brotli at quality 11 takes long enough on large exercises to stall
+        # the event loop
+        "content": await run_in_threadpool(compress, raw_content),
+        "content_encoding": STORAGE_ENCODING,
+        "content_size": len(raw_content),
+    }
 
-def _compile_content(content: str) -> str:
-    process = subprocess.run(
-        COMPILER_COMMAND,
-        input=content.encode("utf-8"),
-        capture_output=True,
-        cwd=COMPILER_DIRECTORY,
-        check=True,
-    )
-    return process.stdout.decode("utf-8")
 
+def _decode_content(content: bytes, encoding: Optional[str]) -> str:
+    # Legacy rows hold base64 instead of compressed content
+    if encoding is None:
+        return base64.b64decode(content).decode("utf-8")
+    return decompress(content, encoding).decode("utf-8")
+
+
+@router.get("/compile_cache/")
+async def get_compile_cache_stats(
+    admin: Annotated[models.Actionneur, Depends(get_current_admin)],
+):
+    return compile_cache.stats()
 
-# TODO: dont request content from db
-@router.get("/", response_model=List[schemas.Exercise])
-def get_exercises(topic_id: Optional[int] = None, db: Session = Depends(get_db)):
+
+@router.get("/storage/", response_model=List[schemas.ExerciseStorage])
+async def get_exercises_storage(
+    admin: Annotated[models.Actionneur, Depends(get_current_admin)],
+    db: AsyncSession = Depends(get_db),
+):
     try:
-        query = db.query(models.Exercise)
+        query = select(
+            models.Exercise.id,
+            models.Exercise.title,
+            models.Exercise.content_encoding,
+            models.Exercise.content_size,
+            func.length(models.Exercise.content).label("stored_size"),
+        ).order_by(models.Exercise.id)
+        return [row._asdict() for row in (await db.execute(query)).all()]
+    except DBAPIError:
+        raise HTTPException(status_code=500, detail="Database error")
+
+
+@router.get(
+    "/",
+    response_model=List[schemas.Exercise],
+    response_class=FastJSONResponse,
+    dependencies=[Depends(conditional_get("exercise"))],
+)
+async def get_exercises(
+    response: Response,
+    topic_id: Optional[int] = None,
+    db: AsyncSession = Depends(get_db),
+):
+    try:
+        query = select(*EXERCISE_COLUMNS)
         if topic_id:
-            query = query.filter_by(topic_id=topic_id)
-        return query.all()
+            query = query.where(models.Exercise.topic_id == topic_id)
+        rows = (await db.execute(query)).all()
+        return FastJSONResponse(
+            [row._asdict() for row in rows], headers=response.headers
+        )
     except DBAPIError:
         raise HTTPException(status_code=500, detail="Database error")
 
 
-@router.get("/{id}/", response_model=schemas.Exercise)
-def get_exercise(
+@router.get(
+    "/{id}/",
+    response_model=schemas.Exercise,
+    dependencies=[Depends(conditional_get("exercise"))],
+)
+async def get_exercise(
     id: int,
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     try:
-        exercise = db.query(models.Exercise).get(id)
+        exercise = await db.get(models.Exercise, id)
         if not exercise:
             raise HTTPException(status_code=404, detail="Exercise not found")
         return exercise
@@ -57,13 +137,16 @@ def get_exercise(
 
 
 @router.get("/{id}/content/")
-def get_exercise_content(
+async def get_exercise_content(
     id: int,
+    request: Request,
     user: Annotated[int, Depends(get_current_user)],
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     try:
-        exercise = db.query(models.Exercise).get(id)
+        exercise = await db.get(
+            models.Exercise, id, options=[undefer(models.Exercise.content)]
+        )
         if not exercise:
             raise HTTPException(status_code=404, detail="Exercise not found")
         if exercise.copyright and user is None:
@@ -72,55 +155,91 @@ def get_exercise_content(
                 detail="You need a valid token to access this exercise",
             )
 
-        content = base64.b64decode(exercise.content).decode("utf-8")
+        content, encoding = exercise.content, exercise.content_encoding
+        if encoding is None:
+            content = base64.b64decode(content)
+
         headers = {
             "Content-Disposition": f"attachment; filename=exercise_{id}.html",
+            "Vary": "Accept-Encoding",
         }
+        if encoding is not None:
+            if accepts_encoding(request.headers.get("Accept-Encoding"), encoding):
+                headers["Content-Encoding"] = encoding
+            else:
+                content = decompress(content, encoding)
 
-        return StreamingResponse(
-            StringIO(content), media_type="text/plain", headers=headers
-        )
+        return Response(content, media_type="text/plain", headers=headers)
     except DBAPIError:
         raise HTTPException(status_code=500, detail="Database error")
 
 
 @router.post("/", response_model=schemas.Exercise, status_code=status.HTTP_201_CREATED)
-def add_exercise(
+async def add_exercise(
     exercise: schemas.ExerciseCreate,
     actionneur: Annotated[models.Actionneur, Depends(get_current_actionneur)],
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     try:
-        new_exercise = models.Exercise(**exercise.model_dump())
-        compiled_content_bytes = _compile_content(exercise.content).encode("utf-8")
-        new_exercise.content = base64.b64encode(compiled_content_bytes)
+        compiled_content = await _compile_content(exercise.content)
+        new_exercise = models.Exercise(
+            **{**exercise.model_dump(), **(await _encode_content(compiled_content))}
+        )
         db.add(new_exercise)
-        db.commit()
-        db.refresh(new_exercise)
+        await db.flush()
+        await index_documents(
+            db,
+            "exercise",
+            [(new_exercise.id, exercise.title, html_text(compiled_content))],
+        )
+        await bump_version(db, "exercise")
+        await db.commit()
+        await db.refresh(new_exercise)
         return new_exercise
     except DBAPIError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail="Database error")
 
 
 @router.put("/{id}/", response_model=schemas.Exercise)
-def update_exercise(
+async def update_exercise(
     id: int,
     exercise: schemas.ExerciseCreate,
     actionneur: Annotated[models.Actionneur, Depends(get_current_actionneur)],
-    db: Session = Depends(get_db),
+    db: AsyncSession = Depends(get_db),
 ):
     try:
         new_exercise = exercise.model_dump()
+        compiled_content = None
         if exercise.content:
-            compiled_content_bytes = _compile_content(exercise.content).encode("utf-8")
-            new_exercise["content"] = base64.b64encode(compiled_content_bytes)
-
-        updated_rows = db.query(models.Exercise).filter_by(id=id).update(new_exercise)
-        db.commit()
-        if updated_rows == 0:
+            compiled_content = await _compile_content(exercise.content)
+            new_exercise.update(await _encode_content(compiled_content))
+        else:
+            # Without new content the stored one is kept
+            del new_exercise["content"]
+
+        result = await db.execute(
+            update(models.Exercise).filter_by(id=id).values(**new_exercise)
+        )
+        if result.rowcount == 0:
             raise HTTPException(status_code=404, detail="Exercise not found")
-        return get_exercise(id, db)
+        if compiled_content is None:
+            row = (
+                await db.execute(
+                    select(
+                        models.Exercise.content, models.Exercise.content_encoding
+                    ).filter_by(id=id)
+                )
+            ).one()
+            compiled_content = await run_in_threadpool(
+                _decode_content, row.content, row.content_encoding
+            )
+        await index_documents(
+            db, "exercise", [(id, exercise.title, html_text(compiled_content))]
+        )
+        await bump_version(db, "exercise")
+        await db.commit()
+        return await get_exercise(id, db)
     except DBAPIError:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail="Database error")
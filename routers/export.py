@@ -0,0 +1,162 @@
+import base64
+import time
+from typing import (
+    Annotated,
+    Any,
+    AsyncIterator,
+    Awaitable,
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Sequence,
+)
+
+from fastapi import APIRouter, Depends
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Row, Select, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models
+from compression import decompress
+from database import AsyncSessionLocal
+from discord_auth import get_current_admin
+from fast_json import dumps
+
+router = APIRouter(prefix="/export", tags=["Export"])
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+# Rows fetched per round trip, and so held in memory at once
+EXPORT_BATCH_SIZE = 500
+EXPORT_STARTED_HEADER = "X-Export-Started"
+
+# Transforms get the rows of a partition and a session for extra lookups
+Transform = Callable[[AsyncSession, Sequence[Row]], Awaitable[List[Dict[str, Any]]]]
+
+
+def _encode_line(row: Dict[str, Any]) -> bytes:
+    return dumps(row) + b"\n"
+
+
+async def _as_dicts(db: AsyncSession, rows: Sequence[Row]) -> List[Dict[str, Any]]:
+    return [dict(row._mapping) for row in rows]
+
+
+async def _stream_rows(query: Select, transform: Transform) -> AsyncIterator[bytes]:
+    # The route's session is closed before the body is sent, so the stream
+    # opens its own and reads the rows through a server-side cursor. The
+    # streaming cursor keeps its connection busy, lookups go through a second
+    # session, which only connects once a transform uses it
+    async with AsyncSessionLocal() as db, AsyncSessionLocal() as lookup:
+        result = await db.stream(query.execution_options(yield_per=EXPORT_BATCH_SIZE))
+        async for rows in result.partitions():
+            yield b"".join(_encode_line(row) for row in await transform(lookup, rows))
+
+
+def _export_response(
+    model, query: Select, since: Optional[int], transform: Transform = _as_dicts
+) -> StreamingResponse:
+    # Clients pass the start time back as since to fetch only what changed,
+    # rows modified while the export runs are sent again next time
+    started = int(time.time())
+    if since is not None:
+        query = query.where(model.updated_at >= since)
+    return StreamingResponse(
+        _stream_rows(query.order_by(model.id), transform),
+        media_type=NDJSON_MEDIA_TYPE,
+        headers={EXPORT_STARTED_HEADER: str(started)},
+    )
+
+
+async def _add_charbon_hosts(
+    db: AsyncSession, rows: Sequence[Row]
+) -> List[Dict[str, Any]]:
+    charbons = {row.id: {**row._mapping, "actionneurs": []} for row in rows}
+    query = select(models.CharbonHost.charbon_id, models.CharbonHost.actionneur_id)
+    query = query.where(models.CharbonHost.charbon_id.in_(charbons))
+    for charbon_id, actionneur_id in await db.execute(query):
+        charbons[charbon_id]["actionneurs"].append(str(actionneur_id))
+    return list(charbons.values())
+
+
+def _decode_exercise_content(rows: Sequence[Row]) -> List[Dict[str, Any]]:
+    exercises = []
+    for row in rows:
+        exercise = dict(row._mapping)
+        content, encoding = exercise["content"], exercise.pop("content_encoding")
+        if encoding is None:
+            content = base64.b64decode(content)
+        else:
+            content = decompress(content, encoding)
+        exercise["content"] = content.decode("utf-8")
+        exercises.append(exercise)
+    return exercises
+
+
+async def _add_exercise_content(
+    db: AsyncSession, rows: Sequence[Row]
+) -> List[Dict[str, Any]]:
+    return await run_in_threadpool(_decode_exercise_content, rows)
+
+
+@router.get("/charbons.ndjson")
+async def export_charbons(
+    admin: Annotated[models.Actionneur, Depends(get_current_admin)],
+    since: Optional[int] = None,
+):
+    charbon = models.Charbon
+    query = select(
+        charbon.id,
+        charbon.title,
+        charbon.description,
+        charbon.datetime,
+        charbon.course_id,
+        models.Course.type.label("course_type"),
+        charbon.replay_link,
+        charbon.duration,
+        charbon.duration_pending,
+        charbon.resources,
+        charbon.updated_at,
+    ).join(models.Course)
+    return _export_response(charbon, query, since, _add_charbon_hosts)
+
+
+@router.get("/exercises.ndjson")
+async def export_exercises(
+    admin: Annotated[models.Actionneur, Depends(get_current_admin)],
+    since: Optional[int] = None,
+    include_content: bool = False,
+):
+    exercise = models.Exercise
+    columns = [
+        exercise.id,
+        exercise.title,
+        exercise.difficulty,
+        exercise.is_corrected,
+        exercise.source,
+        exercise.topic_id,
+        exercise.copyright,
+        exercise.updated_at,
+    ]
+    if not include_content:
+        return _export_response(exercise, select(*columns), since)
+
+    columns += [exercise.content, exercise.content_encoding]
+    return _export_response(exercise, select(*columns), since, _add_exercise_content)
+
+
+@router.get("/announcements.ndjson")
+async def export_announcements(
+    admin: Annotated[models.Actionneur, Depends(get_current_admin)],
+    since: Optional[int] = None,
+):
+    announcement = models.Announcement
+    query = select(
+        announcement.id,
+        announcement.title,
+        announcement.content,
+        announcement.datetime,
+        announcement.updated_at,
+    )
+    return _export_response(announcement, query, since)
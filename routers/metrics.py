@@ -0,0 +1,23 @@
+import secrets
+from typing import Annotated, Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import PlainTextResponse
+
+from config import settings
+from discord_auth import oauth2_scheme
+from metrics import CONTENT_TYPE, render
+
+router = APIRouter(tags=["Metrics"])
+
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def get_metrics(token: Annotated[Optional[str], Depends(oauth2_scheme)]):
+    # Scraped by Prometheus, which sends METRICS_TOKEN as a bearer token.
+    # Public when METRICS_TOKEN is unset. Compared as bytes, compare_digest
+    # rejects str with non-ASCII characters
+    if settings.metrics_token and not secrets.compare_digest(
+        (token or "").encode("utf-8"), settings.metrics_token.encode("utf-8")
+    ):
+        raise HTTPException(status_code=401, detail="Invalid metrics token")
+    return PlainTextResponse(render(), media_type=CONTENT_TYPE)
@@ -0,0 +1,46 @@
+from typing import List, Optional
+
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import schemas
+from database import get_db
+from search import search
+from versioning import conditional_get
+
+router = APIRouter(prefix="/search", tags=["Search"])
+
+
+@router.get(
+    "/",
+    response_model=List[schemas.SearchResult],
+    dependencies=[
+        Depends(
+            conditional_get(
+                "charbon", "announcement", "exercise", "exercise_topic", "course"
+            )
+        )
+    ],
+)
+async def search_all(
+    q: str,
+    kind: Optional[List[schemas.SearchKind]] = Query(None),
+    course_type: Optional[schemas.CourseType] = None,
+    limit: int = 20,
+    offset: int = 0,
+    db: AsyncSession = Depends(get_db),
+):
+    # Ranked by relevance, announcements have no course and are left out when
+    # filtering by course type
+    try:
+        return await search(
+            db,
+            q,
+            kinds=[k.value for k in kind] if kind else None,
+            course_type=course_type.value if course_type else None,
+            limit=limit,
+            offset=offset,
+        )
+    except DBAPIError:
+        raise HTTPException(status_code=500, detail="Database error")
@@ -0,0 +1,28 @@
+from typing import Annotated, List
+
+from fastapi import APIRouter, Depends, HTTPException
+
+import models
+import schemas
+from discord_auth import get_current_admin
+from sql_profiler import get_profile, recent_profiles
+
+router = APIRouter(prefix="/debug/sql", tags=["Debug"])
+
+
+@router.get("/", response_model=List[schemas.SQLProfileSummary])
+async def get_sql_profiles(
+    admin: Annotated[models.Actionneur, Depends(get_current_admin)],
+):
+    return [profile.summary() for profile in recent_profiles()]
+
+
+@router.get("/{profile_id}/", response_model=schemas.SQLProfile)
+async def get_sql_profile(
+    profile_id: int,
+    admin: Annotated[models.Actionneur, Depends(get_current_admin)],
+):
+    profile = get_profile(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail="SQL profile not found")
+    return profile.report()
@@ -28,10 +28,16 @@ class CharbonCreate(CharbonBase):
     pass
 
 
+class CharbonBulkItem(CharbonBase):
+    # Charbons with an id are updated, the others are created
+    id: Optional[int] = None
+
+
 class Charbon(CharbonBase):
     id: int
     course_type: CourseType
     duration: Optional[int] = None
+    duration_pending: bool = False
     resources: bool
 
     class Config:
@@ -108,6 +114,71 @@ class Exercise(ExerciseBase):
         from_attributes = True
 
 
+class UploadSessionCreate(BaseModel):
+    size: int
+
+
+class UploadSession(BaseModel):
+    id: str
+    charbon_id: int
+    size: int
+    received: int
+    expires_at: int
+
+    class Config:
+        from_attributes = True
+
+
+class ExerciseStorage(BaseModel):
+    id: int
+    title: str
+    content_encoding: Optional[str] = None
+    content_size: Optional[int] = None
+    stored_size: int
+
+
+class SearchKind(str, Enum):
+    CHARBON = "charbon"
+    ANNOUNCEMENT = "announcement"
+    EXERCISE = "exercise"
+
+
+class SearchResult(BaseModel):
+    kind: SearchKind
+    id: int
+    title: str
+    score: float
+
+
+class SQLStatement(BaseModel):
+    statement: str
+    duration_ms: float
+    executemany: bool
+
+
+class SQLRepeatedStatement(BaseModel):
+    shape: str
+    count: int
+
+
+class SQLProfileSummary(BaseModel):
+    id: int
+    method: str
+    path: str
+    route: Optional[str] = None
+    status: Optional[int] = None
+    started: float
+    duration_ms: float
+    queries: int
+    sql_time_ms: float
+    repeated: int
+
+
+class SQLProfile(SQLProfileSummary):
+    repeated_statements: List[SQLRepeatedStatement]
+    statements: List[SQLStatement]
+
+
 class ActionneurCreate(BaseModel):
     id: str
     username: str
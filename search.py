@@ -0,0 +1,178 @@
+import html
+import math
+import re
+import unicodedata
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, case, delete, func, insert, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models
+
+TOKEN = re.compile(r"\w+")
+HTML_TAG = re.compile(r"<[^>]+>")
+MIN_TERM_LENGTH = 2
+MAX_TERM_LENGTH = 64
+# A title word counts as this many occurrences in the body
+TITLE_WEIGHT = 3
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# (ref_id, title, body) of a document to index
+Document = Tuple[int, str, str]
+
+
+def tokenize(text: str) -> List[str]:
+    # Case and accents are dropped, so "Éléctricité" matches "electricite"
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return [
+        token[:MAX_TERM_LENGTH]
+        for token in TOKEN.findall(text)
+        if len(token) >= MIN_TERM_LENGTH
+    ]
+
+
+def html_text(content: str) -> str:
+    return html.unescape(HTML_TAG.sub(" ", content))
+
+
+def _remove_statements(kind: str, ref_ids) -> List[Tuple[Any, ...]]:
+    # ref_ids is a list of ids or a select of them
+    return [
+        (
+            delete(table)
+            .where(table.c.kind == kind, table.c.ref_id.in_(ref_ids))
+            .execution_options(synchronize_session=False),
+        )
+        for table in (models.SearchTerm.__table__, models.SearchDocument.__table__)
+    ]
+
+
+def index_statements(kind: str, documents: Sequence[Document]) -> List[Tuple[Any, ...]]:
+    # Statements replacing the index entries of the documents, shared by the
+    # routes' async sessions and the sync backfill migration
+    statements = _remove_statements(kind, [ref_id for ref_id, _, _ in documents])
+    document_rows = []
+    term_rows = []
+    for ref_id, title, body in documents:
+        title_terms = tokenize(title)
+        body_terms = tokenize(body)
+        frequencies = Counter(body_terms)
+        for term in title_terms:
+            frequencies[term] += TITLE_WEIGHT
+        document_rows.append(
+            {
+                "kind": kind,
+                "ref_id": ref_id,
+                "title": title,
+                "length": len(title_terms) * TITLE_WEIGHT + len(body_terms),
+            }
+        )
+        term_rows += [
+            {"term": term, "kind": kind, "ref_id": ref_id, "frequency": frequency}
+            for term, frequency in frequencies.items()
+        ]
+
+    if document_rows:
+        statements.append((insert(models.SearchDocument.__table__), document_rows))
+    if term_rows:
+        statements.append((insert(models.SearchTerm.__table__), term_rows))
+    return statements
+
+
+async def index_documents(db: AsyncSession, kind: str, documents: Sequence[Document]):
+    for statement in index_statements(kind, documents):
+        await db.execute(*statement)
+
+
+async def remove_documents(db: AsyncSession, kind: str, ref_ids):
+    for statement in _remove_statements(kind, ref_ids):
+        await db.execute(*statement)
+
+
+def _course_type_filter(course_type: str):
+    # Course types are read at query time, so editing a course or a topic
+    # doesn't touch the index. Announcements have no course
+    term = models.SearchTerm
+    charbons = (
+        select(models.Charbon.id)
+        .join(models.Course)
+        .where(models.Course.type == course_type)
+    )
+    exercises = (
+        select(models.Exercise.id)
+        .join(models.ExerciseTopic)
+        .join(models.Course)
+        .where(models.Course.type == course_type)
+    )
+    return or_(
+        and_(term.kind == "charbon", term.ref_id.in_(charbons)),
+        and_(term.kind == "exercise", term.ref_id.in_(exercises)),
+    )
+
+
+async def search(
+    db: AsyncSession,
+    query: str,
+    kinds: Optional[Iterable[str]] = None,
+    course_type: Optional[str] = None,
+    limit: int = 20,
+    offset: int = 0,
+) -> List[Dict[str, Any]]:
+    terms = sorted(set(tokenize(query)))
+    if not terms:
+        return []
+    document, term = models.SearchDocument, models.SearchTerm
+
+    # BM25. Lengths are averaged per kind, exercises being much longer than
+    # charbons or announcements
+    rows = await db.execute(
+        select(document.kind, func.count(), func.avg(document.length)).group_by(
+            document.kind
+        )
+    )
+    average_lengths = {kind: float(length or 1) for kind, _, length in rows}
+    total = await db.scalar(select(func.count()).select_from(document))
+    rows = await db.execute(
+        select(term.term, func.count()).where(term.term.in_(terms)).group_by(term.term)
+    )
+    idf = {
+        text: math.log(1 + (total - count + 0.5) / (count + 0.5))
+        for text, count in rows
+    }
+    if not idf:
+        return []
+
+    term_idf = case(idf, value=term.term, else_=0.0)
+    average_length = case(average_lengths, value=term.kind, else_=1.0)
+    length_norm = 1 - BM25_B + BM25_B * document.length / average_length
+    score = func.sum(
+        term_idf
+        * term.frequency
+        * (BM25_K1 + 1)
+        / (term.frequency + BM25_K1 * length_norm)
+    ).label("score")
+
+    query = (
+        select(term.kind, term.ref_id, document.title, score)
+        .join(
+            document,
+            and_(document.kind == term.kind, document.ref_id == term.ref_id),
+        )
+        .where(term.term.in_(terms))
+        .group_by(term.kind, term.ref_id, document.title)
+        .order_by(score.desc(), term.kind, term.ref_id)
+        .limit(limit)
+        .offset(offset)
+    )
+    if kinds:
+        query = query.where(term.kind.in_(list(kinds)))
+    if course_type:
+        query = query.where(_course_type_filter(course_type))
+
+    return [
+        {"kind": kind, "id": ref_id, "title": title, "score": round(score, 4)}
+        for kind, ref_id, title, score in await db.execute(query)
+    ]
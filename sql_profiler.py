@@ -0,0 +1,199 @@
+import itertools
+import re
+import threading
+import time
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from starlette.datastructures import MutableHeaders
+
+from config import settings
+
+PROFILE_HEADER = "X-SQL-Profile"
+PROFILE_ID_HEADER = "X-SQL-Profile-Id"
+QUERIES_HEADER = "X-SQL-Queries"
+TIME_HEADER = "X-SQL-Time"
+REPEATED_HEADER = "X-SQL-Repeated"
+SUMMARY_HEADERS = [PROFILE_ID_HEADER, QUERIES_HEADER, TIME_HEADER, REPEATED_HEADER]
+
+# Placeholder lists of expanded IN clauses and multi-row VALUES, whose length
+# changes with the parameters but not the statement's shape
+PLACEHOLDER = r"(?:\?|%s|%\(\w+\)s|:\w+)"
+PLACEHOLDER_LIST = re.compile(rf"\(\s*{PLACEHOLDER}(?:\s*,\s*{PLACEHOLDER})*\s*\)")
+WHITESPACE = re.compile(r"\s+")
+
+_profile: ContextVar[Optional["Profile"]] = ContextVar("sql_profile", default=None)
+_profile_ids = itertools.count(1)
+_profiles: "OrderedDict[int, Profile]" = OrderedDict()
+_profiles_lock = threading.Lock()
+# Lists collecting finished profiles, see capture_profiles
+_captures: List[List["Profile"]] = []
+
+
+def statement_shape(statement: str) -> str:
+    return PLACEHOLDER_LIST.sub("(?)", WHITESPACE.sub(" ", statement).strip())
+
+
+class Profile:
+    def __init__(self, method: str, path: str):
+        self.id = next(_profile_ids)
+        self.method = method
+        self.path = path
+        self.route: Optional[str] = None
+        self.status: Optional[int] = None
+        self.started = time.time()
+        self.duration = 0.0
+        self.statements: List[Dict[str, Any]] = []
+
+    def record(self, statement: str, duration: float, executemany: bool):
+        self.statements.append(
+            {
+                "statement": statement,
+                "duration_ms": round(duration * 1000, 3),
+                "executemany": executemany,
+            }
+        )
+
+    def sql_time(self) -> float:
+        return sum(s["duration_ms"] for s in self.statements)
+
+    def repeated(self) -> List[Dict[str, Any]]:
+        # The same statement shape issued over and over by one request is
+        # usually a query run per row of a previous result (N+1)
+        counts = Counter(statement_shape(s["statement"]) for s in self.statements)
+        return [
+            {"shape": shape, "count": count}
+            for shape, count in counts.most_common()
+            if count >= settings.sql_profiler_repeat_threshold
+        ]
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "route": self.route,
+            "status": self.status,
+            "started": self.started,
+            "duration_ms": round(self.duration * 1000, 3),
+            "queries": len(self.statements),
+            "sql_time_ms": round(self.sql_time(), 3),
+            "repeated": len(self.repeated()),
+        }
+
+    def report(self) -> Dict[str, Any]:
+        return {
+            **self.summary(),
+            "repeated_statements": self.repeated(),
+            "statements": self.statements,
+        }
+
+    def headers(self) -> Dict[str, str]:
+        # Only the statements issued before the response started, a streamed
+        # body's queries are in the report
+        return {
+            PROFILE_ID_HEADER: str(self.id),
+            QUERIES_HEADER: str(len(self.statements)),
+            TIME_HEADER: f"{self.sql_time():.3f}",
+            REPEATED_HEADER: str(len(self.repeated())),
+        }
+
+
+def get_profile(profile_id: int) -> Optional[Profile]:
+    with _profiles_lock:
+        return _profiles.get(profile_id)
+
+
+def recent_profiles() -> List[Profile]:
+    with _profiles_lock:
+        return list(reversed(_profiles.values()))
+
+
+@contextmanager
+def capture_profiles() -> Iterator[List[Profile]]:
+    # Profiles every request handled in the block, whatever SQL_PROFILER says,
+    # and collects them. Not a ContextVar, TestClient runs the app in another
+    # thread
+    profiles: List[Profile] = []
+    with _profiles_lock:
+        _captures.append(profiles)
+    try:
+        yield profiles
+    finally:
+        with _profiles_lock:
+            _captures.remove(profiles)
+
+
+def _keep(profile: Profile):
+    with _profiles_lock:
+        for profiles in _captures:
+            profiles.append(profile)
+        _profiles[profile.id] = profile
+        while len(_profiles) > settings.sql_profiler_history:
+            _profiles.popitem(last=False)
+
+
+def instrument_engine(engine: Engine):
+    # Listeners return right away unless the current request is profiled
+    @event.listens_for(engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, many):
+        if _profile.get() is not None:
+            conn.info.setdefault("profile_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, many):
+        profile = _profile.get()
+        if profile is not None:
+            elapsed = time.perf_counter() - conn.info["profile_start"].pop()
+            profile.record(statement, elapsed, many)
+
+    @event.listens_for(engine, "handle_error")
+    def handle_error(context):
+        starts = (
+            context.connection.info.get("profile_start") if context.connection else None
+        )
+        if _profile.get() is not None and starts:
+            starts.pop()
+
+
+def _is_profiled(scope) -> bool:
+    if settings.sql_profiler == "always" or _captures:
+        return True
+    if settings.sql_profiler == "header":
+        header = PROFILE_HEADER.lower().encode("latin-1")
+        return any(name == header for name, _ in scope["headers"])
+    return False
+
+
+class SQLProfilerMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _is_profiled(scope):
+            await self.app(scope, receive, send)
+            return
+
+        profile = Profile(scope["method"], scope["path"])
+
+        async def send_with_summary(message):
+            if message["type"] == "http.response.start":
+                profile.status = message["status"]
+                headers = MutableHeaders(scope=message)
+                for name, value in profile.headers().items():
+                    headers.append(name, value)
+            await send(message)
+
+        token = _profile.set(profile)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_summary)
+        finally:
+            profile.duration = time.perf_counter() - start
+            _profile.reset(token)
+            profile.route = getattr(scope.get("route"), "path", None)
+            _keep(profile)
@@ -0,0 +1,29 @@
+import pytest
+
+from benchmarks.common import configure
+
+# Before anything imports config, which reads the settings on import
+configure()
+
+pytest_plugins = ["pytest_sql_profiler"]
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+
+    import main
+    from benchmarks.query_counts import seed
+    from database import engine
+
+    seed(engine, 50)
+    # Without the lifespan, so the background workers' queries aren't counted
+    return TestClient(main.app)
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    from cache import charbon_cache
+
+    # A cached response issues no query
+    charbon_cache.clear()
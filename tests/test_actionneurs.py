@@ -0,0 +1,32 @@
+import time
+
+import pytest
+
+
+@pytest.fixture
+def admin_headers(client):
+    import models
+    from database import SessionLocal
+    from discord_auth import create_jwt
+
+    with SessionLocal() as db:
+        db.add(models.Actionneur(id=1001, username="admin", is_admin=True))
+        db.commit()
+    yield {"Authorization": f"Bearer {create_jwt(1001, int(time.time()) + 60)}"}
+    with SessionLocal() as db:
+        db.query(models.Actionneur).filter(models.Actionneur.id >= 1001).delete()
+        db.commit()
+
+
+def test_add_actionneur(client, admin_headers):
+    # Used to build the nonexistent models.User and answer 500
+    response = client.post(
+        "/actionneurs/",
+        json={"id": 1002, "username": "new", "is_admin": False},
+        headers=admin_headers,
+    )
+    assert response.status_code == 201
+    assert response.json() == {"id": "1002", "username": "new", "is_admin": False}
+    assert {"id": "1002", "username": "new", "is_admin": False} in client.get(
+        "/actionneurs/"
+    ).json()
@@ -0,0 +1,80 @@
+import hashlib
+import os
+
+import pytest
+
+from blob_storage import BlobStorage, LocalBlobStorage, S3BlobStorage
+
+
+def _staged(tmp_path, content: bytes):
+    path = tmp_path / f"staged-{len(content)}"
+    path.write_bytes(content)
+    return hashlib.sha256(content).hexdigest(), str(path)
+
+
+def test_incomplete_backend_fails_at_construction():
+    class Incomplete(BlobStorage):
+        def exists(self, digest):
+            return False
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+def test_local_storage_finds_blobs_after_roots_change(tmp_path):
+    digest, path = _staged(tmp_path, b"charbon")
+    LocalBlobStorage([str(tmp_path / "a")]).put_file(digest, path)
+
+    storage = LocalBlobStorage([str(tmp_path / "b"), str(tmp_path / "a")])
+    assert storage.exists(digest)
+    assert storage.local_path(digest).startswith(str(tmp_path / "a"))
+
+    # Identical content is not stored twice
+    digest, path = _staged(tmp_path, b"charbon")
+    storage.put_file(digest, path)
+    assert not os.path.exists(path)
+    assert not os.path.exists(tmp_path / "b")
+
+    storage.delete(digest)
+    assert not storage.exists(digest)
+
+
+@pytest.fixture
+def s3(monkeypatch):
+    moto = pytest.importorskip("moto")
+    for key, value in {
+        "AWS_ACCESS_KEY_ID": "test",
+        "AWS_SECRET_ACCESS_KEY": "test",
+        "AWS_DEFAULT_REGION": "us-east-1",
+    }.items():
+        monkeypatch.setenv(key, value)
+    # moto answers the S3 API in process, standing in for MinIO or AWS
+    with moto.mock_aws():
+        storage = S3BlobStorage("charbons-test", "charbons/", region="us-east-1")
+        storage.client.create_bucket(Bucket="charbons-test")
+        yield storage
+
+
+def test_s3_storage(s3, tmp_path):
+    digest, path = _staged(tmp_path, b"charbon zip")
+    assert not s3.exists(digest)
+
+    s3.put_file(digest, path)
+    assert not os.path.exists(path)
+    assert s3.exists(digest)
+    assert s3.local_path(digest) is None
+    stored = s3.client.get_object(Bucket="charbons-test", Key=s3._key(digest))
+    assert stored["Body"].read() == b"charbon zip"
+
+    # Identical content is not uploaded again, the staged file is still taken
+    digest, path = _staged(tmp_path, b"charbon zip")
+    s3.put_file(digest, path)
+    assert not os.path.exists(path)
+
+    url = s3.get_url(digest, "charbon_1.zip", 300)
+    assert f"/charbons/{digest[:2]}/{digest}" in url
+    assert "charbon_1.zip" in url
+    assert "Expires=" in url or "X-Amz-Expires=300" in url
+
+    s3.delete(digest)
+    assert not s3.exists(digest)
@@ -0,0 +1,24 @@
+import pytest
+
+from benchmarks.charbon_list import CHECKED_URLS, orm_list, projection_list
+from sql_profiler import capture_profiles
+
+
+@pytest.mark.parametrize("url", CHECKED_URLS)
+def test_charbon_read_is_one_query(client, url):
+    with capture_profiles() as profiles:
+        client.get(url).raise_for_status()
+    (profile,) = profiles
+    # Besides the table version lookup of the response cache
+    statements = [
+        s["statement"]
+        for s in profile.statements
+        if "table_version" not in s["statement"]
+    ]
+    assert len(statements) == 1, statements
+
+
+def test_projection_matches_orm_read(client):
+    from database import SessionLocal
+
+    assert projection_list(SessionLocal, 50)() == orm_list(SessionLocal, 50)()
@@ -0,0 +1,23 @@
+import pytest
+
+from config import settings
+from metrics import _Metric
+
+
+def test_metric_without_samples_fails_at_construction():
+    class Incomplete(_Metric):
+        kind = "counter"
+
+    with pytest.raises(TypeError):
+        Incomplete("incomplete", "Never rendered")
+
+
+@pytest.mark.parametrize(
+    "token, status",
+    [(None, 401), ("wrong", 401), ("métriques", 401), ("secret", 200)],
+)
+def test_metrics_token(client, monkeypatch, token, status):
+    monkeypatch.setattr(settings, "metrics_token", "secret")
+    # Sent as UTF-8 bytes, httpx only encodes str headers as ASCII
+    headers = {"Authorization": f"Bearer {token}".encode()} if token else {}
+    assert client.get("/metrics", headers=headers).status_code == status
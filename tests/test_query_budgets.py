@@ -0,0 +1,24 @@
+import pytest
+
+from benchmarks.query_counts import BUDGETS
+
+
+@pytest.mark.parametrize("url, budget", BUDGETS)
+def test_read_routes_stay_within_budget(client, max_queries, url, budget):
+    with max_queries(budget) as profiles:
+        client.get(url).raise_for_status()
+    assert len(profiles) == 1
+
+
+@pytest.mark.max_queries(2)
+def test_charbon_list_with_cursor(client):
+    response = client.get("/charbons/?limit=10")
+    client.get(
+        "/charbons/?limit=10", params={"cursor": response.headers["X-Next-Cursor"]}
+    ).raise_for_status()
+
+
+def test_over_the_limit_fails(client, max_queries):
+    with pytest.raises(pytest.fail.Exception, match="over the limit of 1"):
+        with max_queries(1):
+            client.get("/charbons/1/")
@@ -0,0 +1,75 @@
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+from sqlalchemy import event
+
+from benchmarks.query_plans import (
+    CHECKED_TABLES,
+    UNFILTERED_PARAMETERS,
+    _ordered_table,
+    list_urls,
+    seed,
+)
+
+
+def explain(conn, statement: str, parameters, filtered: bool) -> list[str]:
+    # A sort is only accepted over rows of the ordered table found through an
+    # index search (e.g. a date range sorted by duration), it is then bounded by
+    # the filter. A filtered request must search its tables: walking a whole
+    # index and filtering its rows is a full scan too.
+    problems = []
+    ordered = _ordered_table(statement)
+    plan = [
+        row[-1].split()
+        for row in conn.exec_driver_sql(f"EXPLAIN QUERY PLAN {statement}", parameters)
+    ]
+    searched = {words[1] for words in plan if words[0] == "SEARCH"}
+    for words in plan:
+        detail = " ".join(words)
+        if words[0] == "SCAN" and words[1] in CHECKED_TABLES:
+            if "USING" not in words:
+                problems.append(detail)
+            elif filtered:
+                problems.append(f"{detail} (full index scan)")
+        if detail.endswith("TEMP B-TREE FOR ORDER BY") and ordered not in searched:
+            problems.append(detail)
+    return problems
+
+
+@pytest.fixture(scope="module")
+def plan_statements(client):
+    from benchmarks import query_counts
+    from database import async_engine, engine
+
+    # Large enough for ANALYZE to steer the planner the way production data does
+    seed(engine, 20_000, 5_000, 5_000)
+    statements = []
+
+    # Routes run on the async engine, the sync one only seeds and explains
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        if "table_version" not in statement:
+            statements.append((statement, parameters))
+
+    event.listen(async_engine.sync_engine, "before_cursor_execute", capture)
+    with engine.connect() as conn:
+        yield conn, statements
+    event.remove(async_engine.sync_engine, "before_cursor_execute", capture)
+    # The other tests expect the query count dataset
+    query_counts.seed(engine, 50)
+
+
+@pytest.mark.parametrize("url", list(list_urls()))
+def test_list_query_uses_indexes(client, plan_statements, url):
+    conn, statements = plan_statements
+    statements.clear()
+    client.get(url).raise_for_status()
+    filtered = bool(set(parse_qs(urlsplit(url).query)) - UNFILTERED_PARAMETERS)
+    # Lazy loads repeat the same statement, their plan only needs checking once
+    captured = {statement: parameters for statement, parameters in statements}
+    assert captured, "no statement captured, nothing would be explained"
+    problems = [
+        problem
+        for statement, parameters in captured.items()
+        for problem in explain(conn, statement, parameters, filtered)
+    ]
+    assert not problems
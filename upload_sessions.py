@@ -0,0 +1,115 @@
+import asyncio
+import logging
+import os
+import secrets
+import time
+from typing import Optional
+
+from sqlalchemy import delete, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models
+from blobs import collect_unreferenced_blobs
+from config import settings
+from database import AsyncSessionLocal
+from uploads import STAGING_PREFIX
+
+UPLOADS_PATH = os.path.join(settings.storage_path, "uploads")
+PART_SUFFIX = ".part"
+# Parts without a session, and staged uploads, are only removed once this old,
+# so a session being created or an upload being stored concurrently keeps them
+ORPHAN_PART_AGE = 3600
+
+logger = logging.getLogger(__name__)
+
+
+def get_part_path(upload_id: str) -> str:
+    return os.path.join(UPLOADS_PATH, upload_id + PART_SUFFIX)
+
+
+def remove_part(upload_id: str):
+    try:
+        os.remove(get_part_path(upload_id))
+    except FileNotFoundError:
+        pass
+
+
+def create_upload_session(
+    db: AsyncSession, charbon_id: int, size: int
+) -> models.UploadSession:
+    upload = models.UploadSession(
+        id=secrets.token_hex(16),
+        charbon_id=charbon_id,
+        size=size,
+        received=0,
+        expires_at=int(time.time()) + settings.upload_session_ttl,
+    )
+    os.makedirs(UPLOADS_PATH, exist_ok=True)
+    open(get_part_path(upload.id), "wb").close()
+    db.add(upload)
+    return upload
+
+
+async def collect_expired_uploads(db: AsyncSession) -> int:
+    now = int(time.time())
+    query = select(models.UploadSession.id).where(models.UploadSession.expires_at < now)
+    expired = (await db.scalars(query)).all()
+    if expired:
+        await db.execute(
+            delete(models.UploadSession).where(models.UploadSession.id.in_(expired))
+        )
+    await db.commit()
+
+    for upload_id in expired:
+        remove_part(upload_id)
+
+    # Parts without a session are left by deleted charbons or failed creates,
+    # staged uploads by a process that died before storing them
+    live = set((await db.scalars(select(models.UploadSession.id))).all())
+    orphans = []
+    if os.path.isdir(UPLOADS_PATH):
+        for name in os.listdir(UPLOADS_PATH):
+            upload_id = name.removesuffix(PART_SUFFIX)
+            staged = name.startswith(STAGING_PREFIX)
+            if not (staged or name.endswith(PART_SUFFIX)) or upload_id in live:
+                continue
+            path = os.path.join(UPLOADS_PATH, name)
+            try:
+                if now - os.path.getmtime(path) > ORPHAN_PART_AGE:
+                    os.remove(path)
+                    orphans.append(name)
+            except FileNotFoundError:
+                continue
+    return len(expired) + len(orphans)
+
+
+class UploadCollector:
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        while True:
+            try:
+                async with AsyncSessionLocal() as db:
+                    await collect_expired_uploads(db)
+                    await collect_unreferenced_blobs(db)
+            except Exception:
+                logger.exception("Upload garbage collection failed")
+            await asyncio.sleep(self.interval)
+
+
+upload_collector = UploadCollector(settings.upload_gc_interval)
@@ -0,0 +1,184 @@
+import hashlib
+import os
+import re
+import struct
+import tempfile
+from typing import BinaryIO, Iterable, NamedTuple
+
+from fastapi import HTTPException
+from fastapi.concurrency import run_in_threadpool
+from starlette.responses import JSONResponse
+
+CHUNK_SIZE = 1024 * 1024
+STAGING_PREFIX = ".upload-"
+# Room for the multipart boundaries and headers around the file itself
+MULTIPART_OVERHEAD = 64 * 1024
+
+ZIP_EOCD = struct.Struct("<4s4H2IH")
+ZIP_EOCD_SIGNATURE = b"PK\x05\x06"
+ZIP_CENTRAL_DIRECTORY_SIGNATURE = b"PK\x01\x02"
+# The end of central directory record is followed by at most a 64 KiB comment
+ZIP_TAIL_SIZE = ZIP_EOCD.size + 0xFFFF
+
+
+class StagedUpload(NamedTuple):
+    # A complete, validated zip waiting to be moved into blob storage
+    path: str
+    size: int
+    sha256: str
+
+
+class UploadTooLarge(Exception):
+    pass
+
+
+class InvalidZip(Exception):
+    pass
+
+
+def _check_zip(tail: bytes, tail_offset: int, temp_file: BinaryIO):
+    eocd_position = tail.rfind(ZIP_EOCD_SIGNATURE)
+    if eocd_position < 0 or len(tail) - eocd_position < ZIP_EOCD.size:
+        raise InvalidZip("Missing end of central directory")
+
+    _, disk, _, _, entries, cd_size, cd_offset, _ = ZIP_EOCD.unpack_from(
+        tail, eocd_position
+    )
+    eocd_offset = tail_offset + eocd_position
+    if disk != 0 or cd_offset + cd_size != eocd_offset:
+        raise InvalidZip("Central directory out of bounds")
+    if entries == 0:
+        return
+
+    # The central directory usually sits in the tail already read
+    if cd_offset >= tail_offset:
+        signature = tail[cd_offset - tail_offset : cd_offset - tail_offset + 4]
+    else:
+        temp_file.seek(cd_offset)
+        signature = temp_file.read(4)
+        temp_file.seek(0, os.SEEK_END)
+    if signature != ZIP_CENTRAL_DIRECTORY_SIGNATURE:
+        raise InvalidZip("Missing central directory")
+
+
+class _ZipScanner:
+    # Hashes a zip as it is read and keeps the tail for _check_zip
+    def __init__(self):
+        self.digest = hashlib.sha256()
+        self.size = 0
+        self.tail = b""
+
+    def update(self, chunk: bytes):
+        self.size += len(chunk)
+        self.digest.update(chunk)
+        self.tail = (self.tail + chunk)[-ZIP_TAIL_SIZE:]
+
+    def check(self, file: BinaryIO):
+        _check_zip(self.tail, self.size - len(self.tail), file)
+
+    def result(self, path: str) -> StagedUpload:
+        return StagedUpload(path, self.size, self.digest.hexdigest())
+
+
+def _write_zip(source: BinaryIO, directory: str, max_size: int) -> StagedUpload:
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix=STAGING_PREFIX)
+    try:
+        scanner = _ZipScanner()
+        with os.fdopen(fd, "w+b") as temp_file:
+            while chunk := source.read(CHUNK_SIZE):
+                if scanner.size + len(chunk) > max_size:
+                    raise UploadTooLarge()
+                scanner.update(chunk)
+                temp_file.write(chunk)
+
+            scanner.check(temp_file)
+            temp_file.flush()
+            os.fsync(temp_file.fileno())
+    except BaseException:
+        os.unlink(temp_path)
+        raise
+    return scanner.result(temp_path)
+
+
+def discard_staged(upload: StagedUpload):
+    # For a request that fails before blob storage took the staged file
+    try:
+        os.remove(upload.path)
+    except FileNotFoundError:
+        pass
+
+
+def _scan_zip(path: str) -> StagedUpload:
+    scanner = _ZipScanner()
+    with open(path, "rb") as part_file:
+        while chunk := part_file.read(CHUNK_SIZE):
+            scanner.update(chunk)
+        scanner.check(part_file)
+        os.fsync(part_file.fileno())
+    return scanner.result(path)
+
+
+async def save_zip_upload(
+    source: BinaryIO, directory: str, max_size: int
+) -> StagedUpload:
+    # Streams the upload chunk by chunk into a staging file in directory, which
+    # should be on the same filesystem as the blob storage
+    try:
+        return await run_in_threadpool(_write_zip, source, directory, max_size)
+    except UploadTooLarge:
+        raise HTTPException(status_code=413, detail="File too large")
+    except InvalidZip:
+        raise HTTPException(status_code=400, detail="Invalid zip file")
+
+
+async def check_zip_upload(path: str) -> StagedUpload:
+    # Validates a completed resumable upload, see upload_sessions
+    try:
+        return await run_in_threadpool(_scan_zip, path)
+    except InvalidZip:
+        raise HTTPException(status_code=400, detail="Invalid zip file")
+
+
+class UploadSizeLimitMiddleware:
+    # Rejects oversized uploads before the multipart body is spooled to disk:
+    # right away from their Content-Length, or as soon as the body received
+    # goes over the limit, which also covers chunked requests and a wrong
+    # Content-Length
+    def __init__(self, app, max_size: int, methods: Iterable[str], path: str):
+        self.app = app
+        self.max_size = max_size + MULTIPART_OVERHEAD
+        self.methods = set(methods)
+        self.path = re.compile(path)
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] not in self.methods
+            or not self.path.fullmatch(scope["path"])
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        content_length = headers.get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > self.max_size:
+            response = JSONResponse({"detail": "File too large"}, status_code=413)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def receive_with_limit():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_size:
+                    # Raised into whatever reads the body, the form parser
+                    # lets HTTPException through and the exception handlers
+                    # answer with a 413
+                    raise HTTPException(status_code=413, detail="File too large")
+            return message
+
+        await self.app(scope, receive_with_limit, send)
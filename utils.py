@@ -1,11 +1,8 @@
 import urllib.parse
 
-import requests
-from isodate import parse_duration
-
+from http_client import get_http_client
 from schemas import DiscordUser
 
-YOUTUBE_API_URL = "https://www.googleapis.com/youtube/v3/videos"
 DISCORD_API_GUILDS_URL = "https://discord.com/api/users/@me/guilds"
 
 
@@ -29,26 +26,17 @@ def extract_video_id_from_url(url: str) -> str:
     return None
 
 
-def get_youtube_video_duration(video_id: str, api_key: str) -> int:
-    payload = {"part": "contentDetails", "id": video_id, "key": api_key}
-    response = requests.get(
-        YOUTUBE_API_URL,
-        params=payload,
-    )
-    response.raise_for_status()
-    raw_date = response.json()["items"][0]["contentDetails"]["duration"]
-    return parse_duration(raw_date).total_seconds()
-
-
-def get_discord_user_guilds(token: str) -> list[int]:
+async def get_discord_user_guilds(token: str) -> list[int]:
     data = {"Authorization": f"Bearer {token}"}
-    response = requests.get(DISCORD_API_GUILDS_URL, headers=data)
+    response = await get_http_client().get(DISCORD_API_GUILDS_URL, headers=data)
     guilds = response.json()
     return [int(g["id"]) for g in guilds]
 
 
-def get_discord_user(token: str) -> DiscordUser:
+async def get_discord_user(token: str) -> DiscordUser:
     data = {"Authorization": f"Bearer {token}"}
-    response = requests.get("https://discord.com/api/users/@me", headers=data)
+    response = await get_http_client().get(
+        "https://discord.com/api/users/@me", headers=data
+    )
     response.raise_for_status()
     return DiscordUser(**response.json())
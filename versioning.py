@@ -0,0 +1,85 @@
+import hashlib
+import time
+from email.utils import formatdate, parsedate_to_datetime
+
+from fastapi import Depends, HTTPException, Request, Response
+from sqlalchemy import select
+from sqlalchemy.dialects.mysql import insert as mysql_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+import models
+from database import get_db
+
+
+async def bump_version(db: AsyncSession, *tables: str):
+    # A single upsert, so that concurrent first bumps of a table can't both
+    # insert its row. Sorted so that transactions lock the rows in one order
+    now = int(time.time())
+    table_version = models.TableVersion.__table__
+    rows = [
+        {"name": table, "version": 1, "updated_at": now} for table in sorted(tables)
+    ]
+    if db.bind.dialect.name == "mysql":
+        statement = mysql_insert(table_version).values(rows)
+        statement = statement.on_duplicate_key_update(
+            version=table_version.c.version + 1,
+            updated_at=statement.inserted.updated_at,
+        )
+    else:
+        statement = sqlite_insert(table_version).values(rows)
+        statement = statement.on_conflict_do_update(
+            index_elements=[table_version.c.name],
+            set_={
+                "version": table_version.c.version + 1,
+                "updated_at": statement.excluded.updated_at,
+            },
+        )
+    await db.execute(statement)
+
+
+def _not_modified(request: Request, etag: str, last_modified: int | None) -> bool:
+    if_none_match = request.headers.get("If-None-Match")
+    if if_none_match is not None:
+        tags = [tag.strip() for tag in if_none_match.split(",")]
+        return "*" in tags or etag in tags
+
+    if_modified_since = request.headers.get("If-Modified-Since")
+    if if_modified_since and last_modified is not None:
+        try:
+            return last_modified <= parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+    return False
+
+
+def conditional_get(*tables: str):
+    # ETags are derived from the table versions only, so a matching request is
+    # answered before the route runs its query
+    async def dependency(
+        request: Request, response: Response, db: AsyncSession = Depends(get_db)
+    ):
+        rows = (
+            await db.scalars(
+                select(models.TableVersion).where(models.TableVersion.name.in_(tables))
+            )
+        ).all()
+        versions = {row.name: row for row in rows}
+
+        digest = hashlib.sha1(request.url.path.encode("utf-8"))
+        digest.update(request.url.query.encode("utf-8"))
+        for table in tables:
+            version = versions[table].version if table in versions else 0
+            digest.update(f";{table}={version}".encode("utf-8"))
+        etag = f'"{digest.hexdigest()[:20]}"'
+
+        headers = {"ETag": etag}
+        last_modified = max((row.updated_at for row in rows), default=None)
+        if last_modified is not None:
+            headers["Last-Modified"] = formatdate(last_modified, usegmt=True)
+
+        if _not_modified(request, etag, last_modified):
+            raise HTTPException(status_code=304, headers=headers)
+        response.headers.update(headers)
+
+    return dependency
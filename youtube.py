@@ -0,0 +1,169 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from isodate import parse_duration
+
+from config import settings
+from http_client import get_http_client
+
+YOUTUBE_API_URL = "https://www.googleapis.com/youtube/v3/videos"
+# The videos endpoint accepts at most 50 ids per call
+MAX_BATCH_SIZE = 50
+
+logger = logging.getLogger(__name__)
+
+
+class YoutubeApi:
+    def __init__(self, api_key: str):
+        self.api_key = api_key
+
+    async def get_durations(self, video_ids: List[str]) -> Dict[str, int]:
+        payload = {
+            "part": "contentDetails",
+            "id": ",".join(video_ids),
+            "key": self.api_key,
+            "maxResults": len(video_ids),
+        }
+        response = await get_http_client().get(YOUTUBE_API_URL, params=payload)
+        response.raise_for_status()
+        durations = {}
+        for item in response.json().get("items", []):
+            # A video without a readable duration (e.g. a live stream) is left
+            # out like an unknown one, instead of failing the whole batch
+            try:
+                durations[item["id"]] = int(
+                    parse_duration(item["contentDetails"]["duration"]).total_seconds()
+                )
+            except (KeyError, TypeError, ValueError) as e:
+                logger.warning("Unreadable duration for %s: %r", item.get("id"), e)
+        return durations
+
+
+class FakeYoutubeApi:
+    # Local stand-in for YoutubeApi, records the batches it was asked for
+    def __init__(self, durations: Optional[Dict[str, int]] = None):
+        self.durations = dict(durations or {})
+        self.calls: List[List[str]] = []
+
+    async def get_durations(self, video_ids: List[str]) -> Dict[str, int]:
+        self.calls.append(list(video_ids))
+        return {v: self.durations[v] for v in video_ids if v in self.durations}
+
+
+class DurationResolver:
+    def __init__(self, transport, ttl: float, max_entries: int):
+        self.transport = transport
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: OrderedDict[str, Tuple[int, float]] = OrderedDict()
+        self._pending: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.api_calls = 0
+
+    def _get_cached(self, video_id: str) -> Optional[int]:
+        entry = self._entries.get(video_id)
+        if entry is None:
+            return None
+        duration, expires_at = entry
+        if expires_at <= time.monotonic():
+            del self._entries[video_id]
+            return None
+        self._entries.move_to_end(video_id)
+        return duration
+
+    def _put(self, video_id: str, duration: int):
+        self._entries[video_id] = (duration, time.monotonic() + self.ttl)
+        self._entries.move_to_end(video_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def peek(self, video_id: str) -> Optional[int]:
+        # Cached duration only, never calls the API
+        return self._get_cached(video_id)
+
+    async def get(self, video_id: str) -> Optional[int]:
+        return (await self.get_many([video_id])).get(video_id)
+
+    async def get_many(
+        self, video_ids: Iterable[str], refresh: bool = False
+    ) -> Dict[str, int]:
+        # Unknown videos are left out of the result and never cached
+        durations: Dict[str, Optional[int]] = {}
+        waiting: Dict[str, asyncio.Future] = {}
+        missing: List[str] = []
+        for video_id in dict.fromkeys(video_ids):
+            duration = None if refresh else self._get_cached(video_id)
+            if duration is not None:
+                self.hits += 1
+                durations[video_id] = duration
+            elif video_id in self._pending:
+                # Another request is already fetching this video
+                self.coalesced += 1
+                waiting[video_id] = self._pending[video_id]
+            else:
+                self.misses += 1
+                missing.append(video_id)
+
+        if missing:
+            durations.update(await self._fetch(missing))
+        for video_id, future in waiting.items():
+            durations[video_id] = await asyncio.shield(future)
+
+        return {k: v for k, v in durations.items() if v is not None}
+
+    async def _fetch(self, video_ids: List[str]) -> Dict[str, int]:
+        loop = asyncio.get_running_loop()
+        futures = {video_id: loop.create_future() for video_id in video_ids}
+        self._pending.update(futures)
+        durations = {}
+        try:
+            for start in range(0, len(video_ids), MAX_BATCH_SIZE):
+                batch = video_ids[start : start + MAX_BATCH_SIZE]
+                self.api_calls += 1
+                found = await self.transport.get_durations(batch)
+                for video_id in batch:
+                    duration = found.get(video_id)
+                    if duration is not None:
+                        durations[video_id] = duration
+                        self._put(video_id, duration)
+                    futures[video_id].set_result(duration)
+                    self._pending.pop(video_id, None)
+            return durations
+        except BaseException as e:
+            for video_id, future in futures.items():
+                if not future.done():
+                    future.set_exception(e)
+                    # Waiters re-raise it, don't warn when there are none
+                    future.exception()
+                    self._pending.pop(video_id, None)
+            raise
+
+    def invalidate(self, video_ids: Optional[Iterable[str]] = None):
+        if video_ids is None:
+            self._entries.clear()
+            return
+        for video_id in video_ids:
+            self._entries.pop(video_id, None)
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses + self.coalesced
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "coalesced": self.coalesced,
+            "api_calls": self.api_calls,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+duration_resolver = DurationResolver(
+    YoutubeApi(settings.youtube_api_key),
+    settings.youtube_duration_ttl,
+    settings.youtube_duration_cache_size,
+)